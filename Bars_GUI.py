@@ -1,29 +1,13 @@
-import serial
-import time
-import struct
 import tkinter as tk
 from tkinter import ttk
-from PIL import Image, ImageTk
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import numpy as np
-
-def calculate_crc(data):
-    crc = 0xFFFF
-    for pos in data:
-        crc ^= pos
-        for _ in range(8):
-            if (crc & 1) != 0:
-                crc >>= 1
-                crc ^= 0xA001
-            else:
-                crc >>= 1
-    return crc
-
-def create_request_command(device_address, function_code, start_address, num_registers):
-    request = struct.pack('>BBHH', device_address, function_code, start_address, num_registers)
-    crc = calculate_crc(request)
-    return request + struct.pack('<H', crc)
+from change_filter import SENSOR_DEADBANDS, ChangeFilter
+from gauge_widget import GaugePanel, load_icon
+from device_profile import load_profile
+from feed import FeedWorker
+
+PROFILE = load_profile()
 
 class SensorGUI:
     def __init__(self, root):
@@ -36,15 +20,9 @@ class SensorGUI:
         self.heading_label = ttk.Label(root, text="RS-485 Temperature and Humidity Sensor", font=("Helvetica", 24, 'bold'), foreground='white', background='black')
         self.heading_label.pack(pady=10)
 
-        # Configure the serial connection
-        self.ser = serial.Serial(
-            port='COM8',       # Replace with your port
-            baudrate=9600,     # Replace with your sensor's baudrate
-            parity=serial.PARITY_NONE,
-            stopbits=serial.STOPBITS_ONE,
-            bytesize=serial.EIGHTBITS,
-            timeout=1
-        )
+        # Readings come from acquisition_daemon.py, which owns the serial port;
+        # devices.json says which sensor this window shows
+        self.port, self.sensor = PROFILE.first_sensor()
 
         # Create frame for top readings display
         self.top_frame = tk.Frame(root, bg='black')
@@ -85,96 +63,59 @@ class SensorGUI:
         self.humidity_label = ttk.Label(self.hum_frame, text="Humidity", font=("Helvetica", 16, 'bold'), foreground='white', background='black')
         self.humidity_label.pack(pady=5)
 
-        # Load icons
-        self.temp_icon_image = Image.open("C:/Users/kayan/OneDrive/Desktop/Sensor_Reading/Temperature_icon.png")  # Replace with your temperature icon path
-        self.temp_icon_image = self.temp_icon_image.resize((50, 50), Image.LANCZOS)  # Resize icon
-        self.temp_icon_photo = ImageTk.PhotoImage(self.temp_icon_image)
-
-        self.hum_icon_image = Image.open("C:/Users/kayan/OneDrive/Desktop/Sensor_Reading/Humidity_icon.png")  # Replace with your humidity icon path
-        self.hum_icon_image = self.hum_icon_image.resize((50, 50), Image.LANCZOS)  # Resize icon
-        self.hum_icon_photo = ImageTk.PhotoImage(self.hum_icon_image)
-
+        # Load icons (decoded and resized once, then cached)
+        temp_icon = load_icon(PROFILE.icon_path('temperature'), (50, 50))
+        hum_icon = load_icon(PROFILE.icon_path('humidity'), (50, 50))
+
+        # Gauges: artists are created once and only their data changes on each reading
+        ring = dict(radius=1.0, start_angle=0.0, clockwise=False, limit=1.5,
+                    icon_extent=(-0.5, 0.5, -0.5, 0.5), line_width=3, show_value=False)
+        self.temp_panel = GaugePanel(self.temp_fig, self.temp_canvas)
+        self.temp_panel.add_gauge(self.temp_ax, color="red", icon=temp_icon, **ring)
+        self.hum_panel = GaugePanel(self.hum_fig, self.hum_canvas)
+        self.hum_panel.add_gauge(self.hum_ax, color="blue", icon=hum_icon, **ring)
+
+        # The feed is followed on a worker thread; the Tk thread only picks up new readings
+        self.worker = FeedWorker(self.port.port, self.sensor.address, feed=PROFILE.feed,
+                                 changes=ChangeFilter(SENSOR_DEADBANDS)).start()
+        self.shown_version = 0
         self.update_data()  # Start the initial data update
 
 
-    def read_sensor_data(self):
-        device_address = 1  # Replace with your sensor's device address
-        function_code = 3   # Function code for reading holding registers
-        start_address = 0   # Starting register address
-        num_registers = 2   # Number of registers to read
-
-        request_command = create_request_command(device_address, function_code, start_address, num_registers)
+    def update_data(self):
+        version, reading = self.worker.latest.get()
+        if version != self.shown_version:
+            self.shown_version = version
+            temperature, humidity = reading
+            if temperature is not None and humidity is not None:
+                self.show_reading(temperature, humidity)
 
-        self.ser.write(request_command)
-        time.sleep(1)  # Wait for a response
-        response = self.ser.read(9)  # Read the response (number of bytes depends on your sensor's response format)
+        # Check for a new reading again in 100 milliseconds
+        self.root.after(100, self.update_data)
 
-        if response and len(response) >= 9:
-            # Process the response to extract humidity and temperature values
-            raw_temperature = int.from_bytes(response[3:5], byteorder='big')
-            humidity = int.from_bytes(response[5:7], byteorder='big') / 10.0
-            
-            # Adjust the formula based on sensor datasheet
-            # Example: Assuming a 16-bit raw value maps linearly to -40°C to 125°C
-            temperature = (raw_temperature / 1650.0) * 165.0 - 40.0
-            
-            return temperature, humidity
-        
-        return None, None
+    def show_reading(self, temperature, humidity):
+        self.temperature_display_label.config(text=f"Temperature: {temperature:.1f}°C")
+        self.humidity_display_label.config(text=f"Humidity: {humidity:.1f}%")
 
-    def update_data(self):
-        temperature, humidity = self.read_sensor_data()
-        if temperature is not None and humidity is not None:
-            self.temperature_display_label.config(text=f"Temperature: {temperature:.1f}°C")
-            self.humidity_display_label.config(text=f"Humidity: {humidity:.1f}%")
-
-            # Update temperature gauge
-            self.temp_ax.clear()
-            self.temp_ax.set_aspect('equal')
-            self.temp_ax.set_xlim(-1.5, 1.5)
-            self.temp_ax.set_ylim(-1.5, 1.5)
-            temp_value = max(0, min(temperature, 100))  # Clamping the value between 0 and 100
-            theta = np.linspace(0, 2 * np.pi * temp_value / 100, 100)
-            x = np.cos(theta)
-            y = np.sin(theta)
-            self.temp_ax.plot(x, y, color="red", lw=3)  # Border of the circle
-
-            # Overlay temperature icon in the center
-            self.temp_ax.imshow(np.array(self.temp_icon_image), extent=[-0.5, 0.5, -0.5, 0.5], aspect='auto', alpha=0.8)
-
-            self.temp_ax.axis('off')
-            self.temp_canvas.draw()
-
-            # Update humidity gauge
-            self.hum_ax.clear()
-            self.hum_ax.set_aspect('equal')
-            self.hum_ax.set_xlim(-1.5, 1.5)
-            self.hum_ax.set_ylim(-1.5, 1.5)
-            hum_value = max(0, min(humidity, 100))  # Clamping the value between 0 and 100
-            theta = np.linspace(0, 2 * np.pi * hum_value / 100, 100)
-            x = np.cos(theta)
-            y = np.sin(theta)
-            self.hum_ax.plot(x, y, color="blue", lw=3)  # Border of the circle
-
-            # Overlay humidity icon in the center
-            self.hum_ax.imshow(np.array(self.hum_icon_image), extent=[-0.5, 0.5, -0.5, 0.5], aspect='auto', alpha=0.8)
-
-            self.hum_ax.axis('off')
-            self.hum_canvas.draw()
-        
-        # Schedule the next update in 3000 milliseconds (3 seconds)
-        self.root.after(3000, self.update_data)  # Update every 3 seconds
+        self.temp_panel.set_values([temperature])
+        self.hum_panel.set_values([humidity])
 
     def close(self):
-        self.ser.close()
+        self.worker.stop()
 
-if __name__ == "__main__":
+def main(ready=None):
+    # ready() is called once the window is on screen (used by launcher.py to time startup)
     root = tk.Tk()
     gui = SensorGUI(root)
-    
+
     def on_closing():
         gui.close()
         root.destroy()
-    
+
     root.protocol("WM_DELETE_WINDOW", on_closing)
+    if ready is not None:
+        root.after_idle(ready)
     root.mainloop()
+
+if __name__ == "__main__":
+    main()
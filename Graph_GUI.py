@@ -1,46 +1,46 @@
+import os
 import sys
-import time
-import struct
-import serial
+import threading
+import numpy as np
 from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QLabel
 from PyQt5.QtCore import QTimer
 import pyqtgraph as pg
 from pyqtgraph.Qt import QtGui
+from change_filter import SENSOR_DEADBANDS, ChangeFilter
+from history import HistoryStore, backfill
+from device_profile import load_profile
+from feed import FeedWorker
+from reading_log import ReadingLog, log_directory
 
-def calculate_crc(data):
-    crc = 0xFFFF
-    for pos in data:
-        crc ^= pos
-        for _ in range(8):
-            if (crc & 1) != 0:
-                crc >>= 1
-                crc ^= 0xA001
-            else:
-                crc >>= 1
-    return crc
-
-def create_request_command(device_address, function_code, start_address, num_registers):
-    request = struct.pack('>BBHH', device_address, function_code, start_address, num_registers)
-    crc = calculate_crc(request)
-    return request + struct.pack('<H', crc)
-
-# Configure the serial connection
-ser = serial.Serial(
-    port='COM8',       # Replace with your port
-    baudrate=9600,     # Replace with your sensor's baudrate
-    parity=serial.PARITY_NONE,
-    stopbits=serial.STOPBITS_ONE,
-    bytesize=serial.EIGHTBITS,
-    timeout=1
-)
+PROFILE = load_profile()
+
+# Raw readings for the last day and min/max/mean buckets back to ten years (see history.py);
+# each plot draws at most one bucket per pixel column of whatever span is on screen
+CHANNELS = ('temperature', 'humidity')
 
 class SensorApp(QWidget):
     def __init__(self):
         super().__init__()
+        self.history = HistoryStore()
+        self.loaded = None  # HistoryStore filled from the daemon's log by the loader thread
+        self.pending = None  # Live readings that arrived while it was loading
+        self.curveColors = {}
+        self.shownAlarms = 0
+        port, sensor = PROFILE.first_sensor()
+        self.port = port
+        self.sensor = sensor
+        self.key = (port.port, sensor.address)
         self.initUI()
+        # Readings come from acquisition_daemon.py, which owns the serial port; the feed is
+        # followed on a worker thread and the Qt timer only picks up new readings. Every
+        # reading goes into the history; the deadband filter only decides when the labels
+        # and colours are repainted.
+        self.worker = FeedWorker(port.port, sensor.address, feed=PROFILE.feed).start()
+        self.changes = ChangeFilter(SENSOR_DEADBANDS)
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.update_data)
-        self.timer.start(3000)  # Update every 3 seconds
+        self.timer.start(100)  # Check for a new reading every 100 milliseconds
+        QTimer.singleShot(0, self.load_history)  # After the window is up, not before
 
     def initUI(self):
         self.setWindowTitle('Temperature and Humidity Monitor')
@@ -49,67 +49,146 @@ class SensorApp(QWidget):
         layout = QVBoxLayout()
 
         # Create temperature plot
-        self.temperaturePlot = pg.PlotWidget()
+        self.temperaturePlot = pg.PlotWidget(axisItems={'bottom': pg.DateAxisItem()})
         self.temperaturePlot.setTitle('Temperature (°C)')
         self.temperaturePlot.setLabel('left', 'Temperature (°C)')
-        self.temperaturePlot.setLabel('bottom', 'Time', units='s')
+        self.temperaturePlot.setLabel('bottom', 'Time')
         self.temperaturePlot.showGrid(x=True, y=True)
+        self.temperaturePlot.setYRange(-40, 125)
+        self.temperatureCurve = self.create_curve(self.temperaturePlot)
+        self.temperaturePlot.sigXRangeChanged.connect(lambda: self.range_changed(self.temperaturePlot))
         self.temperatureLabel = QLabel('Temperature: 0.0°C')
         layout.addWidget(self.temperaturePlot)
         layout.addWidget(self.temperatureLabel)
 
         # Create humidity plot
-        self.humidityPlot = pg.PlotWidget()
+        self.humidityPlot = pg.PlotWidget(axisItems={'bottom': pg.DateAxisItem()})
         self.humidityPlot.setTitle('Humidity (%)')
         self.humidityPlot.setLabel('left', 'Humidity (%)')
-        self.humidityPlot.setLabel('bottom', 'Time', units='s')
+        self.humidityPlot.setLabel('bottom', 'Time')
         self.humidityPlot.showGrid(x=True, y=True)
+        self.humidityPlot.setYRange(0, 100)
+        self.humidityCurve = self.create_curve(self.humidityPlot)
+        self.humidityPlot.sigXRangeChanged.connect(lambda: self.range_changed(self.humidityPlot))
         self.humidityLabel = QLabel('Humidity: 0.0%')
         layout.addWidget(self.humidityPlot)
         layout.addWidget(self.humidityLabel)
 
         self.setLayout(layout)
 
-    def update_data(self):
-        device_address = 1  # Replace with your sensor's device address
-        function_code = 3   # Function code for reading holding registers
-        start_address = 0   # Starting register address
-        num_registers = 2   # Number of registers to read
-
-        request_command = create_request_command(device_address, function_code, start_address, num_registers)
-
-        ser.write(request_command)
-        time.sleep(1)  # Wait for a response
-        response = ser.read(9)  # Read the response (number of bytes depends on your sensor's response format)
-
-        if response and len(response) >= 9:
-            # Process the response to extract humidity and temperature values
-            raw_temperature = int.from_bytes(response[3:5], byteorder='big')
-            humidity = int.from_bytes(response[5:7], byteorder='big') / 10.0
-            
-            # Adjust the formula based on sensor datasheet
-            temperature = (raw_temperature / 1650.0) * 165.0 - 40.0
-            
-            self.temperatureLabel.setText(f'Temperature: {temperature:.2f}°C')
-            self.humidityLabel.setText(f'Humidity: {humidity:.2f}%')
-
-            # Update plots
-            self.update_plot(self.temperaturePlot, temperature, 'Temperature (°C)', -40, 125, 'Temperature')
-            self.update_plot(self.humidityPlot, humidity, 'Humidity (%)', 0, 100, 'Humidity')
-
-    def update_plot(self, plot, value, title, min_value, max_value, label):
-        plot.clear()
-        color = 'g' if value < (min_value + max_value) / 2 else 'r'
-        bg = pg.BarGraphItem(x=[1], height=[value], width=0.3, brush=color)
-        plot.addItem(bg)
-        plot.setTitle(title)
-        plot.setYRange(min_value, max_value)
-        plot.setLabel('left', label)
-        plot.setLabel('bottom', 'Time', units='s')
-        plot.showGrid(x=True, y=True)
+    def create_curve(self, plot):
+        # One persistent curve per plot, fed at most a few points per pixel by history.query()
+        curve = plot.plot(pen='g')
+        curve.setClipToView(True)
+        self.curveColors[curve] = 'g'
+        return curve
+
+    def load_history(self):
+        # Earlier readings from the daemon's log of this port, if it runs on this machine.
+        # A log of months takes a while to read, so a thread loads it into a store of its
+        # own; update_data swaps that in once it is done.
+        directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), log_directory(self.port.port))
+        if os.path.isdir(directory):
+            self.pending = []
+            threading.Thread(target=self.read_log, args=(directory,), name="history-load", daemon=True).start()
+
+    def read_log(self, directory):
+        store = HistoryStore()
+        log = ReadingLog(directory)
+        try:
+            backfill(store, log, (self.port.port, None), self.sensor.register_map)
+        finally:
+            log.close()
+        self.loaded = store
+
+    def history_loaded(self):
+        # The live readings received while loading go on top of the log's, which end earlier
+        store, self.loaded = self.loaded, None
+        for timestamp, values in self.pending:
+            store.add(self.key, values, timestamp)
+        self.history, self.pending = store, None
+        self.redraw(self.temperaturePlot)
+        self.redraw(self.humidityPlot)
 
-if __name__ == '__main__':
+    def update_data(self):
+        if self.loaded is not None:
+            self.history_loaded()
+        if self.worker.alarm_version != self.shownAlarms:
+            self.shownAlarms = self.worker.alarm_version
+            self.update_plot(self.temperatureCurve, 'temperature')
+            self.update_plot(self.humidityCurve, 'humidity')
+        # Take every reading queued since the last tick so the history has no gaps
+        added = False
+        shown = None
+        for timestamp, reading in self.worker.drain():
+            if self.changes.accept(reading):
+                shown = reading
+            if reading[0] is None or reading[1] is None:
+                continue
+            values = dict(zip(CHANNELS, reading))
+            self.history.add(self.key, values, timestamp)
+            if self.pending is not None:
+                self.pending.append((timestamp, values))
+            added = True
+        if added:
+            self.redraw(self.temperaturePlot)
+            self.redraw(self.humidityPlot)
+        if shown is not None and shown[0] is not None and shown[1] is not None:
+            self.show_reading(*shown)
+
+    def show_reading(self, temperature, humidity):
+        self.temperatureLabel.setText(f'Temperature: {temperature:.2f}°C')
+        self.humidityLabel.setText(f'Humidity: {humidity:.2f}%')
+        self.update_plot(self.temperatureCurve, 'temperature')
+        self.update_plot(self.humidityCurve, 'humidity')
+
+    def update_plot(self, curve, channel):
+        # Red while the daemon has an alarm raised on the channel (rules in devices.json)
+        severity = self.worker.alarm_severity(channel)
+        color = 'g' if severity is None or severity == 'info' else 'r'
+        if color != self.curveColors[curve]:
+            self.curveColors[curve] = color
+            curve.setPen(color)
+
+    def range_changed(self, plot):
+        # Zoomed or panned by the user: fetch the newly visible span at its own resolution
+        if not plot.getViewBox().autoRangeEnabled()[0]:
+            self.redraw(plot)
+
+    def redraw(self, plot):
+        # While auto-ranging the plot shows everything; once the user zooms or pans, only
+        # the visible span (plus a screen either side, so panning has data) is fetched
+        channel = 'temperature' if plot is self.temperaturePlot else 'humidity'
+        curve = self.temperatureCurve if plot is self.temperaturePlot else self.humidityCurve
+        view = plot.getViewBox()
+        if view.autoRangeEnabled()[0]:
+            span = self.history.span(self.key, channel)
+            if span is None:
+                return
+            start, end = span[0], span[1] + 1
+        else:
+            left, right = view.viewRange()[0]
+            start, end = left - (right - left), right + (right - left)
+        pixels = max(int(view.width()), 100)
+        data = self.history.query(self.key, channel, start, end, 3 * pixels)
+        if data.resolution == 0:
+            curve.setData(data.time, data.mean)
+        else:
+            # Each bucket as a vertical stroke from its min to its max, so short spikes stay visible
+            curve.setData(np.repeat(data.time, 2), np.column_stack((data.min, data.max)).ravel())
+
+    def closeEvent(self, event):
+        self.worker.stop()
+        super().closeEvent(event)
+
+def main(ready=None):
+    # ready() is called once the window is on screen (used by launcher.py to time startup)
     app = QApplication(sys.argv)
     sensorApp = SensorApp()
     sensorApp.show()
-    sys.exit(app.exec_())
+    if ready is not None:
+        QTimer.singleShot(0, ready)
+    return app.exec_()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,44 +1,27 @@
 import sys
-import time
-import struct
-import serial
 from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QLabel, QDial
 from PyQt5.QtCore import QTimer, Qt
+from change_filter import SENSOR_DEADBANDS, ChangeFilter
+from device_profile import load_profile
+from feed import FeedWorker
 
-def calculate_crc(data):
-    crc = 0xFFFF
-    for pos in data:
-        crc ^= pos
-        for _ in range(8):
-            if (crc & 1) != 0:
-                crc >>= 1
-                crc ^= 0xA001
-            else:
-                crc >>= 1
-    return crc
-
-def create_request_command(device_address, function_code, start_address, num_registers):
-    request = struct.pack('>BBHH', device_address, function_code, start_address, num_registers)
-    crc = calculate_crc(request)
-    return request + struct.pack('<H', crc)
-
-# Configure the serial connection
-ser = serial.Serial(
-    port='COM8',       # Replace with your port
-    baudrate=9600,     # Replace with your sensor's baudrate
-    parity=serial.PARITY_NONE,
-    stopbits=serial.STOPBITS_ONE,
-    bytesize=serial.EIGHTBITS,
-    timeout=1
-)
+PROFILE = load_profile()
 
 class SensorApp(QWidget):
     def __init__(self):
         super().__init__()
         self.initUI()
+        # Readings come from acquisition_daemon.py, which owns the serial port; the feed is
+        # followed on a worker thread and the Qt timer only picks up new readings
+        port, sensor = PROFILE.first_sensor()
+        self.worker = FeedWorker(port.port, sensor.address, feed=PROFILE.feed,
+                                 changes=ChangeFilter(SENSOR_DEADBANDS)).start()
+        self.shown_version = 0
+        self.shown_alarms = 0
+        self.gaugeStyles = {}
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.update_data)
-        self.timer.start(5000)  # Update every 5 seconds
+        self.timer.start(100)  # Check for a new reading every 100 milliseconds
 
     def initUI(self):
         self.setWindowTitle('Temperature and Humidity Monitor')
@@ -67,46 +50,53 @@ class SensorApp(QWidget):
         self.setLayout(layout)
 
     def update_data(self):
-        device_address = 1  # Replace with your sensor's device address
-        function_code = 3   # Function code for reading holding registers
-        start_address = 0   # Starting register address
-        num_registers = 2   # Number of registers to read
-
-        request_command = create_request_command(device_address, function_code, start_address, num_registers)
-
-        ser.write(request_command)
-        time.sleep(1)  # Wait for a response
-        response = ser.read(9)  # Read the response (number of bytes depends on your sensor's response format)
-
-        if response and len(response) >= 9:
-            # Process the response to extract humidity and temperature values
-            raw_temperature = int.from_bytes(response[3:5], byteorder='big')
-            humidity = int.from_bytes(response[5:7], byteorder='big') / 10.0
-            
-            # Adjust the formula based on sensor datasheet
-            temperature = (raw_temperature / 1650.0) * 165.0 - 40.0
-            
-            self.temperatureLabel.setText(f'Temperature: {temperature:.2f}°C')
-            self.humidityLabel.setText(f'Humidity: {humidity:.2f}%')
-
-            # Convert to integer for the dial
-            self.temperatureGauge.setValue(int(temperature))
-            self.humidityGauge.setValue(int(humidity))
-
-            # Update gauge colors based on value
-            self.update_gauge_color(self.temperatureGauge, temperature, 20, 30)
-            self.update_gauge_color(self.humidityGauge, humidity, 30, 60)
-
-    def update_gauge_color(self, gauge, value, low, high):
-        if value < low:
-            gauge.setStyleSheet("QDial { background-color: green; }")
-        elif low <= value <= high:
-            gauge.setStyleSheet("QDial { background-color: yellow; }")
+        version, reading = self.worker.latest.get()
+        if version != self.shown_version:
+            self.shown_version = version
+            temperature, humidity = reading
+            if temperature is not None and humidity is not None:
+                self.show_reading(temperature, humidity)
+        if self.worker.alarm_version != self.shown_alarms:
+            self.shown_alarms = self.worker.alarm_version
+            self.show_alarms()
+
+    def show_reading(self, temperature, humidity):
+        self.temperatureLabel.setText(f'Temperature: {temperature:.2f}°C')
+        self.humidityLabel.setText(f'Humidity: {humidity:.2f}%')
+
+        # Convert to integer for the dial
+        self.temperatureGauge.setValue(int(temperature))
+        self.humidityGauge.setValue(int(humidity))
+
+    def show_alarms(self):
+        # Gauge colors follow the alarms the daemon raised for this sensor (rules in devices.json)
+        self.update_gauge_color(self.temperatureGauge, self.worker.alarm_severity('temperature'))
+        self.update_gauge_color(self.humidityGauge, self.worker.alarm_severity('humidity'))
+
+    def update_gauge_color(self, gauge, severity):
+        if severity is None or severity == 'info':
+            style = "QDial { background-color: green; }"
+        elif severity == 'warning':
+            style = "QDial { background-color: yellow; }"
         else:
-            gauge.setStyleSheet("QDial { background-color: red; }")
-
-if __name__ == '__main__':
+            style = "QDial { background-color: red; }"
+        # Setting a style sheet re-polishes the widget, so only do it when the band changes
+        if self.gaugeStyles.get(gauge) != style:
+            self.gaugeStyles[gauge] = style
+            gauge.setStyleSheet(style)
+
+    def closeEvent(self, event):
+        self.worker.stop()
+        super().closeEvent(event)
+
+def main(ready=None):
+    # ready() is called once the window is on screen (used by launcher.py to time startup)
     app = QApplication(sys.argv)
     sensorApp = SensorApp()
     sensorApp.show()
-    sys.exit(app.exec_())
+    if ready is not None:
+        QTimer.singleShot(0, ready)
+    return app.exec_()
+
+if __name__ == '__main__':
+    sys.exit(main())
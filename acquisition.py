@@ -0,0 +1,94 @@
+import queue
+import threading
+import time
+
+class LatestValue:
+    # Thread-safe single slot holding the most recent reading; version counts updates
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = None
+        self.version = 0
+        self.timestamp = None
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+            self.version += 1
+            self.timestamp = time.time()
+
+    def get(self):
+        with self._lock:
+            return self.version, self._value
+
+class AcquisitionWorker:
+    # Calls read() every interval seconds on a background thread, so blocking serial
+    # I/O never runs on the GUI thread. Results go to .latest and to .readings (bounded,
+    # oldest dropped) as (timestamp, value) pairs. With a change_filter.ChangeFilter as
+    # changes, readings it suppresses are not published at all. When read() raises an
+    # OSError (a SerialException when the adapter is unplugged), failed is published in
+    # its place and polling carries on, so the windows show the sensor as missing.
+    def __init__(self, read, interval=3.0, maxsize=1000, changes=None, failed=(None, None)):
+        self.read = read
+        self.interval = interval
+        self.changes = changes
+        self.failed = failed
+        self.errors = 0
+        self.last_error = None
+        self.latest = LatestValue()
+        self.readings = queue.Queue(maxsize)
+        self.dropped = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="acquisition", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        next_poll = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                value = self.read()
+            except OSError as e:
+                self.errors += 1
+                self.last_error = e
+                value = self.failed
+            if self.changes is None or self.changes.accept(value):
+                self.publish(value)
+
+            next_poll += self.interval
+            delay = next_poll - time.monotonic()
+            if delay < 0:
+                next_poll = time.monotonic()  # Reads are slower than the interval: don't pile up
+                delay = 0
+            self._stop.wait(delay)
+
+    def publish(self, value, timestamp=None):
+        self.latest.set(value)
+        item = (time.time() if timestamp is None else timestamp, value)
+        try:
+            self.readings.put_nowait(item)
+        except queue.Full:
+            try:
+                self.readings.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+            self.readings.put_nowait(item)
+
+    def drain(self):
+        # All readings queued since the last call, oldest first; never blocks
+        items = []
+        while True:
+            try:
+                items.append(self.readings.get_nowait())
+            except queue.Empty:
+                return items
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
@@ -0,0 +1,135 @@
+import argparse
+import os
+import queue
+import time
+
+from aggregation import AggregateLog, Aggregator
+from alarms import AlarmEngine, AlarmLog, WebhookSink
+from bus_scheduler import BusScheduler
+from device_profile import load_profile
+from export import ReadingExporter
+from feed import FeedServer
+from metrics import serve_metrics
+from modbus_tcp import ModbusTCPGateway, RegisterImage
+from multi_port import MultiPortPoller
+from reading_log import ReadingLog, log_directory
+
+# The without_GUI.py loop as a background service: it alone opens the serial ports in
+# devices.json, polls every configured sensor, keeps the raw readings on disk and
+# publishes the decoded values on the local feed (see feed.py) for any number of viewers
+# and, when devices.json has a modbus_tcp section, the raw registers over Modbus TCP.
+# Per-sensor 1-minute and 1-hour statistics go to readings/aggregates.csv (see aggregation.py).
+# Alarm rules from devices.json are checked here, off the windows' UI threads; alarm events
+# go to the feed, to readings/alarms.log and to the webhook if one is set (see alarms.py).
+
+def main():
+    # Usage: python acquisition_daemon.py [profile.json] [--quiet] [--export session.csv] [--metrics-port 9107]
+    parser = argparse.ArgumentParser(description="Poll every sensor in the device profile and publish the readings")
+    parser.add_argument('profile', nargs='?', help="device profile (default: devices.json)")
+    parser.add_argument('--quiet', action='store_true', help="do not print every reading")
+    parser.add_argument('--export', help="also write the decoded readings to this CSV or .parquet file")
+    parser.add_argument('--metrics-port', type=int, help="serve Prometheus metrics on this port instead of the "
+                                                         "profile's (0: none)")
+    args = parser.parse_args()
+    profile = load_profile(args.profile) if args.profile else load_profile()
+    if args.metrics_port is not None:
+        host = profile.metrics[0] if profile.metrics else '127.0.0.1'
+        profile.metrics = (host, args.metrics_port) if args.metrics_port else None
+
+    server = FeedServer(profile.feed).start()
+    image = RegisterImage()
+    logs = []
+    poller = MultiPortPoller()
+    for port in profile.ports:
+        log = ReadingLog(log_directory(port.port))
+        logs.append(log)
+
+        def update_image(slave, block, registers, offset=port.unit_offset):
+            image.update(slave.address + offset, block.start, registers)
+
+        # Ports open in the background and reopen after errors, so a busy or unplugged
+        # adapter delays its own bus only
+        poller.add_bus(BusScheduler.from_profile(port, reconnect=True, log=log, on_registers=update_image))
+    readings = poller.subscribe()
+    exporter = ReadingExporter(args.export) if args.export else None
+
+    # Statistics are taken over every raw reading, before any deadband filtering
+    os.makedirs('readings', exist_ok=True)
+    aggregate_log = AggregateLog(os.path.join('readings', 'aggregates.csv'))
+    options = profile.aggregation
+    # Histogram bins one raw count wide: a field's values never step by less than its scale
+    resolutions = {}
+    for port in profile.ports:
+        for slave in port.slaves:
+            for field in slave.register_map.fields.values():
+                if field.scale:
+                    resolutions[field.name] = min(abs(field.scale), resolutions.get(field.name, float('inf')))
+    aggregator = Aggregator(options.get('windows', (60, 3600)), on_window=aggregate_log, resolutions=resolutions)
+
+    alarm_log = AlarmLog(os.path.join('readings', 'alarms.log'))
+    sinks = [server.publish_alarm, alarm_log]
+    webhook = WebhookSink(profile.alarm_webhook) if profile.alarm_webhook else None
+    if webhook is not None:
+        sinks.append(webhook)
+    if not args.quiet:
+        sinks.append(lambda event: print(f"ALARM {'raised' if event.active else 'cleared'} "
+                                         f"[{event.port}/{event.address}] {event.rule}: {event.message}"))
+    alarms = AlarmEngine(profile.alarm_rules, sinks)
+    for port in profile.ports:
+        for slave in port.slaves:
+            # Sensors that never answer still go stale
+            alarms.expect(port.port, slave.address, list(slave.register_map.fields))
+    stale_checked = time.monotonic()
+
+    # SCADA reads the same registers over Modbus TCP without adding traffic on the serial lines
+    gateway = None
+    if profile.modbus_tcp is not None:
+        options = profile.modbus_tcp
+        gateway = ModbusTCPGateway(image, (options.get('host', '127.0.0.1'), options.get('port', 5020)),
+                                   options.get('max_age')).start()
+        print(f"Serving Modbus TCP on {gateway.address}")
+
+    # Request counters and latencies in Prometheus format at http://127.0.0.1:9105/metrics
+    serve_metrics(profile.metrics)
+    print(f"Publishing readings from {len(profile.ports)} port(s) on {server.address}")
+
+    poller.start()
+    try:
+        while True:
+            if time.monotonic() - stale_checked >= 1.0:
+                alarms.check_stale()
+                stale_checked = time.monotonic()
+            try:
+                reading = readings.get(timeout=0.5)  # Wakes up regularly so Ctrl+C is seen
+            except queue.Empty:
+                continue
+            server.publish(reading)
+            alarms.process_reading(reading)
+            aggregator.add_reading(reading)
+            if exporter is not None:
+                exporter.write(reading)
+            if not args.quiet:
+                values = ", ".join(f"{name}: {value:.1f}" for name, value in reading.values.items())
+                print(f"[{reading.port}/{reading.address}] {values}")
+    except KeyboardInterrupt:
+        print("Terminating the program.")
+        print(poller.stats())
+    finally:
+        poller.stop()
+        server.close()
+        aggregator.flush()
+        aggregate_log.close()
+        alarm_log.close()
+        if webhook is not None:
+            webhook.close()
+        if exporter is not None:
+            exporter.close()
+        if gateway is not None:
+            gateway.close()
+        for log in logs:
+            log.close()
+        for scheduler in poller.schedulers:
+            scheduler.ser.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+import array
+import collections
+import csv
+import math
+import threading
+
+# Streaming statistics over time windows, per sensor and channel, without keeping the
+# samples: each window holds a running count/min/max/mean/variance (Welford) and a
+# histogram at the sensor's resolution for percentiles. Both merge exactly, so coarse
+# windows are built from closed fine ones (1 min -> 1 h) instead of from raw samples.
+#
+#   TumblingWindow  back-to-back windows aligned to the clock (00:00-00:01, 00:01-00:02, ...)
+#   SlidingWindow   the last `length` seconds, advanced every `step` seconds
+
+# One raw count is 0.1 °C / 0.1 %RH, so percentiles from 0.1-wide bins are as good as exact
+DEFAULT_RESOLUTION = 0.1
+# A histogram with more bins than this has its bins widened (tripled) until it fits: the
+# -40..125 °C range at 0.1 is 1650 bins and stays exact, while a counter or a channel with
+# a finer resolution than its data needs cannot grow a window's memory with its sample count
+MAX_BINS = 2048
+
+WindowStats = collections.namedtuple('WindowStats', 'key channel length start end summary')
+
+class Summary:
+    # Mergeable statistics of a set of values. Memory is bounded by the number of distinct
+    # histogram bins, i.e. by the sensor's value range / resolution and at most max_bins,
+    # not by the sample count.
+    __slots__ = ('resolution', 'max_bins', 'count', 'min', 'max', 'mean', '_m2', '_bins', '_packed')
+
+    def __init__(self, resolution=DEFAULT_RESOLUTION, max_bins=MAX_BINS):
+        self.resolution = resolution  # Bin width; grows threefold each time the bins are widened
+        self.max_bins = max_bins
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._bins = {}  # round(value / resolution) -> count, None once packed
+        self._packed = None  # (bin array, count array) after pack()
+
+    def _unpack(self):
+        if self._bins is None:
+            self._bins = dict(zip(*self._packed))
+            self._packed = None
+
+    def pack(self):
+        # Shrinks the histogram to two flat arrays, for summaries that are complete and
+        # kept around (closed windows, sliding panes); adding to it afterwards still works
+        if self._bins is not None:
+            bins = sorted(self._bins)
+            self._packed = (array.array('i', bins), array.array('I', [self._bins[b] for b in bins]))
+            self._bins = None
+        return self
+
+    def histogram(self):
+        # (bin, count) pairs in bin order; a bin's value is bin * resolution
+        if self._bins is None:
+            return zip(*self._packed)
+        return sorted(self._bins.items())
+
+    def add(self, value):
+        if self._bins is None:
+            self._unpack()
+        self.count += 1
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        b = round(value / self.resolution)
+        bins = self._bins
+        n = bins.get(b)
+        if n is None:
+            bins[b] = 1
+            if len(bins) > self.max_bins:
+                self._widen()
+        else:
+            bins[b] = n + 1
+
+    def _triple(self):
+        # Old bins 3c-1, 3c and 3c+1 together cover exactly new bin c, so every value stays
+        # within half a bin of its bin's centre
+        merged = {}
+        for b, n in self._bins.items():
+            c = (b + 1) // 3
+            merged[c] = merged.get(c, 0) + n
+        self._bins = merged
+        self.resolution *= 3
+
+    def _widen(self):
+        while len(self._bins) > self.max_bins:
+            self._triple()
+
+    def merge(self, other):
+        # Chan et al. parallel variance; histograms add bin by bin
+        if other.count == 0:
+            return self
+        if self._bins is None:
+            self._unpack()
+        while other.resolution > self.resolution * 1.5:
+            self._triple()  # The other one was widened further: match its bins
+        steps = round(math.log(self.resolution / other.resolution, 3))
+        if self.count == 0:
+            self.mean, self._m2 = other.mean, other._m2
+        else:
+            count = self.count + other.count
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / count
+            self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        for b, n in other.histogram():
+            for _ in range(steps):
+                b = (b + 1) // 3
+            self._bins[b] = self._bins.get(b, 0) + n
+        if len(self._bins) > self.max_bins:
+            self._widen()
+        return self
+
+    def copy(self):
+        return Summary(self.resolution, self.max_bins).merge(self)
+
+    def variance(self):
+        # Population variance; 0.0 for fewer than two values
+        return self._m2 / self.count if self.count > 1 else 0.0
+
+    def stddev(self):
+        return math.sqrt(self.variance())
+
+    def percentile(self, p):
+        # Nearest-rank over the histogram, within resolution / 2 of the true value
+        if self.count == 0:
+            return None
+        rank = max(1, math.ceil(p / 100.0 * self.count))
+        seen = 0
+        for b, n in self.histogram():
+            seen += n
+            if seen >= rank:
+                return min(max(b * self.resolution, self.min), self.max)
+        return self.max
+
+    def as_dict(self, percentiles=(50, 95, 99)):
+        result = {'count': self.count}
+        if self.count:
+            result.update(min=self.min, max=self.max, mean=self.mean, variance=self.variance())
+            for p in percentiles:
+                result[f'p{p:g}'] = self.percentile(p)
+        return result
+
+class TumblingWindow:
+    # add() returns the Summary of the window it closed (or None) as (start, summary);
+    # windows with no samples are skipped rather than reported empty
+    def __init__(self, length, resolution=DEFAULT_RESOLUTION):
+        self.length = length
+        self.resolution = resolution
+        self.start = None
+        self.summary = Summary(resolution)
+
+    def _window_start(self, timestamp):
+        return math.floor(timestamp / self.length) * self.length
+
+    def _roll(self, timestamp):
+        start = self._window_start(timestamp)
+        closed = None
+        if self.start is not None and start > self.start and self.summary.count:
+            closed = (self.start, self.summary.pack())
+            self.summary = Summary(self.resolution)
+        if self.start is None or start > self.start:
+            self.start = start
+        return closed
+
+    def add(self, timestamp, value):
+        closed = self._roll(timestamp)
+        self.summary.add(value)
+        return closed
+
+    def merge(self, timestamp, summary):
+        # Rollup input: a closed finer window that started at timestamp
+        closed = self._roll(timestamp)
+        self.summary.merge(summary)
+        return closed
+
+    def flush(self):
+        # Closes the current window early, e.g. at shutdown
+        if self.start is None or not self.summary.count:
+            return None
+        closed = (self.start, self.summary.pack())
+        self.summary = Summary(self.resolution)
+        return closed
+
+class SlidingWindow:
+    # The last `length` seconds as length / step panes; the oldest pane is dropped each
+    # step, so memory is fixed at length / step summaries
+    def __init__(self, length, step, resolution=DEFAULT_RESOLUTION):
+        if length % step:
+            raise ValueError("length must be a multiple of step")
+        self.length = length
+        self.step = step
+        self.resolution = resolution
+        self._panes = collections.deque(maxlen=int(length // step))  # (pane start, Summary)
+
+    def add(self, timestamp, value):
+        pane = math.floor(timestamp / self.step) * self.step
+        if not self._panes or pane > self._panes[-1][0]:
+            if self._panes:
+                self._panes[-1][1].pack()
+            self._panes.append((pane, Summary(self.resolution)))
+        elif pane < self._panes[-1][0]:
+            return  # Out of order and already slid past
+        self._panes[-1][1].add(value)
+
+    def summary(self, now=None):
+        # Statistics of the panes still inside the window ending at now (default: the newest pane)
+        if not self._panes:
+            return Summary(self.resolution)
+        if now is None:
+            now = self._panes[-1][0] + self.step
+        total = Summary(self.resolution)
+        for pane, summary in self._panes:
+            if pane + self.step > now - self.length:
+                total.merge(summary)
+        return total
+
+class Aggregator:
+    # Per (key, channel) tumbling windows at each length in `lengths` (finest first), each
+    # coarser one fed by the windows the previous one closes, plus optional sliding windows.
+    # Keys are whatever separates sources, e.g. (port, slave address).
+    # on_window(WindowStats) is called for every window closed. resolutions maps channels
+    # to their histogram resolution (e.g. the register map's scale); others use resolution.
+    def __init__(self, lengths=(60, 3600), sliding=(), on_window=None, resolution=DEFAULT_RESOLUTION,
+                 resolutions=None):
+        lengths = sorted(lengths)
+        for fine, coarse in zip(lengths, lengths[1:]):
+            if coarse % fine:
+                raise ValueError(f"Window {coarse} s is not a multiple of {fine} s")
+        self.lengths = lengths
+        self.sliding = list(sliding)  # (length, step) pairs
+        self.on_window = on_window
+        self.resolution = resolution
+        self.resolutions = resolutions or {}
+        self.samples = 0
+        self._tumbling = {}  # (key, channel) -> [TumblingWindow per length]
+        self._sliding = {}  # (key, channel) -> [SlidingWindow per (length, step)]
+        self._lock = threading.Lock()
+
+    def _windows(self, series):
+        windows = self._tumbling.get(series)
+        if windows is None:
+            resolution = self.resolutions.get(series[1], self.resolution)
+            windows = self._tumbling[series] = [TumblingWindow(length, resolution) for length in self.lengths]
+            self._sliding[series] = [SlidingWindow(length, step, resolution) for length, step in self.sliding]
+        return windows
+
+    def add(self, key, values, timestamp):
+        # values: {channel: value}; None values (failed reads) are ignored
+        closed = []
+        with self._lock:
+            for channel, value in values.items():
+                if value is None:
+                    continue
+                series = (key, channel)
+                windows = self._windows(series)
+                self.samples += 1
+                for sliding in self._sliding[series]:
+                    sliding.add(timestamp, value)
+                result = windows[0].add(timestamp, value)
+                self._rollup(series, windows, 0, result, closed)
+        self._emit(closed)
+        return closed
+
+    def add_reading(self, reading):
+        # Reading from multi_port (port, address, values, timestamp)
+        return self.add((reading.port, reading.address), reading.values, reading.timestamp)
+
+    def _rollup(self, series, windows, level, result, closed):
+        while result is not None:
+            start, summary = result
+            key, channel = series
+            length = windows[level].length
+            closed.append(WindowStats(key, channel, length, start, start + length, summary))
+            level += 1
+            if level == len(windows):
+                return
+            result = windows[level].merge(start, summary)
+
+    def _emit(self, closed):
+        if self.on_window is not None:
+            for window in closed:
+                self.on_window(window)
+
+    def current(self, key, channel, length):
+        # Copy of the open (not yet closed) tumbling window of that length
+        with self._lock:
+            windows = self._tumbling.get((key, channel))
+            if windows is None:
+                return None
+            window = windows[self.lengths.index(length)]
+            # Coarser windows only see closed fine windows: add in the open finer ones
+            summary = window.summary.copy()
+            for finer in windows[:self.lengths.index(length)]:
+                summary.merge(finer.summary)
+            return summary
+
+    def sliding_summary(self, key, channel, length, step, now=None):
+        with self._lock:
+            windows = self._sliding.get((key, channel))
+            if windows is None:
+                return None
+            return windows[self.sliding.index((length, step))].summary(now)
+
+    def series(self):
+        with self._lock:
+            return sorted(self._tumbling, key=repr)
+
+    def flush(self):
+        # Closes every open window, finest first so each one still rolls up
+        closed = []
+        with self._lock:
+            for series, windows in self._tumbling.items():
+                for level, window in enumerate(windows):
+                    self._rollup(series, windows, level, window.flush(), closed)
+        self._emit(closed)
+        return closed
+
+class AggregateLog:
+    # on_window callback writing one CSV row per closed window
+    HEADER = ('port', 'address', 'channel', 'length', 'start', 'end', 'count',
+              'min', 'max', 'mean', 'stddev', 'p50', 'p95', 'p99')
+
+    def __init__(self, path):
+        self._file = open(path, 'a', newline='', buffering=1)
+        self._writer = csv.writer(self._file)
+        if self._file.tell() == 0:
+            self._writer.writerow(self.HEADER)
+
+    def __call__(self, window):
+        s = window.summary
+        port, address = window.key
+        self._writer.writerow((port, address, window.channel, f"{window.length:g}", f"{window.start:.0f}",
+                               f"{window.end:.0f}", s.count, f"{s.min:.2f}", f"{s.max:.2f}", f"{s.mean:.3f}",
+                               f"{s.stddev():.3f}", f"{s.percentile(50):.2f}", f"{s.percentile(95):.2f}",
+                               f"{s.percentile(99):.2f}"))
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,306 @@
+import bisect
+import collections
+import http.server
+import json
+import queue
+import sys
+import threading
+import time
+import urllib.request
+
+# Threshold alarms, evaluated by acquisition_daemon.py on every reading instead of in the
+# windows' paint handlers. Rules come from the "alarms" section of devices.json:
+#
+#   high / low  value above / below limit; clears only once back past limit -+ hysteresis
+#   rate        value changing faster than limit units per minute (either direction), measured
+#               against the newest reading at least window seconds old (60 by default), so
+#               a sensor flickering between two adjacent codes does not read as a fast change
+#   stale       no reading of the channel for limit seconds
+#
+# delay is a debounce: a condition must hold for delay seconds before the alarm is raised,
+# and be gone for delay seconds before it clears. Rules apply to one channel on every
+# sensor, or only to the given port and addresses. Each channel's rules are looked up once,
+# the first time the channel is seen, so a reading costs one dict lookup plus its rules.
+
+HIGH = 'high'
+LOW = 'low'
+RATE = 'rate'
+STALE = 'stale'
+KINDS = (HIGH, LOW, RATE, STALE)
+
+SEVERITIES = ('info', 'warning', 'alarm', 'critical')  # Least to most severe
+
+AlarmEvent = collections.namedtuple('AlarmEvent', 'timestamp port address channel rule severity active value message')
+
+class AlarmRule:
+    def __init__(self, name, channel, kind, limit, hysteresis=0.0, delay=0.0, severity='alarm', port=None,
+                 addresses=None, window=60.0):
+        if kind not in KINDS:
+            raise ValueError(f"Alarm {name!r}: unknown type {kind!r}, expected one of {', '.join(KINDS)}")
+        if severity not in SEVERITIES:
+            raise ValueError(f"Alarm {name!r}: unknown severity {severity!r}")
+        if kind == RATE and not window > 0:
+            raise ValueError(f"Alarm {name!r}: rate window must be positive")
+        self.name = name
+        self.channel = channel
+        self.kind = kind
+        self.limit = limit
+        self.hysteresis = hysteresis
+        self.delay = delay
+        self.severity = severity
+        self.port = port  # None: every port
+        self.addresses = None if addresses is None else frozenset(addresses)  # None: every slave
+        self.window = window  # rate: seconds the change is measured over
+
+    def applies_to(self, port, address):
+        return ((self.port is None or self.port == port)
+                and (self.addresses is None or address in self.addresses))
+
+    def describe(self, value, active=True):
+        if self.kind == STALE:
+            return f"{self.channel}: no reading for {self.limit:g} s" if active else f"{self.channel}: readings resumed"
+        if self.kind == RATE:
+            if active:
+                return f"{self.channel}: changing by {value:.2f}/min, limit {self.limit:g}/min"
+            return f"{self.channel}: rate back to {value:.2f}/min"
+        if active:
+            return f"{self.channel}: {value:.1f} {'above' if self.kind == HIGH else 'below'} {self.limit:g}"
+        return f"{self.channel}: back to {value:.1f} (limit {self.limit:g})"
+
+class _Channel:
+    # Compiled rules of one (port, address, channel) and their states
+    __slots__ = ('port', 'address', 'channel', 'rules', 'active', 'since', 'raised', 'last_value', 'last_time',
+                 'stale', 'rate_window', 'times', 'values')
+
+    def __init__(self, port, address, channel, rules):
+        self.port = port
+        self.address = address
+        self.channel = channel
+        self.rules = rules
+        self.active = [False] * len(rules)
+        self.since = [None] * len(rules)  # When the condition started to differ from the state
+        self.raised = [None] * len(rules)  # The AlarmEvent that raised each active alarm
+        self.last_value = None
+        self.last_time = None
+        self.stale = any(rule.kind == STALE for rule in rules)
+        # Recent readings, reaching back just past the longest rate window
+        windows = [rule.window for rule in rules if rule.kind == RATE]
+        self.rate_window = max(windows) if windows else None
+        self.times = collections.deque() if windows else None
+        self.values = collections.deque() if windows else None
+
+    def rate(self, window, timestamp, value):
+        # Change per minute since the newest reading at least window seconds before timestamp,
+        # or None while the readings do not reach back that far yet
+        times = self.times
+        i = bisect.bisect_right(times, timestamp - window) - 1
+        if i < 0 or timestamp <= times[i]:
+            return None
+        return (value - self.values[i]) * 60.0 / (timestamp - times[i])
+
+    def remember(self, timestamp, value):
+        times, values = self.times, self.values
+        if times and timestamp < times[-1]:
+            return  # Out of order
+        times.append(timestamp)
+        values.append(value)
+        oldest = timestamp - self.rate_window
+        while len(times) > 1 and times[1] <= oldest:
+            times.popleft()
+            values.popleft()
+
+class AlarmEngine:
+    # process() returns the AlarmEvents a reading caused and passes them to every on_event
+    # callback. Not thread-safe: call it from the one thread handling readings.
+    def __init__(self, rules=(), on_event=()):
+        self.rules = list(rules)
+        self.on_event = list(on_event)
+        self._by_channel = collections.defaultdict(list)
+        for rule in self.rules:
+            self._by_channel[rule.channel].append(rule)
+        self._channels = {}  # (port, address, channel) -> _Channel, or None when no rule applies
+        self._stale_channels = []
+        self.evaluations = 0
+        self.events = 0
+
+    def _compile(self, port, address, channel):
+        rules = tuple(rule for rule in self._by_channel.get(channel, ()) if rule.applies_to(port, address))
+        compiled = _Channel(port, address, channel, rules) if rules else None
+        self._channels[(port, address, channel)] = compiled
+        if compiled is not None and compiled.stale:
+            self._stale_channels.append(compiled)
+        return compiled
+
+    def expect(self, port, address, channels, now=None):
+        # Starts the stale clock of a sensor that may never answer at all
+        now = time.time() if now is None else now
+        for channel in channels:
+            compiled = self._channels.get((port, address, channel), False)
+            if compiled is False:
+                compiled = self._compile(port, address, channel)
+            if compiled is not None and compiled.last_time is None:
+                compiled.last_time = now
+
+    def process(self, port, address, values, timestamp):
+        events = []
+        channels = self._channels
+        for channel, value in values.items():
+            if value is None:
+                continue
+            compiled = channels.get((port, address, channel), False)
+            if compiled is False:
+                compiled = self._compile(port, address, channel)
+            if compiled is None:
+                continue
+            self._evaluate(compiled, value, timestamp, events)
+        self._emit(events)
+        return events
+
+    def process_reading(self, reading):
+        return self.process(reading.port, reading.address, reading.values, reading.timestamp)
+
+    def _evaluate(self, compiled, value, timestamp, events):
+        for i, rule in enumerate(compiled.rules):
+            active = compiled.active[i]
+            kind = rule.kind
+            if kind == HIGH:
+                condition = value > (rule.limit - rule.hysteresis if active else rule.limit)
+            elif kind == LOW:
+                condition = value < (rule.limit + rule.hysteresis if active else rule.limit)
+            elif kind == RATE:
+                rate = compiled.rate(rule.window, timestamp, value)
+                if rate is None:
+                    continue
+                condition = abs(rate) > (rule.limit - rule.hysteresis if active else rule.limit)
+                self._debounce(compiled, i, condition, rate, timestamp, events)
+                continue
+            else:
+                condition = False  # A reading just arrived, so the channel is not stale
+            self._debounce(compiled, i, condition, value, timestamp, events)
+        if compiled.times is not None:
+            compiled.remember(timestamp, value)
+        compiled.last_value = value
+        compiled.last_time = timestamp
+        self.evaluations += len(compiled.rules)
+
+    def _debounce(self, compiled, i, condition, value, timestamp, events, delay=None):
+        if condition == compiled.active[i]:
+            compiled.since[i] = None
+            return
+        rule = compiled.rules[i]
+        since = compiled.since[i]
+        if since is None:
+            since = compiled.since[i] = timestamp
+        if timestamp - since < (rule.delay if delay is None else delay):
+            return
+        compiled.active[i] = condition
+        compiled.since[i] = None
+        event = AlarmEvent(timestamp, compiled.port, compiled.address, compiled.channel, rule.name, rule.severity,
+                           condition, value, rule.describe(value, condition))
+        compiled.raised[i] = event if condition else None
+        events.append(event)
+
+    def check_stale(self, now=None):
+        # Call regularly (e.g. every second) to raise stale alarms between readings
+        now = time.time() if now is None else now
+        events = []
+        for compiled in self._stale_channels:
+            if compiled.last_time is None:
+                continue
+            for i, rule in enumerate(compiled.rules):
+                if rule.kind == STALE and not compiled.active[i] and now - compiled.last_time > rule.limit:
+                    self._debounce(compiled, i, True, compiled.last_value, now, events, delay=0.0)
+        self._emit(events)
+        return events
+
+    def _emit(self, events):
+        self.events += len(events)
+        for event in events:
+            for callback in self.on_event:
+                callback(event)
+
+    def active(self):
+        # The AlarmEvent that raised each alarm still active
+        return [event for compiled in self._channels.values() if compiled is not None
+                for event in compiled.raised if event is not None]
+
+    def stats(self):
+        return {
+            'rules': len(self.rules),
+            'channels': sum(1 for compiled in self._channels.values() if compiled is not None),
+            'evaluations': self.evaluations,
+            'events': self.events,
+        }
+
+def event_json(event):
+    return json.dumps(event._asdict())
+
+class AlarmLog:
+    # on_event callback appending one JSON object per line
+    def __init__(self, path):
+        self._file = open(path, 'a', buffering=1)
+
+    def __call__(self, event):
+        self._file.write(event_json(event) + '\n')
+
+    def close(self):
+        self._file.close()
+
+class WebhookSink:
+    # on_event callback POSTing each event as JSON from a background thread, so a slow or
+    # unreachable endpoint never holds up polling; events beyond max_queue are dropped
+    def __init__(self, url, timeout=2.0, max_queue=1000):
+        self.url = url
+        self.timeout = timeout
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self._events = queue.Queue(max_queue)
+        threading.Thread(target=self._run, name="alarm-webhook", daemon=True).start()
+
+    def __call__(self, event):
+        try:
+            self._events.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            event = self._events.get()
+            if event is None:
+                return
+            request = urllib.request.Request(self.url, event_json(event).encode(),
+                                             {'Content-Type': 'application/json'})
+            try:
+                urllib.request.urlopen(request, timeout=self.timeout).close()
+                self.sent += 1
+            except OSError:
+                self.failed += 1
+
+    def close(self):
+        self._events.put(None)
+
+class _StandInHandler(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        event = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        state = 'RAISED ' if event['active'] else 'cleared'
+        print(f"{time.strftime('%H:%M:%S', time.localtime(event['timestamp']))} {state} {event['severity']:>8} "
+              f"[{event['port']}/{event['address']}] {event['rule']}: {event['message']}", flush=True)
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    # Webhook stand-in: prints the alarms the daemon posts to http://127.0.0.1:<port>/alarms
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8099
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', port), _StandInHandler)
+    print(f"Listening for alarm webhooks on http://127.0.0.1:{port}/alarms")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
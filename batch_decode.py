@@ -0,0 +1,86 @@
+import numpy as np
+
+from modbus_crc import CRC_INIT, CRC_TABLE
+from modbus_rtu import READ_HOLDING_REGISTERS
+from register_map import SENSOR_MAP
+
+# Bulk counterpart of check_crc/decode_sensor_data for replays and backfills: a buffer
+# of N back-to-back function-3 replies of the same size is validated and converted with
+# a handful of whole-array NumPy operations instead of N trips through Python.
+
+_CRC_TABLE = np.array(CRC_TABLE, dtype=np.uint16)
+
+def frame_dtype(num_registers):
+    # One function-3 reply: address, function, byte count, big-endian registers, CRC (low byte first)
+    return np.dtype([
+        ('address', 'u1'),
+        ('function', 'u1'),
+        ('byte_count', 'u1'),
+        ('registers', '>u2', (num_registers,)),
+        ('crc', '<u2'),
+    ])
+
+def crc_many(data):
+    # CRC of every row of a 2-D uint8 array; one table lookup per column across all rows
+    crc = np.full(len(data), CRC_INIT, dtype=np.uint16)
+    for column in data.T:
+        crc = (crc >> 8) ^ _CRC_TABLE[(crc ^ column) & 0xFF]
+    return crc
+
+def calibration_arrays(calibration, names):
+    # {address: {field name: (gain, bias)}} -> per-field gain and bias arrays indexed by address.
+    # One calibration can cover every block of a register map, so fields outside names are skipped.
+    gains = {name: np.ones(256) for name in names}
+    biases = {name: np.zeros(256) for name in names}
+    for address, fields in (calibration or {}).items():
+        for name, (gain, bias) in fields.items():
+            if name not in gains:
+                continue
+            gains[name][address] = gain
+            biases[name][address] = bias
+    return gains, biases
+
+def decode_register_array(registers, addresses, block, calibration=None):
+    # registers: (N, block.count) raw values; returns {field name: float64 array} with the
+    # field's scale/offset applied and then the per-sensor gain/bias from calibration
+    registers = np.asarray(registers)
+    addresses = np.asarray(addresses)
+    names = [field.name for field in block.fields]
+    gains, biases = calibration_arrays(calibration, names)
+    values = {}
+    for field in block.fields:
+        column = field.address - block.start
+        raw = registers[:, column].astype(np.int64)
+        if field.count == 2:
+            raw = (raw << 16) | registers[:, column + 1]
+        if field.signed:
+            bits = 16 * field.count
+            raw = np.where(raw >= 1 << (bits - 1), raw - (1 << bits), raw)
+        value = raw * field.scale + field.offset
+        if calibration:
+            value = value * gains[field.name][addresses] + biases[field.name][addresses]
+        values[field.name] = value
+    return values
+
+def decode_frames(buffer, register_map=SENSOR_MAP, calibration=None):
+    # buffer: bytes-like holding whole replies to the first block of register_map.
+    # Returns a structured array with address, valid and one float64 column per field;
+    # frames failing the CRC, function code or byte count check are valid=False with NaN values.
+    block = register_map.blocks()[0]
+    dtype = frame_dtype(block.count)
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    if len(data) % dtype.itemsize:
+        raise ValueError(f"Buffer of {len(data)} bytes is not a whole number of {dtype.itemsize}-byte frames")
+
+    frames = data.view(dtype)
+    valid = ((crc_many(data.reshape(-1, dtype.itemsize)) == 0)
+             & (frames['function'] == READ_HOLDING_REGISTERS)
+             & (frames['byte_count'] == 2 * block.count))
+
+    values = decode_register_array(frames['registers'], frames['address'], block, calibration)
+    out = np.empty(len(frames), dtype=[('address', 'u1'), ('valid', '?')] + [(name, 'f8') for name in values])
+    out['address'] = frames['address']
+    out['valid'] = valid
+    for name, value in values.items():
+        out[name] = np.where(valid, value, np.nan)
+    return out
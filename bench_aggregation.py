@@ -0,0 +1,65 @@
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from aggregation import Aggregator
+
+def make_readings(sensors, seconds, seed=0):
+    # One reading per sensor per second, quantised to the sensor's 0.1 resolution
+    rng = np.random.default_rng(seed)
+    temperature = np.round(rng.normal(25.0, 2.0, (seconds, sensors)), 1)
+    humidity = np.round(rng.uniform(30.0, 60.0, (seconds, sensors)), 1)
+    return temperature, humidity
+
+def feed(aggregator, temperature, humidity, start_time):
+    seconds, sensors = temperature.shape
+    for second in range(seconds):
+        timestamp = start_time + second
+        for sensor in range(sensors):
+            aggregator.add(('sim', sensor + 1), {'temperature': float(temperature[second, sensor]),
+                                                 'humidity': float(humidity[second, sensor])}, timestamp)
+
+def main():
+    sensors = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    seconds = int(sys.argv[2]) if len(sys.argv) > 2 else 3 * 3600
+    temperature, humidity = make_readings(sensors, seconds)
+    start_time = 1699999200.0  # On an hour boundary
+
+    windows = []
+    aggregator = Aggregator((60, 3600), sliding=[(3600, 60)], on_window=windows.append)
+    start = time.perf_counter()
+    feed(aggregator, temperature, humidity, start_time)
+    aggregator.flush()
+    elapsed = time.perf_counter() - start
+
+    # What the aggregator itself holds once every window is populated (closed windows not kept)
+    tracemalloc.start()
+    steady = Aggregator((60, 3600), sliding=[(3600, 60)])
+    feed(steady, temperature[:3600], humidity[:3600], start_time)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Hourly rollups (built from the minute windows) must match statistics over the raw samples
+    for window in windows:
+        if window.length != 3600 or window.channel != 'temperature':
+            continue
+        _, sensor = window.key
+        first = int(window.start - start_time)
+        raw = temperature[first:first + 3600, sensor - 1]
+        summary = window.summary
+        assert summary.count == len(raw)
+        assert np.isclose(summary.mean, raw.mean()) and np.isclose(summary.variance(), raw.var())
+        assert summary.min == raw.min() and summary.max == raw.max()
+        for p in (50, 95, 99):
+            assert np.isclose(summary.percentile(p), np.percentile(raw, p, method='inverted_cdf'))
+
+    samples = aggregator.samples
+    print(f"{sensors} sensors x {seconds} s: {samples} samples, {len(windows)} windows closed")
+    print(f"{elapsed:.2f} s, {samples / elapsed:,.0f} samples/s, {elapsed / samples * 1e6:.2f} us/sample")
+    print(f"aggregator state {held / 1e6:.1f} MB ({held / (2 * sensors) / 1e3:.0f} kB per sensor channel), "
+          f"the same no matter how long it runs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import sys
+import time
+
+import numpy as np
+
+from alarms import AlarmEngine
+from device_profile import load_profile
+
+def main():
+    # Every sensor on 10 ports x 250 addresses runs the rules in devices.json
+    readings = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    sensors = [(f"COM{port}", address) for port in range(10) for address in range(1, 251)]
+    rules = load_profile().alarm_rules
+    events = []
+    engine = AlarmEngine(rules, [events.append])
+
+    rng = np.random.default_rng(0)
+    temperature = rng.normal(22.0, 6.0, readings).round(1).tolist()
+    humidity = rng.normal(40.0, 15.0, readings).round(1).tolist()
+    start_time = 1700000000.0
+
+    start = time.perf_counter()
+    for i in range(readings):
+        port, address = sensors[i % len(sensors)]
+        engine.process(port, address, {'temperature': temperature[i], 'humidity': humidity[i]},
+                       start_time + i * 0.001)
+        if i % 1000 == 0:
+            engine.check_stale(start_time + i * 0.001)
+    elapsed = time.perf_counter() - start
+
+    stats = engine.stats()
+    print(f"{len(rules)} rules, {stats['channels']} channels, {readings} readings in {elapsed:.2f} s")
+    print(f"{readings / elapsed:,.0f} readings/s, {readings * 2 / elapsed:,.0f} channel values/s, "
+          f"{stats['evaluations'] / elapsed:,.0f} rule evaluations/s")
+    print(f"{len(events)} alarm events, {len(engine.active())} alarms raised at the end")
+
+if __name__ == "__main__":
+    main()
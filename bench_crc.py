@@ -0,0 +1,58 @@
+import os
+import random
+import struct
+import time
+
+from modbus_crc import calculate_crc, calculate_crc_bitwise, check_frames, CRCStream
+
+def make_frames(count, seed=0):
+    # Typical 9-byte function-3 replies (address, function, byte count, 2 registers, CRC)
+    rng = random.Random(seed)
+    frames = []
+    for _ in range(count):
+        body = struct.pack('>BBBHH', rng.randint(1, 247), 3, 4, rng.randint(0, 0xFFFF), rng.randint(0, 1000))
+        frames.append(body + struct.pack('<H', calculate_crc_bitwise(body)))
+    return frames
+
+def time_it(func, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def check_equal_output(samples=2000):
+    rng = random.Random(1)
+    for _ in range(samples):
+        data = os.urandom(rng.randint(0, 260))
+        expected = calculate_crc_bitwise(data)
+        assert calculate_crc(data) == expected, data.hex()
+
+        stream = CRCStream()
+        pos = 0
+        while pos < len(data):
+            step = rng.randint(1, 16)
+            stream.update(data[pos:pos + step])
+            pos += step
+        assert stream.crc == expected, data.hex()
+
+def main():
+    check_equal_output()
+    print("Table and streaming CRC match the bit-loop implementation.")
+
+    frames = make_frames(100000)
+    total_bytes = sum(len(f) for f in frames)
+
+    bitwise = time_it(lambda: [calculate_crc_bitwise(f) == 0 for f in frames])
+    table = time_it(lambda: [calculate_crc(f) == 0 for f in frames])
+    batch = time_it(check_frames, frames)
+
+    print(f"{len(frames)} frames, {total_bytes} bytes")
+    for name, elapsed in (("bit-loop", bitwise), ("table", table), ("batch", batch)):
+        print(f"{name:>9}: {elapsed * 1000:8.1f} ms  {len(frames) / elapsed:12.0f} frames/s  "
+              f"{bitwise / elapsed:5.2f}x")
+
+if __name__ == "__main__":
+    main()
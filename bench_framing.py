@@ -0,0 +1,38 @@
+import statistics
+import time
+
+from modbus_rtu import create_request_command, decode_sensor_data, read_sensor_data
+from sim_serial import SimulatedSerial, SimulatedSlave
+
+def legacy_read_sensor_data(ser):
+    # The original fixed-delay poll: write, sleep 1 s, then read 9 bytes
+    request_command = create_request_command(1, 3, 0, 2)
+    ser.write(request_command)
+    time.sleep(1)
+    response = ser.read(9)
+    if response and len(response) >= 9:
+        return decode_sensor_data(response)
+    return None, None
+
+def measure(poll, ser, count):
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        temperature, humidity = poll(ser)
+        latencies.append(time.perf_counter() - start)
+        assert temperature is not None and humidity is not None
+    return latencies
+
+def report(name, latencies):
+    mean = statistics.mean(latencies)
+    print(f"{name:>12}: mean {mean * 1000:8.2f} ms  max {max(latencies) * 1000:8.2f} ms  "
+          f"{1 / mean:7.1f} polls/s")
+
+def main():
+    ser = SimulatedSerial([SimulatedSlave(1, [1050, 455])], baudrate=9600, timeout=1)
+    print("Per-poll cost at 9600 baud against a simulated slave (5 ms turnaround)")
+    report("sleep(1)", measure(legacy_read_sensor_data, ser, 3))
+    report("read_frame", measure(read_sensor_data, ser, 50))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import socket
+import sys
+import threading
+import time
+
+from bus_scheduler import BusScheduler, Slave
+from modbus_tcp import ModbusTCPGateway, RegisterImage, read_holding_registers_tcp
+from sim_serial import open_serial
+
+def hammer(address, unit, stop, counts, index):
+    # One SCADA client reading unit's two registers back to back
+    with socket.create_connection(address) as connection:
+        while not stop.is_set():
+            read_holding_registers_tcp(connection, unit, 0, 2)
+            counts[index] += 1
+
+def run(clients, duration):
+    ser = open_serial('sim://?slaves=1-10&baudrate=9600&latency=0.005')
+    image = RegisterImage()
+    scheduler = BusScheduler(ser, [Slave(a, 1.0) for a in range(1, 11)],
+                             on_registers=lambda slave, block, registers: image.update(slave.address, block.start, registers))
+    gateway = ModbusTCPGateway(image, ('127.0.0.1', 0), max_age=30.0).start()
+    bus = threading.Thread(target=scheduler.run, args=(duration + 1.0,))
+    bus.start()
+    time.sleep(1.0)  # Let every slave be polled once
+
+    stop = threading.Event()
+    counts = [0] * clients
+    threads = [threading.Thread(target=hammer, args=(gateway.address, i % 10 + 1, stop, counts, i)) for i in range(clients)]
+    before = ser.requests
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    serial_requests = ser.requests - before
+    bus.join()
+    gateway.close()
+    return sum(counts) / duration, serial_requests / duration
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    print("10 slaves at 1 Hz on a simulated 9600 baud line")
+    for clients in (0, 1, 10, 50):
+        tcp_rate, serial_rate = run(clients, duration)
+        print(f"{clients:3d} TCP clients: {tcp_rate:9.0f} TCP reads/s, {serial_rate:5.1f} serial requests/s")
+
+if __name__ == "__main__":
+    main()
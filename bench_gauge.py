@@ -0,0 +1,68 @@
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from gauge_widget import GaugePanel, load_icon
+
+def legacy_render(ax, canvas, icon_image, value):
+    # The original per-tick gauge update: clear, rebuild every artist, full draw
+    ax.clear()
+    ax.set_aspect('equal')
+    ax.set_xlim(-2.2, 2.2)
+    ax.set_ylim(-2.2, 2.2)
+    clamped = max(0, min(value, 100))
+    theta = np.linspace(1.5 * np.pi, 1.5 * np.pi - 2 * np.pi * clamped / 100, 100)
+    ax.plot(1.5 * np.cos(theta), 1.5 * np.sin(theta), color="red", lw=2)
+    ax.plot(1.5 * np.cos(1.5 * np.pi), 1.5 * np.sin(1.5 * np.pi), 'ro', markersize=6)
+    ax.imshow(np.array(icon_image), extent=[-0.5, 0.5, -0.2, 0.8], aspect='auto', alpha=0.8)
+    ax.text(0, -1.0, f"{value:.1f}°C", fontsize=14, ha='center', va='center', color='black')
+    ax.axis('off')
+    canvas.draw()
+
+def make_canvas():
+    fig = Figure(figsize=(3, 3), dpi=100)
+    ax = fig.add_subplot(111)
+    return ax, FigureCanvasAgg(fig)
+
+def time_frames(render, frames):
+    values = np.linspace(0, 100, frames)
+    start = time.perf_counter()
+    for value in values:
+        render(float(value))
+    return (time.perf_counter() - start) / frames
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    dashboard = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    icon_image = Image.open("Temperature_icon.png")
+
+    ax, canvas = make_canvas()
+    before = time_frames(lambda value: legacy_render(ax, canvas, icon_image, value), frames)
+
+    ax, canvas = make_canvas()
+    panel = GaugePanel(ax.figure, canvas)
+    panel.add_gauge(ax, color="red", marker='ro', icon=load_icon("Temperature_icon.png"), unit="°C")
+    panel.set_values([0.0])  # First frame does the one full draw
+    after = time_frames(lambda value: panel.set_values([value]), frames)
+
+    print(f"Gauge render time over {frames} frames (Agg, 300x300 px)")
+    for name, per_frame in (("clear + redraw", before), ("persistent + blit", after)):
+        print(f"{name:>18}: {per_frame * 1000:7.2f} ms/frame  {1 / per_frame:7.1f} fps  ({before / per_frame:.1f}x)")
+
+    # Dashboard: every sensor's gauge in one figure, refreshed with a single blit
+    columns = 10
+    fig = Figure(figsize=(columns * 1.5, (dashboard + columns - 1) // columns * 1.5), dpi=100)
+    canvas = FigureCanvasAgg(fig)
+    panel = GaugePanel.grid(fig, canvas, dashboard, columns, color="red", marker='ro',
+                            icon=load_icon("Temperature_icon.png"), unit="°C")
+    panel.set_values([0.0] * dashboard)
+    per_refresh = time_frames(lambda value: panel.set_values([value] * dashboard), max(frames // 10, 5))
+    print(f"{dashboard} gauges in one canvas: {per_refresh * 1000:7.2f} ms/refresh "
+          f"(separate clear + redraw figures: ~{before * dashboard * 1000:.0f} ms)")
+
+if __name__ == "__main__":
+    main()
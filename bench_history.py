@@ -0,0 +1,44 @@
+import sys
+import time
+
+import numpy as np
+
+from history import SeriesHistory
+
+SPANS = (('10 min', 600), ('1 h', 3600), ('1 day', 86400), ('1 week', 7 * 86400), ('30 days', 30 * 86400),
+         ('90 days', 90 * 86400))
+
+def main():
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 90
+    pixels = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    count = days * 86400  # One reading per second
+    rng = np.random.default_rng(0)
+    times = 1699999200.0 + np.arange(count, dtype=np.float64)
+    values = (25.0 + np.cumsum(rng.normal(0.0, 0.01, count))).astype(np.float32)
+
+    history = SeriesHistory(raw_capacity=count)  # Keep every raw sample so both paths can be compared
+    start = time.perf_counter()
+    history.extend(times, values)
+    print(f"{count} readings ({days} days at 1/s) loaded in {time.perf_counter() - start:.2f} s")
+
+    # Readings arriving one at a time, as from the feed
+    live = SeriesHistory()
+    start = time.perf_counter()
+    for t, v in zip(times[:100000].tolist(), values[:100000].tolist()):
+        live.add(t, v)
+    print(f"live add: {(time.perf_counter() - start) / 100000 * 1e6:.2f} us per reading")
+
+    end = times[-1] + 1
+    print(f"{'span':>8} {'resolution':>10} {'points':>7} {'query ms':>9} {'raw points':>11}")
+    for name, span in SPANS:
+        if span > count:
+            continue
+        start = time.perf_counter()
+        for _ in range(100):
+            result = history.query(end - span, end, pixels)
+        elapsed = (time.perf_counter() - start) / 100
+        raw = np.searchsorted(times, end - span)
+        print(f"{name:>8} {result.resolution:>9}s {len(result.time):>7} {elapsed * 1000:9.3f} {count - raw:>11}")
+
+if __name__ == "__main__":
+    main()
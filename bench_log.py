@@ -0,0 +1,64 @@
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from reading_log import ReadingLog
+
+def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    directory = tempfile.mkdtemp(prefix='reading_log_')
+    try:
+        # 30 slaves polled at 10 Hz: 300 readings per second of log time
+        rate = 300.0
+        start_time = 1700000000.0
+
+        log = ReadingLog(directory, registers=8)
+        count = min(records, 200000)
+        started = time.perf_counter()
+        for i in range(count):
+            log.append(start_time + i / rate, i % 30 + 1, 0, (1050, 455))
+        log.flush()
+        per_record = (time.perf_counter() - started) / count
+        print(f"append():      {1 / per_record:12.0f} records/s")
+
+        bulk = np.zeros(records, dtype=log.dtype)
+        bulk['timestamp'] = start_time + (count + np.arange(records)) / rate
+        bulk['slave'] = np.arange(records) % 30 + 1
+        bulk['count'] = 2
+        bulk['registers'][:, 0] = 1050
+        bulk['registers'][:, 1] = 455
+        started = time.perf_counter()
+        log.append_many(bulk)
+        elapsed = time.perf_counter() - started
+        print(f"append_many(): {records / elapsed:12.0f} records/s  ({records * log.dtype.itemsize / elapsed / 1e6:.0f} MB/s)")
+        log.close()
+
+        total = count + records
+        span = total / rate
+        print(f"{total} records, {span / 3600:.1f} h of data, {len(log.segments())} segments, "
+              f"{log.dtype.itemsize} bytes/record")
+
+        reader = ReadingLog(directory)
+        rng = random.Random(0)
+        for window in (1.0, 60.0, 3600.0):
+            latencies = []
+            found = 0
+            for _ in range(200):
+                t0 = start_time + rng.uniform(0, max(span - window, 0))
+                started = time.perf_counter()
+                views = reader.query(t0, t0 + window)
+                found += sum(len(v) for v in views)
+                latencies.append(time.perf_counter() - started)
+            print(f"query {window:6.0f} s window: median {statistics.median(latencies) * 1e6:8.1f} us, "
+                  f"{found / 200:9.0f} records/query (memory-mapped, no copy)")
+        reader.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
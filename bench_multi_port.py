@@ -0,0 +1,45 @@
+import asyncio
+import sys
+
+from bus_scheduler import BusScheduler, Slave
+from multi_port import MultiPortPoller
+from sim_serial import SimulatedSerial, SimulatedSlave
+
+SLAVES_PER_PORT = 5
+
+def make_poller(num_ports):
+    poller = MultiPortPoller()
+    for index in range(num_ports):
+        addresses = range(1, SLAVES_PER_PORT + 1)
+        ser = SimulatedSerial([SimulatedSlave(a, [1050 + a, 455]) for a in addresses],
+                              baudrate=9600, timeout=1, port=f"SIM{index}")
+        poller.add_bus(BusScheduler(ser, [Slave(a, poll_period=0.0) for a in addresses]))
+    return poller
+
+async def run(num_ports, duration):
+    poller = make_poller(num_ports)
+    received = 0
+
+    async def consume():
+        nonlocal received
+        async for _ in poller.stream():
+            received += 1
+
+    consumer = asyncio.ensure_future(consume())
+    await asyncio.sleep(0)  # Let the consumer subscribe before the workers start
+    await poller.run(duration)
+    await asyncio.sleep(0.05)
+    consumer.cancel()
+    return poller.readings_per_second(), received
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    print(f"{SLAVES_PER_PORT} simulated slaves per port at 9600 baud, {duration:.0f} s per run")
+    baseline = None
+    for num_ports in (1, 2, 4, 8):
+        rate, received = asyncio.run(run(num_ports, duration))
+        baseline = baseline or rate
+        print(f"{num_ports} port(s): {rate:7.1f} readings/s  ({rate / baseline:4.2f}x, {received} streamed)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from modbus_crc import calculate_crc
+from modbus_rtu import REQUEST_CACHE, create_request_command, decode_sensor_data, read_sensor_data
+from sim_serial import open_serial
+
+# End-to-end benchmark against a simulated sensor. Prints a summary and optionally
+# writes JSON (--json) that a later run can be compared against (--compare).
+
+DEFAULT_URL = 'sim://?slaves=1&baudrate=115200&latency=0.002'
+
+def percentiles(samples):
+    samples = np.asarray(samples) * 1000.0
+    return {'p50_ms': float(np.percentile(samples, 50)), 'p99_ms': float(np.percentile(samples, 99))}
+
+def bench_components(count):
+    request = create_request_command(1, 3, 0, 2)
+    response = bytes.fromhex('010304042401c7')  # Slave 1, function 3, two registers
+    response += calculate_crc(response).to_bytes(2, 'little')
+
+    results = {}
+    for name, func in (('crc_us', lambda: calculate_crc(request)),
+                       ('request_build_us', lambda: create_request_command(1, 3, 0, 2)),
+                       ('request_cached_us', lambda: REQUEST_CACHE.get(1, 3, 0, 2)),
+                       ('decode_us', lambda: decode_sensor_data(response))):
+        start = time.perf_counter()
+        for _ in range(count):
+            func()
+        results[name] = (time.perf_counter() - start) / count * 1e6
+    return results
+
+def bench_acquisition(url, polls, handle=None):
+    # Tight polling loop through read_sensor_data; handle(temperature, humidity) stands in for a front-end
+    ser = open_serial(url)
+    latencies = []
+    failures = 0
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(polls):
+        start = time.perf_counter()
+        temperature, humidity = read_sensor_data(ser)
+        if temperature is None:
+            failures += 1
+        elif handle is not None:
+            handle(temperature, humidity)
+        latencies.append(time.perf_counter() - start)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    ser.close()
+
+    result = {'readings_per_second': polls / wall, 'cpu_us_per_reading': cpu / polls * 1e6, 'failures': failures}
+    result.update({'latency_' + k: v for k, v in percentiles(latencies).items()})
+    return result
+
+def time_frames(render, frames):
+    values = np.linspace(0.0, 100.0, frames)
+    times = []
+    for value in values:
+        start = time.perf_counter()
+        render(float(value))
+        times.append(time.perf_counter() - start)
+    return {'frame_' + k: v for k, v in percentiles(times).items()}
+
+def bench_console(url, polls):
+    # The without_GUI.py loop minus its 3 s pause, printing into a buffer
+    out = io.StringIO()
+
+    def handle(temperature, humidity):
+        print(f"Temperature: {temperature:.1f}°C, Humidity: {humidity:.1f}%", file=out)
+
+    return bench_acquisition(url, polls, handle)
+
+def bench_tk_gauges(frames):
+    # Sensor_Reading.py gauges, rendered on an Agg canvas so no display is needed
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from gauge_widget import GaugePanel, load_icon
+
+    panels = []
+    for color, marker, icon, unit in (("red", 'ro', "Temperature_icon.png", "°C"), ("blue", 'bo', "Humidity_icon.png", "%")):
+        fig = Figure(figsize=(3, 3), dpi=100)
+        panel = GaugePanel(fig, FigureCanvasAgg(fig))
+        panel.add_gauge(fig.add_subplot(111), color=color, marker=marker, icon=load_icon(icon), unit=unit)
+        panel.set_values([0.0])
+        panels.append(panel)
+
+    def render(value):
+        for panel in panels:
+            panel.set_values([value])
+
+    return time_frames(render, frames)
+
+def qt_application():
+    if not os.environ.get('DISPLAY') and sys.platform.startswith('linux'):
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
+
+def bench_qt(module_name, frames):
+    app = qt_application()
+    module = __import__(module_name)
+    widget = module.SensorApp()
+    widget.worker.stop()  # Readings are fed directly below rather than from the daemon
+    widget.show()
+    app.processEvents()
+
+    def render(value):
+        widget.worker.publish((value - 40.0, value))
+        widget.update_data()
+        widget.repaint()
+
+    result = time_frames(render, frames)
+    widget.close()
+    return result
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(args):
+    results = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'url': args.url,
+        },
+        'components': bench_components(20000),
+        'acquisition': bench_acquisition(args.url, args.polls),
+        'frontends': {},
+    }
+
+    frontends = results['frontends']
+    frontends['console'] = bench_console(args.url, args.polls)
+    for name, bench in (('tk_gauges', lambda: bench_tk_gauges(args.frames)),
+                        ('qt_graph', lambda: bench_qt('Graph_GUI', args.frames)),
+                        ('qt_dials', lambda: bench_qt('Meter_GUI', args.frames))):
+        try:
+            frontends[name] = bench()
+        except ImportError as error:
+            frontends[name] = {'skipped': str(error)}
+    return results
+
+def flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        if key == 'meta':
+            continue
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix + key + '.'))
+        elif isinstance(value, (int, float)):
+            flat[prefix + key] = value
+    return flat
+
+def compare(results, baseline, threshold):
+    # Higher is better for rates, lower is better for times and CPU
+    regressions = []
+    current = flatten(results)
+    for key, old in flatten(baseline).items():
+        new = current.get(key)
+        if new is None or old == 0 or key.endswith('failures'):
+            continue
+        change = (new - old) / old
+        worse = change < -threshold if key.endswith('per_second') else change > threshold
+        if worse:
+            regressions.append((key, old, new, change))
+    return regressions
+
+def print_summary(results):
+    print(f"Revision {results['meta']['revision']} on {results['meta']['url']}")
+    for section in ('components', 'acquisition'):
+        print(f"{section}:")
+        for key, value in results[section].items():
+            print(f"  {key:>24}: {value:10.2f}")
+    for name, metrics in results['frontends'].items():
+        print(f"frontend {name}:")
+        for key, value in metrics.items():
+            print(f"  {key:>24}: {value:10.2f}" if isinstance(value, (int, float)) else f"  {key:>24}: {value}")
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end acquisition and rendering benchmark")
+    parser.add_argument('--url', default=DEFAULT_URL, help="simulated port URL (see sim_serial.py)")
+    parser.add_argument('--polls', type=int, default=300)
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--compare', help="baseline JSON from an earlier run")
+    parser.add_argument('--threshold', type=float, default=0.10, help="allowed slowdown before flagging, 0.10 = 10%%")
+    args = parser.parse_args()
+
+    results = run(args)
+    print_summary(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for key, old, new, change in regressions:
+            print(f"REGRESSION {key}: {old:.3f} -> {new:.3f} ({change:+.0%})")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import heapq
+import sys
+import threading
+import time
+
+from device_profile import SlaveProfile, load_profile
+from metrics import serve_metrics
+from modbus_rtu import (READ_HOLDING_REGISTERS, REQUEST_CACHE, FrameError, ModbusException, inter_frame_delay,
+                        request_registers)
+from register_map import SENSOR_MAP
+
+HEALTHY = 'healthy'
+BACKOFF = 'backoff'          # Recent polls failed: polled less often, without retries
+QUARANTINED = 'quarantined'  # Presumed dead: only probed once every quarantine_period
+
+class Slave:
+    def __init__(self, address, poll_period=1.0, register_map=SENSOR_MAP,
+                 max_backoff=30.0, quarantine_after=5, quarantine_period=60.0):
+        self.address = address
+        self.poll_period = poll_period
+        self.register_map = register_map
+        self.max_backoff = max_backoff
+        self.quarantine_after = quarantine_after  # Consecutive failed polls before quarantine
+        self.quarantine_period = quarantine_period
+        self.polls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.state = HEALTHY
+        self.values = {}
+        # Request frames are looked up once; each poll only writes them out
+        self.requests = [(block, REQUEST_CACHE.get(address, READ_HOLDING_REGISTERS, block.start, block.count))
+                         for block in register_map.blocks()]
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.state = HEALTHY
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self.state = QUARANTINED if self.consecutive_failures >= self.quarantine_after else BACKOFF
+
+    def next_poll_delay(self, timeout=0.0):
+        # Exponential backoff: each consecutive failure doubles the poll period, up to max_backoff.
+        # The doubling starts from at least the request timeout, so slaves polled as fast as
+        # possible (poll_period 0) back off too.
+        if self.state == HEALTHY:
+            return self.poll_period
+        if self.state == QUARANTINED:
+            return self.quarantine_period
+        base = max(self.poll_period, timeout)
+        return min(base * 2 ** self.consecutive_failures, max(self.max_backoff, base))
+
+class BusScheduler:
+    # Owns one serial port and polls every slave on it at its own period
+    def __init__(self, ser, slaves=(), timeout=0.5, on_reading=None, on_error=None, log=None, retries=2,
+                 changes=None, on_registers=None):
+        self.ser = ser
+        self.timeout = timeout
+        self.retries = retries        # Extra attempts per block for healthy slaves
+        self.changes = changes        # Optional change_filter.ChangeFilter in front of on_reading
+        self.on_reading = on_reading  # on_reading(slave, values) with values = {field name: value}
+        self.on_error = on_error      # on_error(slave, block, error)
+        self.on_registers = on_registers  # on_registers(slave, block, registers) with the raw values
+        self.log = log                # Optional reading_log.ReadingLog for the raw registers
+        self.gap = inter_frame_delay(getattr(ser, 'baudrate', 9600))
+        self.slaves = []
+        self.polls = 0
+        self.failures = 0
+        self._queue = []
+        self._sequence = 0
+        self._line_free_at = 0.0
+        self._started = None
+        self._stop = threading.Event()
+        for slave in slaves:
+            self.add_slave(slave)
+
+    @classmethod
+    def from_profile(cls, port, reconnect=False, **options):
+        # Opens a device_profile.PortProfile and schedules every slave configured on it
+        slaves = [Slave(s.address, s.poll_period, s.register_map) for s in port.slaves]
+        return cls(port.open(reconnect), slaves, **options)
+
+    def add_slave(self, slave, first_poll=None):
+        self.slaves.append(slave)
+        self._push(slave, time.monotonic() if first_poll is None else first_poll)
+
+    def _push(self, slave, due):
+        # The sequence number keeps slaves that are due at the same time in insertion order
+        heapq.heappush(self._queue, (due, self._sequence, slave))
+        self._sequence += 1
+
+    def _wait_for_line(self):
+        # Keep at least 3.5 character times of silence between the last reply and the next request
+        delay = self._line_free_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def poll_slave(self, slave):
+        # One request per coalesced register block, decoded into {field name: value}.
+        # A slave that is already failing gets a single attempt, so a dead device costs
+        # one timeout per backoff period instead of (retries + 1) timeouts every cycle.
+        values = {}
+        retries = self.retries if slave.state == HEALTHY else 0
+        responded = False
+        for block, request in slave.requests:
+            self._wait_for_line()
+            try:
+                registers = request_registers(self.ser, request, block.count, self.timeout, retries)
+            except FrameError as error:
+                slave.failures += 1
+                self.failures += 1
+                # An exception response means the slave is alive, just unhappy with the request
+                responded = responded or isinstance(error, ModbusException)
+                if self.on_error is not None:
+                    self.on_error(slave, block, error)
+                if not responded and slave.state != HEALTHY:
+                    break  # Still not answering: skip its remaining blocks
+                continue
+            finally:
+                self._line_free_at = time.monotonic() + self.gap
+            responded = True
+            if self.log is not None:
+                self.log.append(time.time(), slave.address, block.start, registers)
+            if self.on_registers is not None:
+                self.on_registers(slave, block, registers)
+            values.update(block.decode(registers))
+
+        slave.polls += 1
+        self.polls += 1
+        if responded:
+            slave.record_success()
+        else:
+            slave.record_failure()
+        if values:
+            slave.values.update(values)
+            if self.on_reading is not None and (self.changes is None or self.changes.accept(values, slave.address)):
+                self.on_reading(slave, values)
+        return values
+
+    def run_once(self):
+        if not self._queue:
+            return None
+        if self._started is None:
+            self._started = time.monotonic()
+
+        if not getattr(self.ser, 'is_open', True):
+            # Port not (re)opened yet: wait for it rather than failing every slave into backoff
+            self._stop.wait(0.1)
+            return None
+
+        due, _, slave = self._queue[0]
+        delay = due - time.monotonic()
+        if delay > 0 and self._stop.wait(delay):
+            return None
+
+        heapq.heappop(self._queue)
+        results = self.poll_slave(slave)
+
+        if slave.state == HEALTHY:
+            next_due = due + slave.poll_period
+        else:
+            next_due = time.monotonic() + slave.next_poll_delay(self.timeout)
+        now = time.monotonic()
+        if next_due < now:
+            next_due = now  # Overloaded bus: skip missed periods instead of bursting to catch up
+        self._push(slave, next_due)
+        return results
+
+    def run(self, duration=None):
+        end = None if duration is None else time.monotonic() + duration
+        self._stop.clear()
+        while not self._stop.is_set():
+            if end is not None and time.monotonic() >= end:
+                break
+            self.run_once()
+
+    def stop(self):
+        self._stop.set()
+
+    def polls_per_second(self):
+        if self._started is None:
+            return 0.0
+        elapsed = time.monotonic() - self._started
+        return self.polls / elapsed if elapsed > 0 else 0.0
+
+    def stats(self):
+        return {
+            'port': getattr(self.ser, 'port', None),
+            'slaves': len(self.slaves),
+            'polls': self.polls,
+            'failures': self.failures,
+            'quarantined': [slave.address for slave in self.slaves if slave.state == QUARANTINED],
+            'polls_per_second': self.polls_per_second(),
+        }
+
+def main():
+    # Usage: python bus_scheduler.py [COM8 [1 2 3 ...]]
+    # Without arguments the first port in devices.json is polled as configured there
+    profile = load_profile()
+    port = profile.ports[0]
+    if len(sys.argv) > 1:
+        port.port = sys.argv[1]
+    if len(sys.argv) > 2:
+        register_map = port.slaves[0].register_map if port.slaves else SENSOR_MAP
+        port.slaves = [SlaveProfile(int(a), register_map) for a in sys.argv[2:]]
+
+    def print_reading(slave, values):
+        print(f"[{slave.address}] Temperature: {values['temperature']:.1f}°C, Humidity: {values['humidity']:.1f}%")
+
+    def print_error(slave, block, error):
+        print(f"[{slave.address}] Failed to read data from sensor: {error}")
+
+    scheduler = BusScheduler.from_profile(port, on_reading=print_reading, on_error=print_error)
+    serve_metrics(profile.metrics)  # Prometheus metrics at http://127.0.0.1:9105/metrics by default
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        print("Terminating the program.")
+        print(scheduler.stats())
+    finally:
+        scheduler.ser.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import time
+
+class Deadband:
+    # A channel has changed when it moved by more than absolute, or by more than
+    # percent of its last reported value, whichever is larger
+    def __init__(self, absolute=0.0, percent=0.0):
+        self.absolute = absolute
+        self.percent = percent
+
+    def exceeded(self, last, value):
+        if last is None or value is None:
+            return (last is None) != (value is None)  # A reading appearing or disappearing always counts
+        return abs(value - last) > max(self.absolute, abs(last) * self.percent / 100.0)
+
+# One raw count is 0.1 °C / 0.1 %RH; single-count flicker is not worth a redraw
+SENSOR_DEADBANDS = {
+    'temperature': Deadband(absolute=0.15),
+    'humidity': Deadband(absolute=0.15),
+}
+
+class ChangeFilter:
+    # Report by exception: accept() lets a reading through only when some channel moved
+    # past its deadband, or as a heartbeat once the source has been quiet for max_silence
+    # seconds. Readings are {channel: value} dicts, or tuples named by channels.
+    # key separates independent sources (e.g. slave addresses) sharing one filter.
+    def __init__(self, deadbands=None, default=None, max_silence=60.0, channels=('temperature', 'humidity')):
+        self.deadbands = dict(deadbands or {})
+        self.default = default or Deadband()
+        self.max_silence = max_silence
+        self.channels = channels
+        self._last = {}  # key -> ({channel: value}, time reported)
+        self.passed = 0
+        self.suppressed = 0
+        self.heartbeats = 0
+
+    def accept(self, reading, key=None, now=None):
+        if now is None:
+            now = time.monotonic()
+        values = reading if isinstance(reading, dict) else dict(zip(self.channels, reading))
+        last = self._last.get(key)
+        if last is None:
+            changed = True
+        else:
+            last_values, reported = last
+            changed = any(self.deadbands.get(channel, self.default).exceeded(last_values.get(channel), value)
+                          for channel, value in values.items())
+            if not changed and self.max_silence is not None and now - reported >= self.max_silence:
+                changed = True
+                self.heartbeats += 1
+        if not changed:
+            self.suppressed += 1
+            return False
+        self._last[key] = (values, now)
+        self.passed += 1
+        return True
+
+    def reset(self, key=None):
+        self._last.pop(key, None)
+
+    def suppression_ratio(self):
+        total = self.passed + self.suppressed
+        return self.suppressed / total if total else 0.0
+
+    def stats(self):
+        return {
+            'passed': self.passed,
+            'suppressed': self.suppressed,
+            'heartbeats': self.heartbeats,
+            'suppression_ratio': self.suppression_ratio(),
+        }
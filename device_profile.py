@@ -0,0 +1,117 @@
+import json
+import os
+
+from alarms import AlarmRule
+from register_map import MAX_REGISTERS_PER_READ, Field, RegisterMap
+from sim_serial import open_serial, parse_addresses
+
+# Ports, slaves, register maps, poll periods and icon paths live in one JSON file
+# (devices.json next to the scripts by default) instead of being repeated in every script.
+# The file is read once at startup; every slave on every port then shares the same
+# RegisterMap objects, whose block plans and decoders are built only once.
+
+DEFAULT_PROFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'devices.json')
+
+class SlaveProfile:
+    def __init__(self, address, register_map, poll_period=3.0):
+        self.address = address
+        self.register_map = register_map
+        self.poll_period = poll_period
+
+class PortProfile:
+    def __init__(self, port, baudrate=9600, parity='N', stopbits=1, bytesize=8, timeout=1.0, slaves=(), unit_offset=0):
+        self.port = port
+        self.unit_offset = unit_offset  # Modbus TCP unit id = slave address + unit_offset
+        self.baudrate = baudrate
+        self.parity = parity
+        self.stopbits = stopbits
+        self.bytesize = bytesize
+        self.timeout = timeout
+        self.slaves = list(slaves)
+
+    def open(self, reconnect=False):
+        return open_serial(port=self.port, baudrate=self.baudrate, timeout=self.timeout, reconnect=reconnect,
+                           parity=self.parity, stopbits=self.stopbits, bytesize=self.bytesize)
+
+class DeviceProfile:
+    def __init__(self, ports=(), register_maps=None, icons=None, directory='.', feed=('127.0.0.1', 9106),
+                 modbus_tcp=None, aggregation=None, alarm_rules=(), alarm_webhook=None, metrics=('127.0.0.1', 9105)):
+        self.ports = list(ports)
+        self.register_maps = register_maps or {}
+        self.icons = icons or {}
+        self.directory = directory
+        self.feed = feed  # Where acquisition_daemon.py publishes readings for the viewers
+        self.modbus_tcp = modbus_tcp  # {"host", "port", "max_age"} to serve the registers over Modbus TCP, or None
+        self.aggregation = aggregation or {}  # {"windows": [seconds, ...]}
+        self.alarm_rules = list(alarm_rules)
+        self.alarm_webhook = alarm_webhook  # URL the daemon POSTs alarm events to, or None
+        self.metrics = metrics  # (host, port) of the Prometheus endpoint, or None for none
+
+    def icon_path(self, name):
+        # Relative icon paths are relative to the profile file, not the working directory
+        return os.path.join(self.directory, self.icons[name])
+
+    def first_sensor(self):
+        # (port, slave) for the single-sensor scripts
+        port = self.ports[0]
+        return port, port.slaves[0]
+
+def _register_map(config):
+    fields = [Field(f['name'], f['address'], f.get('count', 1), f.get('scale', 1.0), f.get('offset', 0.0),
+                    f.get('signed', False))
+              for f in config['fields']]
+    register_map = RegisterMap(fields, config.get('max_gap', 0), config.get('max_block', MAX_REGISTERS_PER_READ))
+    register_map.blocks()  # Plan the reads now rather than on the first poll
+    return register_map
+
+def _alarm_rule(config):
+    addresses = config.get('addresses')
+    return AlarmRule(config['name'], config['channel'], config['type'], config['limit'], config.get('hysteresis', 0.0),
+                     config.get('delay', 0.0), config.get('severity', 'alarm'), config.get('port'),
+                     None if addresses is None else parse_addresses(str(addresses)), config.get('window', 60.0))
+
+def parse_profile(config, directory='.'):
+    register_maps = {name: _register_map(m) for name, m in config.get('register_maps', {}).items()}
+    ports = []
+    units = {}  # Modbus TCP unit id -> port using it
+    for port_config in config['ports']:
+        slaves = []
+        for slave_config in port_config.get('slaves', []):
+            map_name = slave_config['register_map']
+            if map_name not in register_maps:
+                raise ValueError(f"Port {port_config['port']!r} uses unknown register map {map_name!r}")
+            addresses = slave_config.get('addresses', str(slave_config.get('address', 1)))
+            slaves.extend(SlaveProfile(address, register_maps[map_name], slave_config.get('poll_period', 3.0))
+                          for address in parse_addresses(str(addresses)))
+        options = {key: port_config[key]
+                   for key in ('baudrate', 'parity', 'stopbits', 'bytesize', 'timeout', 'unit_offset')
+                   if key in port_config}
+        unit_offset = options.get('unit_offset', 0)
+        for slave in slaves:
+            # The Modbus TCP unit id is one byte
+            unit = slave.address + unit_offset
+            if not 0 <= unit <= 255:
+                raise ValueError(f"Port {port_config['port']!r}: address {slave.address} + unit_offset {unit_offset} "
+                                 f"is not a valid Modbus TCP unit id (0-255)")
+            # Ports share one register image, so the same unit id on two ports would mix their registers
+            if config.get('modbus_tcp') is not None and units.get(unit, port_config['port']) != port_config['port']:
+                raise ValueError(f"Port {port_config['port']!r}: Modbus TCP unit id {unit} is already used by port "
+                                 f"{units[unit]!r}; give one of the ports a unit_offset")
+            units[unit] = port_config['port']
+        ports.append(PortProfile(port_config['port'], slaves=slaves, **options))
+    feed = config.get('feed', {})
+    # {"path": "/run/sensors.sock"} for a Unix domain socket, otherwise TCP host/port
+    feed_address = feed['path'] if 'path' in feed else (feed.get('host', '127.0.0.1'), feed.get('port', 9106))
+    alarms = config.get('alarms', {})
+    metrics = config.get('metrics', {})
+    # {"port": null} turns the metrics endpoint off
+    metrics_address = (metrics.get('host', '127.0.0.1'), metrics['port'] if 'port' in metrics else 9105)
+    return DeviceProfile(ports, register_maps, config.get('icons', {}), directory, feed_address,
+                         config.get('modbus_tcp'), config.get('aggregation'),
+                         [_alarm_rule(rule) for rule in alarms.get('rules', [])], alarms.get('webhook'),
+                         None if metrics_address[1] is None else metrics_address)
+
+def load_profile(path=DEFAULT_PROFILE):
+    with open(path) as f:
+        config = json.load(f)
+    return parse_profile(config, os.path.dirname(os.path.abspath(path)))
@@ -0,0 +1,176 @@
+import argparse
+import csv
+import os
+import sys
+
+import numpy as np
+
+from batch_decode import decode_register_array
+from device_profile import load_profile
+from reading_log import ReadingLog, find_blocks, log_directory
+
+# Sessions to columnar files for analysis: one row per reading with timestamp (Unix
+# seconds), port, slave address and one column per field. Rows are written in chunks of
+# chunk_rows, each a CSV batch or a Parquet row group, so memory use does not depend on
+# the length of the session.
+#
+#   export_log()     decodes the raw registers kept by acquisition_daemon.py/without_GUI.py
+#   ReadingExporter  writes decoded readings as they arrive (acquisition_daemon.py --export)
+#
+# Parquet needs pyarrow (pip install pyarrow); CSV needs nothing extra.
+
+CHUNK_ROWS = 65536
+
+class CsvChunkWriter:
+    def __init__(self, path, columns):
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+
+    def write(self, columns):
+        # Scaled values such as 25.200000000000003 are written as 25.2
+        values = [np.round(c, 6).tolist() if c.dtype.kind == 'f' else c.tolist() for c in columns]
+        self._writer.writerows(zip(*values))
+
+    def close(self):
+        self._file.close()
+
+class ParquetChunkWriter:
+    def __init__(self, path, columns):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Parquet export needs pyarrow: pip install pyarrow") from None
+        self._pyarrow = pyarrow
+        self._names = list(columns)
+        self._writer = None
+        self._path = path
+
+    def write(self, columns):
+        table = self._pyarrow.table(dict(zip(self._names, columns)))
+        if self._writer is None:
+            # The schema is taken from the first chunk
+            self._writer = self._pyarrow.parquet.ParquetWriter(self._path, table.schema, compression='zstd')
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+def open_writer(path, columns):
+    # Format from the file extension
+    if os.path.splitext(path)[1].lower() in ('.parquet', '.pq'):
+        return ParquetChunkWriter(path, columns)
+    return CsvChunkWriter(path, columns)
+
+class ReadingExporter:
+    # Buffers multi_port Readings column by column and writes them chunk_rows at a time.
+    # fields fixes the value columns; fields missing from a reading are written as NaN.
+    def __init__(self, path, fields=('temperature', 'humidity'), chunk_rows=CHUNK_ROWS):
+        self.fields = tuple(fields)
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self._writer = open_writer(path, ('timestamp', 'port', 'address') + self.fields)
+        self._clear()
+
+    def _clear(self):
+        self._timestamps = []
+        self._ports = []
+        self._addresses = []
+        self._values = [[] for _ in self.fields]
+
+    def write(self, reading):
+        self._timestamps.append(reading.timestamp)
+        self._ports.append(str(reading.port))
+        self._addresses.append(reading.address)
+        values = reading.values
+        for column, name in zip(self._values, self.fields):
+            value = values.get(name)
+            column.append(np.nan if value is None else value)
+        if len(self._timestamps) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._timestamps:
+            return
+        columns = [np.array(self._timestamps, dtype=np.float64), np.array(self._ports),
+                   np.array(self._addresses, dtype=np.uint8)]
+        columns += [np.array(values, dtype=np.float64) for values in self._values]
+        self._writer.write(columns)
+        self.rows += len(self._timestamps)
+        self._clear()
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+
+def export_log(directory, path, register_map, port='', start=0.0, end=float('inf'), chunk_rows=CHUNK_ROWS):
+    # Raw register log of one port -> decoded rows; reads the memory-mapped segments one
+    # chunk at a time. Returns the number of rows written.
+    if not os.path.isdir(directory):
+        raise FileNotFoundError(f"No reading log in {directory!r}")
+    log = ReadingLog(directory)
+    blocks = register_map.blocks()
+    names = [field.name for block in blocks for field in block.fields]
+    writer = open_writer(path, ['timestamp', 'port', 'address'] + names)
+    rows = 0
+    try:
+        for view in log.query(start, end):
+            offset = 0
+            while offset < len(view):
+                # A block stored as several records is never cut in two by the chunking
+                stop = min(offset + chunk_rows, len(view))
+                while (stop < len(view) and view['timestamp'][stop] == view['timestamp'][stop - 1]
+                       and view['slave'][stop] == view['slave'][stop - 1]):
+                    stop += 1
+                records = np.asarray(view[offset:stop])
+                offset = stop
+                columns = {name: np.full(len(records), np.nan) for name in names}
+                keep = np.ones(len(records), dtype=bool)  # One row per block read, not per record
+                for block in blocks:
+                    # Records from other blocks keep NaN in this block's columns
+                    mine, registers = find_blocks(records, block.start, block.count)
+                    if len(mine) == 0:
+                        continue
+                    for k in range(1, -(-block.count // log.registers)):
+                        keep[mine + k] = False
+                    values = decode_register_array(registers, records['slave'][mine], block)
+                    for name, column in values.items():
+                        columns[name][mine] = column
+                writer.write([records['timestamp'][keep], np.full(int(keep.sum()), port), records['slave'][keep]]
+                             + [columns[name][keep] for name in names])
+                rows += int(keep.sum())
+    finally:
+        writer.close()
+        log.close()
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a reading log to CSV or Parquet")
+    parser.add_argument('log', help="reading log directory, e.g. readings/COM8")
+    parser.add_argument('output', help="output file; .parquet for Parquet, anything else for CSV")
+    parser.add_argument('--port', help="port in devices.json the log was read from, which names the rows and "
+                                       "picks the register map (default: the port whose folder the log is)")
+    parser.add_argument('--start', type=float, default=0.0, help="Unix time of the first reading")
+    parser.add_argument('--end', type=float, default=float('inf'), help="Unix time after the last reading")
+    parser.add_argument('--chunk', type=int, default=CHUNK_ROWS, help="rows per batch")
+    args = parser.parse_args()
+
+    profile = load_profile()
+    if args.port is not None:
+        ports = [p for p in profile.ports if p.port == args.port]
+        if not ports or not ports[0].slaves:
+            sys.exit(f"No port {args.port!r} with sensors in the device profile")
+    else:
+        # readings/COM8 (or a copy of it elsewhere) is the log of the port named COM8
+        folder = os.path.basename(os.path.normpath(args.log))
+        ports = [p for p in profile.ports if p.slaves and os.path.basename(log_directory(p.port)) == folder]
+        if len(ports) != 1:
+            sys.exit(f"Cannot tell which port {args.log!r} was read from; name it with --port")
+    port = ports[0]
+    rows = export_log(args.log, args.output, port.slaves[0].register_map, port.port, args.start, args.end, args.chunk)
+    print(f"{rows} readings written to {args.output}")
+
+if __name__ == "__main__":
+    main()
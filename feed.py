@@ -0,0 +1,374 @@
+import errno
+import math
+import os
+import queue
+import socket
+import struct
+import threading
+
+from acquisition import AcquisitionWorker
+from alarms import SEVERITIES, AlarmEvent
+from multi_port import Reading
+
+# Local pub/sub feed of decoded readings. The acquisition daemon owns the serial ports
+# and publishes every reading once; any number of viewers subscribe over TCP loopback
+# (or a Unix domain socket when the address is a path).
+#
+# Wire format, all little-endian. Every message is a 3-byte header (type, payload length)
+# followed by the payload:
+#   NAME     kind (0 = port, 1 = field), id, then the UTF-8 name
+#   READING  timestamp (f8), port id, slave address, value count, then (field id, value f8) pairs
+#   ALARM    timestamp (f8), port id, slave address, field id, raised (1) or cleared (0),
+#            severity, value (f8, NaN if none), then the rule name and the message, each
+#            as a length byte and UTF-8
+# Port and field names are sent once as NAME messages and referenced by id afterwards,
+# so a temperature/humidity reading is 32 bytes on the wire.
+
+DEFAULT_FEED = ('127.0.0.1', 9106)
+
+HEADER = struct.Struct('<BH')
+NAME_HEADER = struct.Struct('<BB')
+READING_HEADER = struct.Struct('<dBBB')
+VALUE = struct.Struct('<Bd')
+ALARM_HEADER = struct.Struct('<dBBBBBd')
+
+MESSAGE_NAME = 1
+MESSAGE_READING = 2
+MESSAGE_ALARM = 3
+NAME_PORT = 0
+NAME_FIELD = 1
+
+def _message(message_type, payload):
+    return HEADER.pack(message_type, len(payload)) + payload
+
+class FeedDesync(ConnectionError):
+    # The stream refers to names never sent or holds a malformed message; the only way to
+    # get back in step is a new connection, which starts with the full name table
+    pass
+
+def _socket_family(address):
+    return socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+
+def _remove_stale_socket(path):
+    # A Unix socket path outlives the server that bound it (a crash, or close() before this
+    # was handled). Removed only if no server answers on it, so a running daemon is kept.
+    if not os.path.exists(path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except OSError:
+            os.unlink(path)
+            return
+    raise OSError(errno.EADDRINUSE, f"A feed server is already listening on {path}")
+
+class FeedEncoder:
+    # Assigns ids to port and field names; encode() returns the NAME messages for any
+    # names seen for the first time, followed by the READING message
+    def __init__(self):
+        self.ports = {}
+        self.fields = {}
+        self.names = []  # Every NAME message so far, replayed to new subscribers
+
+    def _name_id(self, table, kind, name):
+        name_id = table.get(name)
+        if name_id is None:
+            if len(table) == 256:
+                raise ValueError(f"More than 256 distinct {'port' if kind == NAME_PORT else 'field'} names")
+            name_id = table[name] = len(table)
+            message = _message(MESSAGE_NAME, NAME_HEADER.pack(kind, name_id) + name.encode())
+            self.names.append(message)
+            return name_id, message
+        return name_id, b''
+
+    def encode(self, reading):
+        port_id, out = self._name_id(self.ports, NAME_PORT, str(reading.port))
+        body = bytearray(READING_HEADER.pack(reading.timestamp, port_id, reading.address, len(reading.values)))
+        for name, value in reading.values.items():
+            field_id, message = self._name_id(self.fields, NAME_FIELD, name)
+            out += message
+            body += VALUE.pack(field_id, value)
+        return out + _message(MESSAGE_READING, bytes(body))
+
+    def encode_alarm(self, event):
+        port_id, out = self._name_id(self.ports, NAME_PORT, str(event.port))
+        field_id, message = self._name_id(self.fields, NAME_FIELD, event.channel)
+        value = math.nan if event.value is None else event.value
+        body = ALARM_HEADER.pack(event.timestamp, port_id, event.address, field_id, event.active,
+                                 SEVERITIES.index(event.severity), value)
+        for text in (event.rule, event.message):
+            encoded = text.encode()[:255]
+            body += bytes([len(encoded)]) + encoded
+        return out + message + _message(MESSAGE_ALARM, body)
+
+class FeedDecoder:
+    # Feed it received bytes in any chunking; it returns complete Readings and collects
+    # AlarmEvents in .alarms for the caller to take
+    def __init__(self):
+        self.ports = {}
+        self.fields = {}
+        self.alarms = []
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        try:
+            return self._decode(data)
+        except (KeyError, IndexError, struct.error, UnicodeDecodeError) as e:
+            self._buffer.clear()
+            raise FeedDesync(f"Undecodable feed message: {e!r}") from e
+
+    def _decode(self, data):
+        self._buffer += data
+        readings = []
+        while len(self._buffer) >= HEADER.size:
+            message_type, length = HEADER.unpack_from(self._buffer)
+            end = HEADER.size + length
+            if len(self._buffer) < end:
+                break
+            payload = bytes(self._buffer[HEADER.size:end])
+            del self._buffer[:end]
+            if message_type == MESSAGE_NAME:
+                kind, name_id = NAME_HEADER.unpack_from(payload)
+                (self.ports if kind == NAME_PORT else self.fields)[name_id] = payload[NAME_HEADER.size:].decode()
+            elif message_type == MESSAGE_READING:
+                timestamp, port_id, address, count = READING_HEADER.unpack_from(payload)
+                values = {}
+                for i in range(count):
+                    field_id, value = VALUE.unpack_from(payload, READING_HEADER.size + i * VALUE.size)
+                    values[self.fields[field_id]] = value
+                readings.append(Reading(self.ports[port_id], address, values, timestamp))
+            elif message_type == MESSAGE_ALARM:
+                timestamp, port_id, address, field_id, active, severity, value = ALARM_HEADER.unpack_from(payload)
+                texts = []
+                position = ALARM_HEADER.size
+                for _ in range(2):
+                    length = payload[position]
+                    texts.append(payload[position + 1:position + 1 + length].decode())
+                    position += 1 + length
+                self.alarms.append(AlarmEvent(timestamp, self.ports[port_id], address, self.fields[field_id], texts[0],
+                                              SEVERITIES[severity], bool(active),
+                                              None if math.isnan(value) else value, texts[1]))
+            # Unknown message types are skipped, so newer daemons can add some
+        return readings
+
+class FeedServer:
+    # Fan-out to every connected subscriber. Each one has its own bounded queue and
+    # sender thread, so a slow or stalled viewer loses its oldest messages instead of
+    # holding up the daemon or the other viewers.
+    def __init__(self, address=DEFAULT_FEED, max_queue=10000):
+        self.address = address
+        self.max_queue = max_queue
+        self.encoder = FeedEncoder()
+        self.dropped = 0
+        self.published = 0
+        self._alarms = {}  # (port, address, channel, rule) -> ALARM message of every alarm still raised
+        self._clients = []
+        self._lock = threading.Lock()
+        self._socket = None
+
+    def start(self):
+        if isinstance(self.address, str):
+            _remove_stale_socket(self.address)
+        self._socket = socket.socket(_socket_family(self.address), socket.SOCK_STREAM)
+        if not isinstance(self.address, str):
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(self.address)
+        self._socket.listen()
+        self.address = self._socket.getsockname()  # Resolves port 0 to the port actually bound
+        threading.Thread(target=self._accept, args=(self._socket,), name="feed-accept", daemon=True).start()
+        return self
+
+    def _accept(self, listener):
+        while True:
+            try:
+                connection, _ = listener.accept()
+            except OSError:
+                return  # Server closed
+            # Unbounded: _send_all caps the backlog at max_queue messages on top of the name
+            # table and raised alarms, so those always fit however many there are
+            messages = queue.Queue()
+            with self._lock:
+                # Name table first, so the subscriber can decode everything that follows,
+                # then the alarms raised before it connected
+                for message in self.encoder.names + list(self._alarms.values()):
+                    messages.put_nowait(message)
+                self._clients.append(messages)
+            threading.Thread(target=self._send, args=(connection, messages), name="feed-send", daemon=True).start()
+
+    def _send(self, connection, messages):
+        try:
+            while True:
+                message = messages.get()
+                if message is None:
+                    break
+                connection.sendall(message)
+        except OSError:
+            pass  # Subscriber went away
+        finally:
+            with self._lock:
+                if messages in self._clients:
+                    self._clients.remove(messages)
+            connection.close()
+
+    def publish(self, reading):
+        with self._lock:
+            message = self.encoder.encode(reading)
+        self._send_all(message)
+
+    def publish_alarm(self, event):
+        key = (event.port, event.address, event.channel, event.rule)
+        with self._lock:
+            message = self.encoder.encode_alarm(event)
+            if event.active:
+                self._alarms[key] = message
+            else:
+                self._alarms.pop(key, None)
+        self._send_all(message)
+
+    def _send_all(self, message):
+        with self._lock:
+            resync = self.encoder.names + list(self._alarms.values())
+            clients = list(self._clients)
+        self.published += 1
+        for messages in clients:
+            if messages.qsize() >= self.max_queue + len(resync):
+                # The viewer has fallen behind: throw its backlog away and resynchronise
+                # it with the name table and raised alarms, since dropped messages may
+                # have defined names or raised and cleared alarms
+                while True:
+                    try:
+                        messages.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        break
+                for item in resync:
+                    messages.put_nowait(item)
+            messages.put_nowait(message)
+
+    def subscribers(self):
+        with self._lock:
+            return len(self._clients)
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+            if isinstance(self.address, str):
+                try:
+                    os.unlink(self.address)
+                except FileNotFoundError:
+                    pass
+        with self._lock:
+            clients, self._clients = self._clients, []
+        for messages in clients:
+            messages.put(None)
+
+def feed_running(address=DEFAULT_FEED, timeout=0.2):
+    # True when a daemon accepts connections on address
+    with socket.socket(_socket_family(address), socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        try:
+            connection.connect(address)
+            return True
+        except OSError:
+            return False
+
+def subscribe(address=DEFAULT_FEED, timeout=None):
+    # Generator of Readings from a running daemon; raises OSError when the connection fails
+    # (FeedDesync when the stream cannot be decoded)
+    with socket.socket(_socket_family(address), socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        connection.connect(address)
+        connection.settimeout(None)
+        decoder = FeedDecoder()
+        while True:
+            data = connection.recv(65536)
+            if not data:
+                return
+            yield from decoder.feed(data)
+
+class FeedWorker(AcquisitionWorker):
+    # Drop-in for AcquisitionWorker in the GUIs: instead of polling a serial port it
+    # follows one sensor on the daemon's feed, reconnecting whenever the daemon restarts.
+    # Published values are (field, ...) tuples, e.g. (temperature, humidity). The sensor's
+    # raised alarms are tracked too: alarm_version changes whenever they do.
+    def __init__(self, port, address, fields=('temperature', 'humidity'), feed=DEFAULT_FEED,
+                 retry_interval=2.0, maxsize=1000, changes=None):
+        super().__init__(None, interval=retry_interval, maxsize=maxsize, changes=changes)
+        self.port = port
+        self.address = address
+        self.fields = fields
+        self.feed = feed
+        self.connected = False
+        self.alarm_version = 0
+        self._alarms = {}  # (channel, rule) -> AlarmEvent
+        self._alarm_lock = threading.Lock()
+        self._connection = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._follow()
+            except OSError:
+                pass  # Daemon gone, or a FeedDesync: reconnecting resends the name table
+            self.connected = False
+            self._stop.wait(self.interval)  # Daemon not running (yet): try again shortly
+
+    def _follow(self):
+        with socket.socket(_socket_family(self.feed), socket.SOCK_STREAM) as connection:
+            connection.connect(self.feed)
+            self._connection = connection
+            self.connected = True
+            self._set_alarms({})  # The daemon sends the ones still raised right after connecting
+            decoder = FeedDecoder()
+            while not self._stop.is_set():
+                data = connection.recv(65536)
+                if not data:
+                    return
+                readings = decoder.feed(data)
+                if decoder.alarms:
+                    self._update_alarms(decoder.alarms)
+                    decoder.alarms = []
+                for reading in readings:
+                    if reading.port != self.port or reading.address != self.address:
+                        continue
+                    value = tuple(reading.values.get(field) for field in self.fields)
+                    if self.changes is None or self.changes.accept(value):
+                        self.publish(value, reading.timestamp)
+
+    def _set_alarms(self, alarms):
+        with self._alarm_lock:
+            self._alarms = alarms
+            self.alarm_version += 1
+
+    def _update_alarms(self, events):
+        alarms = dict(self._alarms)
+        for event in events:
+            if event.port != self.port or event.address != self.address:
+                continue
+            if event.active:
+                alarms[(event.channel, event.rule)] = event
+            else:
+                alarms.pop((event.channel, event.rule), None)
+        if alarms != self._alarms:
+            self._set_alarms(alarms)
+
+    def alarms(self, channel=None):
+        # Raised AlarmEvents of this sensor, optionally of one channel only
+        with self._alarm_lock:
+            return [event for (name, _), event in self._alarms.items() if channel is None or name == channel]
+
+    def alarm_severity(self, channel):
+        # Most severe raised alarm of the channel ('warning', 'alarm', ...), or None
+        raised = [SEVERITIES.index(event.severity) for event in self.alarms(channel)]
+        return SEVERITIES[max(raised)] if raised else None
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        connection = self._connection
+        if connection is not None:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)  # Wakes the blocked recv()
+            except OSError:
+                pass
+        super().stop(timeout)
@@ -0,0 +1,113 @@
+import functools
+
+import numpy as np
+from PIL import Image
+
+ARC_POINTS = 361  # One point per degree; an arc is a slice of the precomputed circle
+
+@functools.lru_cache(maxsize=None)
+def load_icon(path, size=None):
+    # Decode an icon file into an RGBA array once; every gauge using the same file shares it
+    image = Image.open(path).convert('RGBA')
+    if size is not None:
+        image = image.resize(size, Image.LANCZOS)  # Resize icon
+    icon = np.asarray(image)
+    icon.flags.writeable = False
+    return icon
+
+class GaugeWidget:
+    # Circular gauge drawn into an existing Axes. Static parts (start marker, icon) are
+    # drawn with the figure; the arc and value text are animated artists that only get
+    # their data changed and are blitted by the owning GaugePanel.
+    def __init__(self, ax, color, icon=None, unit='', minimum=0, maximum=100,
+                 radius=1.5, start_angle=1.5 * np.pi, clockwise=True, limit=2.2,
+                 icon_extent=(-0.5, 0.5, -0.2, 0.8), line_width=2, marker=None, show_value=True):
+        self.ax = ax
+        self.unit = unit
+        self.minimum = minimum
+        self.maximum = maximum
+        self.value = None
+
+        # Full circle computed once; set_value only slices it
+        direction = -1.0 if clockwise else 1.0
+        theta = start_angle + direction * np.linspace(0, 2 * np.pi, ARC_POINTS)
+        self.circle_x = radius * np.cos(theta)
+        self.circle_y = radius * np.sin(theta)
+
+        ax.set_aspect('equal')
+        ax.set_xlim(-limit, limit)
+        ax.set_ylim(-limit, limit)
+        ax.axis('off')
+
+        if marker is not None:
+            # Add starting point indicator
+            ax.plot(self.circle_x[0], self.circle_y[0], marker, markersize=6)
+        if icon is not None:
+            # Overlay icon in the center
+            ax.imshow(np.asarray(icon), extent=list(icon_extent), aspect='auto', alpha=0.8)
+
+        self.arc, = ax.plot([], [], color=color, lw=line_width, animated=True)  # Border of the circle only
+        self.text = None
+        if show_value:
+            self.text = ax.text(0, -1.0, '', fontsize=14, ha='center', va='center', color='black', animated=True)
+
+    def set_value(self, value):
+        self.value = value
+        span = self.maximum - self.minimum
+        fraction = max(0.0, min((value - self.minimum) / span, 1.0))  # Clamping the value to the gauge range
+        points = int(round(fraction * (ARC_POINTS - 1))) + 1
+        self.arc.set_data(self.circle_x[:points], self.circle_y[:points])
+        if self.text is not None:
+            self.text.set_text(f"{value:.1f}{self.unit}")
+
+    def artists(self):
+        if self.text is None:
+            return [self.arc]
+        return [self.arc, self.text]
+
+class GaugePanel:
+    # Any number of gauges sharing one figure and canvas: after updating values, a single
+    # draw() restores the cached background and blits the whole figure once
+    def __init__(self, figure, canvas):
+        self.figure = figure
+        self.canvas = canvas
+        self.gauges = []
+        self.background = None
+        canvas.mpl_connect('draw_event', self.on_draw)
+
+    @classmethod
+    def grid(cls, figure, canvas, count, columns, **gauge_options):
+        panel = cls(figure, canvas)
+        rows = (count + columns - 1) // columns
+        for index in range(count):
+            panel.add_gauge(figure.add_subplot(rows, columns, index + 1), **gauge_options)
+        return panel
+
+    def add_gauge(self, ax, **gauge_options):
+        gauge = GaugeWidget(ax, **gauge_options)
+        self.gauges.append(gauge)
+        self.background = None
+        return gauge
+
+    def on_draw(self, event):
+        # Full redraws (first show, resize) refresh the cached background
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.draw_artists()
+
+    def draw_artists(self):
+        for gauge in self.gauges:
+            for artist in gauge.artists():
+                gauge.ax.draw_artist(artist)
+
+    def set_values(self, values):
+        for gauge, value in zip(self.gauges, values):
+            gauge.set_value(value)
+        self.draw()
+
+    def draw(self):
+        if self.background is None:
+            self.canvas.draw()  # First frame: draws everything and caches the background
+            return
+        self.canvas.restore_region(self.background)
+        self.draw_artists()
+        self.canvas.blit(self.figure.bbox)
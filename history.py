@@ -0,0 +1,257 @@
+import collections
+import time
+
+import numpy as np
+
+from batch_decode import decode_register_array
+from reading_log import find_blocks
+from ring_buffer import RingBuffer
+
+# In-memory history for long-range plots. Besides the raw samples, every channel keeps
+# min/max/mean buckets at several widths (10 s, 1 min, 1 h by default), each updated as
+# readings arrive. query() answers from the finest resolution that fits the requested
+# span into the available pixels, so a plot of three months costs about as much to draw
+# as a plot of three minutes.
+#
+# Every level is a fixed-size ring: raw samples cover the last day at 1 reading/s,
+# 10 s buckets a week, 1 min buckets 90 days and 1 h buckets ten years.
+
+BUCKET_DTYPE = np.dtype([('time', '<f8'), ('min', '<f4'), ('max', '<f4'), ('mean', '<f4'), ('count', '<u4')])
+
+RAW_CAPACITY = 86400
+DEFAULT_LEVELS = (
+    (10, 7 * 8640),       # (bucket seconds, buckets kept)
+    (60, 90 * 1440),
+    (3600, 10 * 8760),
+)
+
+# resolution is 0 for raw samples (min == max == mean), otherwise the bucket width in seconds
+HistorySlice = collections.namedtuple('HistorySlice', 'resolution time min max mean')
+
+class BucketBuffer:
+    # Fixed-capacity ring of buckets, written twice like RingBuffer so view() is one slice
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._buckets = np.zeros(2 * capacity, dtype=BUCKET_DTYPE)
+        self._index = 0
+        self.count = 0
+        self.total = 0  # Buckets ever written; more than capacity means the oldest were dropped
+
+    def extend(self, buckets):
+        self.total += len(buckets)
+        buckets = buckets[-self.capacity:]
+        positions = (self._index + np.arange(len(buckets))) % self.capacity
+        self._buckets[positions] = self._buckets[positions + self.capacity] = buckets
+        self._index = (self._index + len(buckets)) % self.capacity
+        self.count = min(self.count + len(buckets), self.capacity)
+
+    def view(self):
+        # Oldest to newest; only valid until the next extend
+        end = self._index + self.capacity
+        return self._buckets[end - self.count:end]
+
+class Level:
+    # Buckets of `width` seconds; the bucket still filling up is kept as running totals
+    # and only written to the ring once a reading lands in a later bucket
+    def __init__(self, width, capacity):
+        self.width = width
+        self.buckets = BucketBuffer(capacity)
+        self._open = None  # [bucket number, min, max, sum, count]
+
+    def add(self, timestamp, value):
+        number = timestamp // self.width
+        current = self._open
+        if current is None or number != current[0]:
+            self._close()
+            self._open = [number, value, value, value, 1]
+            return
+        if value < current[1]:
+            current[1] = value
+        if value > current[2]:
+            current[2] = value
+        current[3] += value
+        current[4] += 1
+
+    def extend(self, times, values):
+        # Bulk add of readings sorted by time: one reduceat per statistic
+        if len(times) == 0:
+            return
+        numbers = times // self.width
+        if self._open is not None and numbers[0] != self._open[0]:
+            self._close()
+        starts = np.flatnonzero(np.r_[True, numbers[1:] != numbers[:-1]])
+        minima = np.minimum.reduceat(values, starts)
+        maxima = np.maximum.reduceat(values, starts)
+        sums = np.add.reduceat(values.astype(np.float64), starts)
+        counts = np.diff(np.r_[starts, len(values)])
+        if self._open is not None:
+            # The first group continues the open bucket
+            number, low, high, total, count = self._open
+            minima[0] = min(minima[0], low)
+            maxima[0] = max(maxima[0], high)
+            sums[0] += total
+            counts[0] += count
+        done = slice(0, len(starts) - 1)
+        if len(starts) > 1:
+            buckets = np.empty(len(starts) - 1, dtype=BUCKET_DTYPE)
+            buckets['time'] = numbers[starts[done]] * self.width
+            buckets['min'] = minima[done]
+            buckets['max'] = maxima[done]
+            buckets['mean'] = sums[done] / counts[done]
+            buckets['count'] = counts[done]
+            self.buckets.extend(buckets)
+        self._open = [numbers[starts[-1]], float(minima[-1]), float(maxima[-1]), float(sums[-1]), int(counts[-1])]
+
+    def _close(self):
+        if self._open is not None:
+            number, low, high, total, count = self._open
+            self.buckets.extend(np.array([(number * self.width, low, high, total / count, count)], dtype=BUCKET_DTYPE))
+            self._open = None
+
+    def query(self, start, end):
+        # Buckets overlapping [start, end), the open one included
+        buckets = self.buckets.view()
+        lo = np.searchsorted(buckets['time'], start - self.width, side='right')
+        hi = np.searchsorted(buckets['time'], end, side='left')
+        selected = buckets[lo:hi]
+        if self._open is not None:
+            number, low, high, total, count = self._open
+            begins = number * self.width
+            if begins < end and begins + self.width > start:
+                selected = np.append(selected, np.array([(begins, low, high, total / count, count)], dtype=BUCKET_DTYPE))
+        return selected
+
+    def points(self, start, end):
+        # How many buckets query() would return, without building them
+        buckets = self.buckets.view()['time']
+        return (np.searchsorted(buckets, end, side='left') - np.searchsorted(buckets, start - self.width, side='right')
+                + (self._open is not None))
+
+    def covers(self, start):
+        # False once the ring has dropped buckets newer than start
+        buckets = self.buckets
+        return buckets.total <= buckets.capacity or buckets.count == 0 or buckets.view()['time'][0] <= start
+
+class SeriesHistory:
+    # Raw samples plus every bucket level of one channel of one sensor
+    def __init__(self, raw_capacity=RAW_CAPACITY, levels=DEFAULT_LEVELS):
+        self.raw = RingBuffer(raw_capacity, dtype=np.float32)
+        self.raw_total = 0
+        self.levels = [Level(width, capacity) for width, capacity in sorted(levels)]
+        self.last_time = None
+
+    def add(self, timestamp, value):
+        if self.last_time is not None and timestamp < self.last_time:
+            return  # Out of order: the rings only grow forwards in time
+        self.last_time = timestamp
+        self.raw.append(timestamp, value)
+        self.raw_total += 1
+        for level in self.levels:
+            level.add(timestamp, value)
+
+    def extend(self, times, values):
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float32)
+        keep = ~np.isnan(values)
+        if self.last_time is not None:
+            keep &= times >= self.last_time
+        times, values = times[keep], values[keep]
+        if len(times) == 0:
+            return
+        self.last_time = float(times[-1])
+        self.raw.extend(times, values)
+        self.raw_total += len(times)
+        for level in self.levels:
+            level.extend(times, values)
+
+    def span(self):
+        # (oldest, newest) time held at any resolution, or None when empty
+        if self.last_time is None:
+            return None
+        oldest = [self.raw.view()[0][0]] + [level.buckets.view()['time'][0] for level in self.levels
+                                            if level.buckets.count]
+        return float(min(oldest)), self.last_time
+
+    def query(self, start, end, pixels=1000):
+        limit = 2 * pixels
+        # The finest resolution with at most two points per pixel in [start, end) that still
+        # reaches back to start; the coarsest level when none fits
+        times, values = self.raw.view()
+        raw_covers = self.raw_total <= self.raw.capacity or (len(times) and times[0] <= start)
+        if raw_covers:
+            lo = np.searchsorted(times, start, side='left')
+            hi = np.searchsorted(times, end, side='left')
+            if hi - lo <= limit:
+                selected = values[lo:hi].astype(np.float64)
+                return HistorySlice(0, times[lo:hi].copy(), selected, selected, selected)
+        chosen = self.levels[-1]
+        for level in self.levels:
+            if level.covers(start) and level.points(start, end) <= limit:
+                chosen = level
+                break
+        buckets = chosen.query(start, end)
+        return HistorySlice(chosen.width, buckets['time'].copy(), buckets['min'].astype(np.float64),
+                            buckets['max'].astype(np.float64), buckets['mean'].astype(np.float64))
+
+class HistoryStore:
+    # SeriesHistory per (key, channel); keys separate sensors, e.g. (port, slave address).
+    # Not thread-safe: add readings and query from the same thread (the GUI thread).
+    def __init__(self, raw_capacity=RAW_CAPACITY, levels=DEFAULT_LEVELS):
+        self.raw_capacity = raw_capacity
+        self.levels = levels
+        self._series = {}
+
+    def series(self, key, channel):
+        history = self._series.get((key, channel))
+        if history is None:
+            history = self._series[(key, channel)] = SeriesHistory(self.raw_capacity, self.levels)
+        return history
+
+    def add(self, key, values, timestamp):
+        # values: {channel: value}; None values (failed reads) are skipped
+        for channel, value in values.items():
+            if value is not None:
+                self.series(key, channel).add(timestamp, value)
+
+    def add_reading(self, reading):
+        self.add((reading.port, reading.address), reading.values, reading.timestamp)
+
+    def extend(self, key, channel, times, values):
+        self.series(key, channel).extend(times, values)
+
+    def horizon(self):
+        # Seconds back the coarsest level reaches; anything older would be dropped again
+        return max((width * capacity for width, capacity in self.levels), default=self.raw_capacity)
+
+    def span(self, key, channel):
+        history = self._series.get((key, channel))
+        return None if history is None else history.span()
+
+    def query(self, key, channel, start, end, pixels=1000):
+        history = self._series.get((key, channel))
+        if history is None:
+            empty = np.empty(0)
+            return HistorySlice(0, empty, empty, empty, empty)
+        return history.query(start, end, pixels)
+
+def backfill(store, log, key, register_map, start=None, end=float('inf')):
+    # Loads readings kept by acquisition_daemon.py (a ReadingLog of one port) into the
+    # store, so a plot opened today still shows last month. key is (port, None): the
+    # slave address from the log fills in the second half. The log is read one segment
+    # at a time, from start (default: as far back as the store's levels reach), so memory
+    # use does not grow with the length of the log.
+    port, _ = key
+    if start is None:
+        start = time.time() - store.horizon()
+    blocks = register_map.blocks()
+    for records in log.query_chunks(start, end):
+        for block in blocks:
+            positions, registers = find_blocks(records, block.start, block.count)
+            if len(positions) == 0:
+                continue
+            selected = records[positions]
+            values = decode_register_array(registers, selected['slave'], block)
+            for slave in np.unique(selected['slave']):
+                mine = selected['slave'] == slave
+                for name, column in values.items():
+                    store.extend((port, int(slave)), name, selected['timestamp'][mine], column[mine])
@@ -0,0 +1,67 @@
+import time
+
+LAUNCHED = time.perf_counter()  # Before any other import, so import time is measured too
+
+import argparse
+import importlib
+import os
+import subprocess
+import sys
+
+# One entry point for every front-end. Only the chosen one is imported, so the console
+# never loads matplotlib or Qt and the Tk windows never load Qt. The windows read from
+# acquisition_daemon.py, which is started in the background when it is not already running.
+# The daemon is shared by every window, so it is started detached and keeps running when
+# the window that started it closes; its output goes to readings/daemon.log.
+#
+# Usage: python launcher.py [console|gauges|bars|counter|graph|dials] [--no-daemon]
+
+FRONT_ENDS = {
+    'console': 'without_GUI',     # Follows the daemon if it runs, otherwise polls the port itself
+    'gauges': 'Sensor_Reading',   # Tk + matplotlib
+    'bars': 'Bars_GUI',           # Tk + matplotlib
+    'counter': 'RS485_counter',   # Tk only
+    'graph': 'Graph_GUI',         # Qt + pyqtgraph
+    'dials': 'Meter_GUI',         # Qt
+}
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def start_daemon():
+    # The daemon opens the serial ports in the background, so this returns immediately.
+    # It gets its own session (process group on Windows), so closing this window or
+    # pressing Ctrl+C in its console does not stop it for the other windows.
+    if os.name == 'nt':
+        options = {'creationflags': subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        options = {'start_new_session': True}
+    os.makedirs(os.path.join(HERE, 'readings'), exist_ok=True)
+    with open(os.path.join(HERE, 'readings', 'daemon.log'), 'ab') as output:
+        return subprocess.Popen([sys.executable, os.path.join(HERE, 'acquisition_daemon.py'), '--quiet'], cwd=HERE,
+                                stdin=subprocess.DEVNULL, stdout=output, stderr=subprocess.STDOUT, **options)
+
+def main():
+    parser = argparse.ArgumentParser(description="Start one of the sensor front-ends")
+    parser.add_argument('front_end', nargs='?', default='gauges', choices=sorted(FRONT_ENDS))
+    parser.add_argument('--no-daemon', action='store_true', help="never start acquisition_daemon.py")
+    args = parser.parse_args()
+
+    if args.front_end != 'console' and not args.no_daemon:
+        from device_profile import load_profile
+        from feed import feed_running
+        if not feed_running(load_profile().feed):
+            start_daemon()
+
+    started = time.perf_counter()
+    module = importlib.import_module(FRONT_ENDS[args.front_end])
+    imported = time.perf_counter()
+
+    def ready():
+        shown = time.perf_counter()
+        print(f"{args.front_end}: front-end imports {imported - started:.2f} s, "
+              f"ready {shown - LAUNCHED:.2f} s after launch", file=sys.stderr)
+
+    return module.main(ready)
+
+if __name__ == "__main__":
+    sys.exit(main())
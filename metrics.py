@@ -0,0 +1,173 @@
+import bisect
+import http.server
+import os
+import threading
+import time
+
+# Request latency buckets in seconds (upper bounds; the last one catches everything else)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, float('inf'))
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+class SlaveStats:
+    # Counters for one slave on one port. Each bus is polled from a single thread,
+    # so the hot path is plain attribute increments without locking.
+    COUNTERS = ('requests', 'responses', 'timeouts', 'short_frames', 'crc_failures', 'mismatches', 'exceptions',
+                'retries')
+
+    def __init__(self, port, slave):
+        self.port = port
+        self.slave = slave
+        self.requests = 0
+        self.responses = 0
+        self.timeouts = 0       # Nothing at all came back
+        self.short_frames = 0   # Some bytes came back, but not a whole frame
+        self.crc_failures = 0
+        self.mismatches = 0     # Valid frames from the wrong slave or for the wrong function
+        self.exceptions = 0     # Modbus exception responses
+        self.retries = 0
+        self.latency = Histogram()
+        self.first_request = None
+
+    def poll_rate(self, now=None):
+        # Achieved successful polls per second since the first request
+        if self.first_request is None:
+            return 0.0
+        elapsed = (now or time.monotonic()) - self.first_request
+        return self.responses / elapsed if elapsed > 0 else 0.0
+
+class Metrics:
+    def __init__(self):
+        self._slaves = {}
+        self._sources = []
+        self._lock = threading.Lock()
+
+    def add_source(self, prefix, stats):
+        # Extra values to export: stats() returns {name: number}, exported as prefix_name
+        self._sources.append((prefix, stats))
+
+    def slave(self, port, slave):
+        stats = self._slaves.get((port, slave))
+        if stats is None:
+            with self._lock:
+                stats = self._slaves.setdefault((port, slave), SlaveStats(port, slave))
+        return stats
+
+    def all(self):
+        with self._lock:
+            return list(self._slaves.values())
+
+    def reset(self):
+        with self._lock:
+            self._slaves.clear()
+
+    def to_prometheus(self):
+        lines = []
+        stats_list = self.all()
+        now = time.monotonic()
+
+        def labels(stats, extra=''):
+            port = str(stats.port).replace('\\', '\\\\').replace('"', '\\"')
+            return f'port="{port}",slave="{stats.slave}"{extra}'
+
+        for name in SlaveStats.COUNTERS:
+            lines.append(f"# TYPE modbus_{name}_total counter")
+            for stats in stats_list:
+                lines.append(f"modbus_{name}_total{{{labels(stats)}}} {getattr(stats, name)}")
+
+        lines.append("# TYPE modbus_poll_rate gauge")
+        for stats in stats_list:
+            lines.append(f"modbus_poll_rate{{{labels(stats)}}} {stats.poll_rate(now):.6g}")
+
+        lines.append("# TYPE modbus_request_latency_seconds histogram")
+        for stats in stats_list:
+            histogram = stats.latency
+            running = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                running += count
+                le = ',le="+Inf"' if bound == float('inf') else f',le="{bound}"'
+                lines.append(f"modbus_request_latency_seconds_bucket{{{labels(stats, le)}}} {running}")
+            lines.append(f"modbus_request_latency_seconds_sum{{{labels(stats)}}} {histogram.sum:.6g}")
+            lines.append(f"modbus_request_latency_seconds_count{{{labels(stats)}}} {histogram.count}")
+
+        for prefix, source in self._sources:
+            for name, value in source().items():
+                lines.append(f"# TYPE {prefix}_{name} untyped")
+                lines.append(f"{prefix}_{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+# Process-wide metrics; modbus_rtu.transact records every request here
+METRICS = Metrics()
+
+def start_http_server(port=9105, address='127.0.0.1', metrics=METRICS):
+    # Serves the Prometheus text format at http://address:port/metrics from a daemon thread
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = metrics.to_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Keep scrapes out of the console output
+
+    server = http.server.ThreadingHTTPServer((address, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+def serve_metrics(address, metrics=METRICS):
+    # start_http_server for the polling programs. address is (host, port) from the device
+    # profile, or None for no metrics. A port already in use (another program serving its
+    # metrics there) is reported and the program carries on without them.
+    if address is None:
+        return None
+    host, port = address
+    try:
+        return start_http_server(port, host, metrics)
+    except OSError as e:
+        print(f"Metrics not served: cannot listen on {host}:{port} ({e.strerror or e})")
+        return None
+
+class MetricsFileWriter:
+    # Rewrites path every interval seconds (atomically, so readers never see half a file),
+    # e.g. for node_exporter's textfile collector
+    def __init__(self, path, interval=15.0, metrics=METRICS):
+        self.path = path
+        self.interval = interval
+        self.metrics = metrics
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-file", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def write(self):
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as f:
+            f.write(self.metrics.to_prometheus())
+        os.replace(temporary, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.write()
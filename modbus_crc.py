@@ -0,0 +1,79 @@
+import struct
+
+# Modbus RTU CRC-16 (polynomial 0xA001 reflected, initial value 0xFFFF)
+CRC_INIT = 0xFFFF
+CRC_POLY = 0xA001
+
+def calculate_crc_bitwise(data):
+    # Reference bit-loop implementation (the one every script used to carry)
+    crc = CRC_INIT
+    for pos in data:
+        crc ^= pos
+        for _ in range(8):
+            if (crc & 1) != 0:
+                crc >>= 1
+                crc ^= CRC_POLY
+            else:
+                crc >>= 1
+    return crc
+
+def _build_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ CRC_POLY
+            else:
+                crc >>= 1
+        table.append(crc)
+    return tuple(table)
+
+CRC_TABLE = _build_table()
+
+def crc_update(crc, data):
+    # Feed another chunk into a running CRC, e.g. crc_update(CRC_INIT, chunk)
+    table = CRC_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+def calculate_crc(data):
+    return crc_update(CRC_INIT, data)
+
+def append_crc(data):
+    return bytes(data) + struct.pack('<H', calculate_crc(data))
+
+def check_crc(frame):
+    # A frame carrying its own CRC (low byte first) leaves a residue of zero
+    return len(frame) >= 4 and calculate_crc(frame) == 0
+
+def check_frames(frames):
+    # Batch check: one bool per frame
+    table = CRC_TABLE
+    results = []
+    for frame in frames:
+        crc = CRC_INIT
+        for byte in frame:
+            crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+        results.append(len(frame) >= 4 and crc == 0)
+    return results
+
+class CRCStream:
+    # Incremental CRC for frames that arrive in several chunks from ser.read()
+    def __init__(self):
+        self.crc = CRC_INIT
+        self.length = 0
+
+    def update(self, chunk):
+        self.crc = crc_update(self.crc, chunk)
+        self.length += len(chunk)
+        return self.crc
+
+    def reset(self):
+        self.crc = CRC_INIT
+        self.length = 0
+
+    def is_valid(self):
+        # True once the CRC bytes of a complete frame have been fed in
+        return self.length >= 4 and self.crc == 0
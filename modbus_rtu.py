@@ -0,0 +1,237 @@
+import collections
+import struct
+import threading
+import time
+
+from metrics import METRICS
+from modbus_crc import calculate_crc, check_crc
+from register_map import SENSOR_MAP
+
+READ_HOLDING_REGISTERS = 3
+
+class FrameError(Exception):
+    def __init__(self, message, frame=b''):
+        super().__init__(message)
+        self.frame = bytes(frame)
+
+class FrameTimeout(FrameError):
+    # Raised when the reply did not complete in time; frame holds any partial bytes
+    pass
+
+class CRCError(FrameError):
+    pass
+
+class ResponseMismatch(FrameError):
+    # A valid frame, but not from the slave or for the function that was asked
+    pass
+
+EXCEPTION_CODES = {
+    1: "illegal function",
+    2: "illegal data address",
+    3: "illegal data value",
+    4: "slave device failure",
+    5: "acknowledge",
+    6: "slave device busy",
+}
+
+class ModbusException(FrameError):
+    # The slave answered, but with an exception response instead of data
+    def __init__(self, code, frame=b''):
+        super().__init__(f"Slave reported exception {code} ({EXCEPTION_CODES.get(code, 'unknown')})", frame)
+        self.code = code
+
+def char_time(baudrate):
+    # One RTU character is 11 bits on the wire (start, 8 data, parity/stop, stop)
+    return 11.0 / baudrate
+
+def inter_frame_delay(baudrate):
+    # 3.5 character times of silence separate frames; fixed at 1.75 ms above 19200 baud
+    if baudrate > 19200:
+        return 0.00175
+    return 3.5 * char_time(baudrate)
+
+def create_request_command(device_address, function_code, start_address, num_registers):
+    request = struct.pack('>BBHH', device_address, function_code, start_address, num_registers)
+    crc = calculate_crc(request)
+    return request + struct.pack('<H', crc)
+
+class RequestCache:
+    # Request frames never change for a given (address, function, start, count), so they
+    # are built once and reused. Least recently used frames are evicted beyond maxsize.
+    # Shared by every bus thread, hence the lock.
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._frames = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, device_address, function_code, start_address, num_registers):
+        key = (device_address, function_code, start_address, num_registers)
+        with self._lock:
+            # A += from several bus threads would lose counts, so hits are taken under the lock too
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return frame
+        frame = create_request_command(*key)
+        with self._lock:
+            self.misses += 1
+            self._frames[key] = frame
+            if len(self._frames) > self.maxsize:
+                self._frames.popitem(last=False)
+                self.evictions += 1
+        return frame
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': len(self._frames)}
+
+REQUEST_CACHE = RequestCache()
+METRICS.add_source('modbus_request_cache', REQUEST_CACHE.stats)
+
+def expected_response_length(header):
+    # Total reply length (CRC included) from the first 3 bytes, None if it cannot be known
+    function_code = header[1]
+    if function_code & 0x80:
+        return 5                    # address, function, exception code, CRC
+    if function_code in (1, 2, 3, 4):
+        return 5 + header[2]        # address, function, byte count, data, CRC
+    if function_code in (5, 6, 15, 16):
+        return 8                    # echo of address/value or address/quantity
+    return None
+
+def _read_until_silence(ser, silence, deadline):
+    # Collect bytes until the line has been quiet for one inter-frame gap
+    data = bytearray()
+    while time.monotonic() < deadline:
+        ser.timeout = silence
+        chunk = ser.read(256)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+def read_frame(ser, timeout=1.0, baudrate=None):
+    # Return as soon as one complete, CRC-valid RTU frame has arrived
+    if baudrate is None:
+        baudrate = getattr(ser, 'baudrate', 9600)
+    saved_timeout = ser.timeout
+    deadline = time.monotonic() + timeout
+    frame = bytearray()
+    needed = 3
+    try:
+        while len(frame) < needed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise FrameTimeout("Timed out waiting for response", frame)
+            ser.timeout = remaining
+            chunk = ser.read(needed - len(frame))
+            if not chunk:
+                raise FrameTimeout("Timed out waiting for response", frame)
+            frame += chunk
+
+            if needed == 3 and len(frame) >= 3:
+                length = expected_response_length(frame)
+                if length is None:
+                    # Unknown function code: the frame ends at the next 3.5 character silence
+                    frame += _read_until_silence(ser, inter_frame_delay(baudrate), deadline)
+                    break
+                needed = length
+
+        if not check_crc(frame):
+            # Swallow the rest of a garbled frame so the next request starts clean
+            _read_until_silence(ser, inter_frame_delay(baudrate), deadline)
+            raise CRCError("CRC mismatch in response", frame)
+    finally:
+        ser.timeout = saved_timeout
+
+    return bytes(frame)
+
+def transact(ser, request, timeout=1.0, metrics=METRICS):
+    # Every request on every polling path comes through here, so this is where the
+    # per-port, per-slave counters and latency histogram are kept
+    stats = metrics.slave(getattr(ser, 'port', None), request[0])
+    start = time.monotonic()
+    if stats.first_request is None:
+        stats.first_request = start
+    stats.requests += 1
+    ser.reset_input_buffer()  # Drop anything left over from an earlier frame
+    ser.write(request)
+    try:
+        frame = read_frame(ser, timeout)
+    except FrameTimeout as error:
+        if error.frame:
+            stats.short_frames += 1
+        else:
+            stats.timeouts += 1
+        raise
+    except CRCError:
+        stats.crc_failures += 1
+        raise
+    stats.latency.observe(time.monotonic() - start)
+    if frame[0] != request[0] or frame[1] & 0x7F != request[1]:
+        # Typically a late reply to an earlier request, or another master on the line
+        stats.mismatches += 1
+        raise ResponseMismatch("Response does not match the request", frame)
+    stats.responses += 1
+    if frame[1] & 0x80:
+        stats.exceptions += 1
+        raise ModbusException(frame[2], frame)
+    return frame
+
+def decode_registers(response, num_registers):
+    if response[1] & 0x80 or response[2] != 2 * num_registers:
+        raise FrameError("Unexpected register count in response", response)
+    return struct.unpack(f'>{num_registers}H', response[3:3 + 2 * num_registers])
+
+def request_registers(ser, request, num_registers, timeout=1.0, retries=0, metrics=METRICS):
+    # Send a prebuilt function-3 request. Timeouts and garbled replies are retried up to
+    # retries times; an exception response is the slave's final answer and is raised straight away
+    for attempt in range(retries + 1):
+        try:
+            response = transact(ser, request, timeout, metrics)
+            break
+        except ModbusException:
+            raise
+        except FrameError:
+            if attempt == retries:
+                raise
+            metrics.slave(getattr(ser, 'port', None), request[0]).retries += 1
+    return decode_registers(response, num_registers)
+
+def read_holding_registers(ser, device_address, start_address, num_registers, timeout=1.0, retries=0,
+                           metrics=METRICS):
+    request_command = REQUEST_CACHE.get(device_address, READ_HOLDING_REGISTERS, start_address, num_registers)
+    return request_registers(ser, request_command, num_registers, timeout, retries, metrics)
+
+def read_register_map(ser, device_address, register_map, names=None, timeout=1.0, log=None):
+    # One function-3 transaction per coalesced block, decoded into {field name: value};
+    # raw registers also go to log (a reading_log.ReadingLog) when one is given
+    block_values = []
+    for block in register_map.blocks(names):
+        registers = read_holding_registers(ser, device_address, block.start, block.count, timeout)
+        if log is not None:
+            log.append(time.time(), device_address, block.start, registers)
+        block_values.append((block, registers))
+    return register_map.decode(block_values)
+
+def decode_sensor_registers(registers):
+    values = SENSOR_MAP.blocks()[0].decode(registers)
+    return values['temperature'], values['humidity']
+
+def decode_sensor_data(response):
+    return decode_sensor_registers(decode_registers(response, 2))
+
+def read_sensor_data(ser, device_address=1, timeout=1.0, log=None, register_map=SENSOR_MAP):
+    try:
+        values = read_register_map(ser, device_address, register_map, timeout=timeout, log=log)
+    except FrameError:
+        return None, None
+
+    return values['temperature'], values['humidity']
@@ -0,0 +1,170 @@
+import array
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+from modbus_rtu import READ_HOLDING_REGISTERS
+
+# Modbus TCP gateway: SCADA clients read holding registers (function 3) from an
+# in-memory image of the RTU slaves, which the bus poller keeps up to date. A TCP
+# request never touches the serial line, so any number of clients costs the RS-485
+# bus nothing.
+#
+# Staleness: a read is refused with exception 0x0B (gateway target device failed to
+# respond) when any requested register is older than max_age seconds or was never
+# polled. Two status registers per unit report freshness directly:
+#   STATUS_AGE      seconds since the unit was last polled successfully (65535 = never/too old)
+#   STATUS_UPDATES  successful updates so far, modulo 65536
+
+MBAP = struct.Struct('>HHHB')  # Transaction id, protocol id (0), length, unit id
+STATUS_AGE = 0xFF00
+STATUS_UPDATES = 0xFF01
+
+ILLEGAL_FUNCTION = 0x01
+ILLEGAL_DATA_VALUE = 0x03
+GATEWAY_TARGET_FAILED = 0x0B
+
+class StaleData(Exception):
+    pass
+
+class RegisterImage:
+    # Last known holding registers of every unit, with the time each one was written
+    def __init__(self):
+        self._units = {}  # unit -> (values array('H'), timestamps array('d'))
+        self._updated = {}  # unit -> (last update time, update count)
+        self._lock = threading.Lock()
+
+    def update(self, unit, start, registers, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        end = start + len(registers)
+        with self._lock:
+            values, stamps = self._units.setdefault(unit, (array.array('H'), array.array('d')))
+            if len(values) < end:
+                values.extend([0] * (end - len(values)))
+                stamps.extend([0.0] * (end - len(stamps)))
+            values[start:end] = array.array('H', registers)
+            stamps[start:end] = array.array('d', [timestamp]) * len(registers)
+            _, count = self._updated.get(unit, (0.0, 0))
+            self._updated[unit] = (timestamp, count + 1)
+
+    def read(self, unit, start, count, max_age=None, now=None):
+        # Registers start..start+count-1; raises KeyError if the unit was never polled,
+        # StaleData if any register is missing or older than max_age
+        if now is None:
+            now = time.time()
+        with self._lock:
+            if start >= STATUS_AGE:
+                return self._status(unit, start, count, now)
+            values, stamps = self._units[unit]
+            end = start + count
+            if end > len(values):
+                raise StaleData(f"Unit {unit} registers {start}-{end - 1} have not been polled")
+            oldest = min(stamps[start:end])
+            if oldest == 0.0 or (max_age is not None and now - oldest > max_age):
+                raise StaleData(f"Unit {unit} registers {start}-{end - 1} are stale")
+            return values[start:end].tolist()
+
+    def _status(self, unit, start, count, now):
+        updated, updates = self._updated.get(unit, (None, 0))
+        age = 0xFFFF if updated is None else min(int(now - updated), 0xFFFF)
+        status = {STATUS_AGE: age, STATUS_UPDATES: updates & 0xFFFF}
+        return [status.get(address, 0) for address in range(start, start + count)]
+
+    def units(self):
+        with self._lock:
+            return sorted(self._units)
+
+def _exception_pdu(function_code, code):
+    return struct.pack('>BB', function_code | 0x80, code)
+
+def handle_pdu(image, unit, pdu, max_age=None):
+    # Same function-3 request and response layout as on the RTU line, minus address and CRC.
+    # None for an empty PDU: without a function code there is no exception to answer with.
+    if not pdu:
+        return None
+    function_code = pdu[0]
+    if function_code != READ_HOLDING_REGISTERS:
+        return _exception_pdu(function_code, ILLEGAL_FUNCTION)
+    if len(pdu) != 5:
+        return _exception_pdu(function_code, ILLEGAL_DATA_VALUE)
+    start, count = struct.unpack('>HH', pdu[1:5])
+    if not 1 <= count <= 125:
+        return _exception_pdu(function_code, ILLEGAL_DATA_VALUE)
+    try:
+        registers = image.read(unit, start, count, max_age)
+    except (KeyError, StaleData):
+        return _exception_pdu(function_code, GATEWAY_TARGET_FAILED)
+    return struct.pack(f'>BB{count}H', function_code, 2 * count, *registers)
+
+def _receive(connection, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        gateway = self.server.gateway
+        connection = self.request
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        while True:
+            header = _receive(connection, MBAP.size)
+            if header is None:
+                return
+            transaction, protocol, length, unit = MBAP.unpack(header)
+            pdu = _receive(connection, length - 1) if length > 1 else b''
+            if pdu is None or protocol != 0:
+                return  # Not Modbus: drop the connection
+            response = handle_pdu(gateway.image, unit, pdu, gateway.max_age)
+            if response is None:
+                return  # Empty PDU: drop the connection
+            with gateway._lock:  # One handler thread per client
+                gateway.requests += 1
+            connection.sendall(MBAP.pack(transaction, 0, len(response) + 1, unit) + response)
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class ModbusTCPGateway:
+    # One thread per connected client; start() returns at once and serves in the background.
+    # Modbus TCP has no authentication, so the default address is loopback only; listen on
+    # 0.0.0.0 only on a network where every host may read the registers.
+    def __init__(self, image, address=('127.0.0.1', 5020), max_age=None):
+        self.image = image
+        self.address = address
+        self.max_age = max_age
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self):
+        self._server = _Server(self.address, _Handler)
+        self._server.gateway = self
+        self.address = self._server.server_address
+        threading.Thread(target=self._server.serve_forever, name="modbus-tcp", daemon=True).start()
+        return self
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+def read_holding_registers_tcp(connection, unit, start, count, transaction=0):
+    # Minimal client for checking a gateway: returns the registers or raises ValueError
+    # with the exception code
+    connection.sendall(MBAP.pack(transaction, 0, 6, unit) + struct.pack('>BHH', READ_HOLDING_REGISTERS, start, count))
+    header = _receive(connection, MBAP.size)
+    if header is None:
+        raise ConnectionError("Gateway closed the connection")
+    _, _, length, _ = MBAP.unpack(header)
+    pdu = _receive(connection, length - 1)
+    if pdu[0] & 0x80:
+        raise ValueError(f"Exception {pdu[1]:#04x}")
+    return list(struct.unpack(f'>{pdu[1] // 2}H', pdu[2:]))
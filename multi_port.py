@@ -0,0 +1,183 @@
+import asyncio
+import collections
+import queue
+import sys
+import threading
+import time
+
+from bus_scheduler import BusScheduler
+from device_profile import PortProfile, SlaveProfile, load_profile
+from register_map import SENSOR_MAP
+
+Reading = collections.namedtuple('Reading', 'port address values timestamp')
+
+class MultiPortPoller:
+    # Runs one BusScheduler per serial port, each in its own worker thread
+    def __init__(self, schedulers=(), max_queue=10000):
+        self.schedulers = []
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._threads = []
+        self._started = None
+        for scheduler in schedulers:
+            self.add_bus(scheduler)
+
+    def add_bus(self, scheduler):
+        port = getattr(scheduler.ser, 'port', None) or f"bus{len(self.schedulers)}"
+        downstream = scheduler.on_reading
+
+        def on_reading(slave, values):
+            if downstream is not None:
+                downstream(slave, values)
+            self._publish(Reading(port, slave.address, values, time.time()))
+
+        scheduler.on_reading = on_reading
+        self.schedulers.append(scheduler)
+
+    def _publish(self, reading):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for deliver in subscribers:
+            deliver(reading)
+
+    def _add_subscriber(self, deliver):
+        with self._lock:
+            self._subscribers.append(deliver)
+
+    def _remove_subscriber(self, deliver):
+        with self._lock:
+            if deliver in self._subscribers:
+                self._subscribers.remove(deliver)
+
+    def subscribe(self):
+        # Thread-safe queue for blocking consumers; oldest readings are dropped when it fills up
+        readings = queue.Queue(self.max_queue)
+
+        def deliver(reading):
+            while True:
+                try:
+                    readings.put_nowait(reading)
+                    return
+                except queue.Full:
+                    try:
+                        readings.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+
+        self._add_subscriber(deliver)
+        return readings
+
+    def start(self):
+        self._started = time.monotonic()
+        for index, scheduler in enumerate(self.schedulers):
+            thread = threading.Thread(target=scheduler.run, name=f"poll-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=2.0):
+        for scheduler in self.schedulers:
+            scheduler.stop()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def readings_per_second(self):
+        if self._started is None:
+            return 0.0
+        elapsed = time.monotonic() - self._started
+        polls = sum(scheduler.polls for scheduler in self.schedulers)
+        return polls / elapsed if elapsed > 0 else 0.0
+
+    def stats(self):
+        return {
+            'buses': [scheduler.stats() for scheduler in self.schedulers],
+            'readings_per_second': self.readings_per_second(),
+            'dropped': self.dropped,
+        }
+
+    # asyncio API
+
+    async def stream(self):
+        # async for reading in poller.stream(): ...
+        loop = asyncio.get_running_loop()
+        readings = asyncio.Queue(self.max_queue)
+
+        def put(reading):
+            if readings.full():
+                readings.get_nowait()
+                self.dropped += 1
+            readings.put_nowait(reading)
+
+        def deliver(reading):
+            loop.call_soon_threadsafe(put, reading)
+
+        self._add_subscriber(deliver)
+        try:
+            while True:
+                yield await readings.get()
+        finally:
+            self._remove_subscriber(deliver)
+
+    async def next_reading(self, port=None, address=None):
+        # Await the next reading, optionally from one port and/or slave address
+        async for reading in self.stream():
+            if (port is None or reading.port == port) and (address is None or reading.address == address):
+                return reading
+
+    async def run(self, duration=None):
+        # Start the workers, keep them running for duration seconds (forever if None), then stop them
+        self.start()
+        try:
+            if duration is None:
+                await asyncio.Event().wait()
+            else:
+                await asyncio.sleep(duration)
+        finally:
+            await asyncio.get_running_loop().run_in_executor(None, self.stop)
+
+def parse_bus_argument(argument):
+    # "COM8:1,2,3" -> ('COM8', [1, 2, 3]); a port without a trailing address list polls address 1
+    port, separator, addresses = argument.rpartition(':')
+    if not separator or not addresses.replace(',', '').isdigit():
+        return argument, [1]
+    return port, [int(a) for a in addresses.split(',')]
+
+async def print_readings(poller):
+    async for reading in poller.stream():
+        values = reading.values
+        print(f"[{reading.port}/{reading.address}] Temperature: {values['temperature']:.1f}°C, Humidity: {values['humidity']:.1f}%")
+
+async def async_main(ports):
+    # ports: device_profile.PortProfile objects
+    poller = MultiPortPoller()
+    for port in ports:
+        poller.add_bus(BusScheduler.from_profile(port))
+
+    printer = asyncio.ensure_future(print_readings(poller))
+    try:
+        await poller.run()
+    finally:
+        printer.cancel()
+        for scheduler in poller.schedulers:
+            scheduler.ser.close()
+
+def main():
+    # Usage: python multi_port.py [COM8:1,2,3 COM9:4,5]
+    # Without arguments every port in devices.json is polled as configured there
+    profile = load_profile()
+    ports = profile.ports
+    if len(sys.argv) > 1:
+        defaults = profile.ports[0]
+        ports = [PortProfile(port, defaults.baudrate, defaults.parity, defaults.stopbits, defaults.bytesize,
+                             defaults.timeout, [SlaveProfile(a, SENSOR_MAP) for a in addresses])
+                 for port, addresses in map(parse_bus_argument, sys.argv[1:])]
+    try:
+        asyncio.run(async_main(ports))
+    except KeyboardInterrupt:
+        print("Terminating the program.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+import json
+import os
+import re
+import time
+
+import numpy as np
+
+INDEX_DTYPE = np.dtype([('timestamp', '<f8'), ('record', '<u8')])
+
+def log_directory(port):
+    # Where acquisition_daemon.py keeps the log of a port: one log per port, since slave
+    # addresses repeat across ports
+    return os.path.join('readings', re.sub(r'[^A-Za-z0-9_.-]+', '_', port)[:64])
+
+def record_dtype(registers):
+    # Fixed-width record: every reading takes the same number of bytes on disk
+    return np.dtype([
+        ('timestamp', '<f8'),
+        ('slave', '<u2'),
+        ('start', '<u2'),       # First register address of the block
+        ('count', '<u2'),       # Registers actually used in this record
+        ('registers', '<u2', (registers,)),
+    ])
+
+def block_records(records, first, count):
+    # ReadingLog.append() stores a block wider than the log's records as consecutive records
+    # with the same timestamp and slave. For blocks of count registers whose first record
+    # sits at positions `first` of records, returns the positions of the blocks found
+    # complete and their registers joined into an (n, count) array.
+    width = records.dtype['registers'].shape[0]
+    pieces = max(-(-count // width), 1)
+    first = np.asarray(first, dtype=np.intp)
+    first = first[first + pieces <= len(records)]
+    head = records[first]
+    complete = np.ones(len(first), dtype=bool)
+    registers = []
+    for k in range(pieces):
+        piece = records[first + k] if k else head
+        complete &= (piece['timestamp'] == head['timestamp']) & (piece['slave'] == head['slave'])
+        complete &= piece['start'].astype(np.int64) == head['start'].astype(np.int64) + k * width
+        complete &= piece['count'] >= min(width, count - k * width)
+        registers.append(piece['registers'])
+    registers = np.concatenate(registers, axis=1)[:, :count] if pieces > 1 else registers[0][:, :count]
+    return first[complete], registers[complete]
+
+def find_blocks(records, start, count, slave=None):
+    # block_records() for every block read from register start (of one slave, if given)
+    mine = records['start'] == start
+    if slave is not None:
+        mine &= records['slave'] == slave
+    return block_records(records, np.flatnonzero(mine), count)
+
+class ReadingLog:
+    # Append-only log of raw register reads, split into one segment file per
+    # segment_seconds. Each segment has a sparse index (one entry every index_every
+    # records) so range queries binary-search a small window of a memory-mapped file.
+    # Timestamps are expected to be non-decreasing, as they are from a polling loop.
+    def __init__(self, directory, registers=8, segment_seconds=3600, index_every=256, buffer_records=4096,
+                 flush_interval=5.0):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        layout_path = os.path.join(directory, 'layout.json')
+        if os.path.exists(layout_path):
+            with open(layout_path) as f:
+                layout = json.load(f)  # An existing log keeps its own layout
+        else:
+            layout = {'registers': registers, 'segment_seconds': segment_seconds, 'index_every': index_every}
+            with open(layout_path, 'w') as f:
+                json.dump(layout, f)
+        self.registers = layout['registers']
+        self.segment_seconds = layout['segment_seconds']
+        self.index_every = layout['index_every']
+        self.dtype = record_dtype(self.registers)
+
+        self._buffer = np.zeros(buffer_records, dtype=self.dtype)
+        self._pending = 0
+        self.flush_interval = flush_interval  # Seconds a buffered record may wait before hitting the disk
+        self._last_flush = time.monotonic()
+        self._segment = None
+        self._segment_records = 0
+        self._data_file = None
+        self._index_file = None
+        self._maps = {}
+
+    # Writing
+
+    def _segment_key(self, timestamp):
+        return int(timestamp // self.segment_seconds) * self.segment_seconds
+
+    def _path(self, key, extension):
+        return os.path.join(self.directory, f"{key:012d}{extension}")
+
+    def _open_segment(self, key):
+        self._close_files()
+        self._segment = key
+        data_path = self._path(key, '.dat')
+        size = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+        self._segment_records = size // self.dtype.itemsize
+        self._data_file = open(data_path, 'ab')
+        self._index_file = open(self._path(key, '.idx'), 'ab')
+
+    def append(self, timestamp, slave, start, registers):
+        # Blocks wider than one record are stored as several consecutive records
+        width = self.registers
+        for offset in range(0, max(len(registers), 1), width):
+            self._append_record(timestamp, slave, start + offset, registers[offset:offset + width])
+
+    def _append_record(self, timestamp, slave, start, registers):
+        count = len(registers)
+        key = self._segment_key(timestamp)
+        if key != self._segment:
+            self.flush()
+            self._open_segment(key)
+        elif self._pending == len(self._buffer):
+            self.flush()
+
+        record = self._buffer[self._pending]
+        record['timestamp'] = timestamp
+        record['slave'] = slave
+        record['start'] = start
+        record['count'] = count
+        record['registers'][:count] = registers
+        record['registers'][count:] = 0
+        self._pending += 1
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def append_many(self, records):
+        # Bulk path for backfills: a structured array of self.dtype, sorted by timestamp
+        keys = (records['timestamp'] // self.segment_seconds).astype(np.int64) * self.segment_seconds
+        bounds = np.flatnonzero(np.diff(keys)) + 1
+        for chunk in np.split(records, bounds):
+            if len(chunk) == 0:
+                continue
+            self.flush()
+            key = self._segment_key(chunk['timestamp'][0])
+            if key != self._segment:
+                self._open_segment(key)
+            self._write(chunk)
+
+    def flush(self):
+        if self._pending:
+            self._write(self._buffer[:self._pending])
+            self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def _write(self, records):
+        self._data_file.write(records.tobytes())
+        positions = np.arange(self._segment_records, self._segment_records + len(records))
+        marked = positions % self.index_every == 0
+        if marked.any():
+            index = np.empty(int(marked.sum()), dtype=INDEX_DTYPE)
+            index['timestamp'] = records['timestamp'][marked]
+            index['record'] = positions[marked]
+            self._index_file.write(index.tobytes())
+        self._segment_records += len(records)
+        self._data_file.flush()
+        self._index_file.flush()
+
+    def _close_files(self):
+        for f in (self._data_file, self._index_file):
+            if f is not None:
+                f.close()
+        self._data_file = self._index_file = None
+
+    def close(self):
+        self.flush()
+        self._close_files()
+        self._segment = None
+        self._maps.clear()
+
+    # Reading
+
+    def segments(self):
+        return sorted(int(name[:-4]) for name in os.listdir(self.directory) if name.endswith('.dat'))
+
+    def _open_map(self, key):
+        # Memory maps are reused until the segment file grows
+        path = self._path(key, '.dat')
+        records = os.path.getsize(path) // self.dtype.itemsize
+        cached = self._maps.get(key)
+        if cached is not None and cached[0] == records:
+            return cached[1], cached[2]
+        if records == 0:
+            return None, None
+        data = np.memmap(path, dtype=self.dtype, mode='r', shape=(records,))
+        index_path = self._path(key, '.idx')
+        index = np.fromfile(index_path, dtype=INDEX_DTYPE) if os.path.exists(index_path) else np.empty(0, INDEX_DTYPE)
+        self._maps[key] = (records, data, index)
+        return data, index
+
+    @staticmethod
+    def _locate(data, index, timestamp):
+        # The sparse index narrows the search to one window of index_every records
+        i = np.searchsorted(index['timestamp'], timestamp, side='left')
+        lo = int(index['record'][i - 1]) if i > 0 else 0
+        hi = int(index['record'][i]) if i < len(index) else len(data)
+        return lo + int(np.searchsorted(data['timestamp'][lo:hi], timestamp, side='left'))
+
+    def query(self, start, end):
+        # Records with start <= timestamp < end, as read-only memory-mapped views (no copy),
+        # one array per segment
+        self.flush()
+        views = []
+        for key in self.segments():
+            if key >= end or key + self.segment_seconds <= start:
+                continue
+            data, index = self._open_map(key)
+            if data is None:
+                continue
+            lo = self._locate(data, index, start)
+            hi = self._locate(data, index, end)
+            if hi > lo:
+                views.append(data[lo:hi])
+        return views
+
+    def query_chunks(self, start, end):
+        # Same records as query(), one segment at a time and copied out of the memory map,
+        # which is released before the next segment is opened; for scans of a whole log
+        self.flush()
+        for key in self.segments():
+            if key >= end or key + self.segment_seconds <= start:
+                continue
+            data, index = self._open_map(key)
+            if data is None:
+                continue
+            lo = self._locate(data, index, start)
+            hi = self._locate(data, index, end)
+            records = np.array(data[lo:hi])
+            del data
+            self._maps.pop(key, None)
+            if len(records):
+                yield records
+
+    def query_array(self, start, end):
+        # Same as query() but joined into one array (this one copies)
+        views = self.query(start, end)
+        if not views:
+            return np.empty(0, dtype=self.dtype)
+        return views[0] if len(views) == 1 else np.concatenate(views)
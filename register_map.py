@@ -0,0 +1,91 @@
+MAX_REGISTERS_PER_READ = 125  # Function 3 limit: 125 registers (250 data bytes) per reply
+
+class Field:
+    # One named value made of 1 (16-bit) or 2 (32-bit, high word first) holding registers
+    def __init__(self, name, address, count=1, scale=1.0, offset=0.0, signed=False):
+        if count not in (1, 2):
+            raise ValueError(f"Field {name!r} must span 1 or 2 registers")
+        self.name = name
+        self.address = address
+        self.count = count
+        self.scale = scale
+        self.offset = offset
+        self.signed = signed
+
+    def decode(self, registers):
+        raw = registers[0] if self.count == 1 else (registers[0] << 16) | registers[1]
+        if self.signed and raw >= 1 << (16 * self.count - 1):
+            raw -= 1 << (16 * self.count)
+        if self.scale == 1.0 and self.offset == 0.0:
+            return raw  # Status words and counters stay integers
+        return raw * self.scale + self.offset
+
+class RegisterBlock:
+    # A contiguous run of registers fetched by a single function-3 request
+    def __init__(self, start, count, fields):
+        self.start = start
+        self.count = count
+        self.fields = fields
+        # Where each field sits in the reply, worked out once per block
+        self._slices = [(f.name, f.decode, slice(f.address - start, f.address - start + f.count)) for f in fields]
+
+    def decode(self, registers):
+        return {name: decode(registers[where]) for name, decode, where in self._slices}
+
+    def __repr__(self):
+        return f"RegisterBlock(start={self.start}, count={self.count}, fields={[f.name for f in self.fields]})"
+
+def plan_blocks(fields, max_gap=0, max_block=MAX_REGISTERS_PER_READ):
+    # Merge fields into the fewest contiguous reads; gaps of up to max_gap unused
+    # registers are read and thrown away rather than costing another round trip
+    blocks = []
+    start = end = None
+    members = []
+    for field in sorted(fields, key=lambda f: f.address):
+        field_end = field.address + field.count
+        if members and field.address - end <= max_gap and max(end, field_end) - start <= max_block:
+            end = max(end, field_end)
+            members.append(field)
+            continue
+        if members:
+            blocks.append(RegisterBlock(start, end - start, members))
+        start, end, members = field.address, field_end, [field]
+    if members:
+        blocks.append(RegisterBlock(start, end - start, members))
+    return blocks
+
+class RegisterMap:
+    def __init__(self, fields=(), max_gap=0, max_block=MAX_REGISTERS_PER_READ):
+        self.fields = {}
+        self.max_gap = max_gap
+        self.max_block = max_block
+        self._blocks = None
+        for field in fields:
+            self.add(field)
+
+    def add(self, field):
+        self.fields[field.name] = field
+        self._blocks = None
+
+    def blocks(self, names=None):
+        # Full-map plan is cached; a subset of names is planned on demand
+        if names is not None:
+            return plan_blocks([self.fields[n] for n in names], self.max_gap, self.max_block)
+        if self._blocks is None:
+            self._blocks = plan_blocks(self.fields.values(), self.max_gap, self.max_block)
+        return self._blocks
+
+    def decode(self, block_values):
+        # block_values: [(block, registers), ...] as returned by the reads
+        values = {}
+        for block, registers in block_values:
+            values.update(block.decode(registers))
+        return values
+
+# Temperature/humidity pair at registers 0-1.
+# Adjust the formula based on sensor datasheet
+# Example: Assuming a 16-bit raw value maps linearly to -40°C to 125°C
+SENSOR_MAP = RegisterMap([
+    Field('temperature', 0, scale=165.0 / 1650.0, offset=-40.0),
+    Field('humidity', 1, scale=0.1),
+])
@@ -0,0 +1,151 @@
+import os
+import struct
+import time
+import urllib.parse
+
+import numpy as np
+
+from modbus_crc import calculate_crc
+from reading_log import ReadingLog, block_records
+from sim_serial import SimulatedSerial
+
+# Plays a captured session back as a serial port: replay://readings/COM8?speed=100
+# (see open_serial) answers function-3 requests with reply frames rebuilt from the
+# registers in a ReadingLog, so the decoder, the daemon and the front-ends run unchanged.
+#
+#   speed=1     each slave answers with what it reported at that point of the recording
+#   speed=100   the recording's clock runs 100x faster (a day passes in about 15 minutes);
+#               readings are still taken at the poll rate, so shorten poll_period to match
+#   speed=0     every request gets the next recorded reply in order, as fast as polled
+#   loop=1      start over at the end instead of going silent
+#   start=T     begin at Unix time T instead of at the first reading
+
+class Recording:
+    # Timestamps of each (slave, start register) series, with where its records sit in the
+    # log's memory-mapped segments; register values are only read when a reply is built
+    def __init__(self, directory, start=0.0, end=float('inf')):
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"No reading log in {directory!r}")
+        self.log = ReadingLog(directory)
+        self.views = self.log.query(start, end)
+        if not self.views:
+            raise ValueError(f"No readings in {directory!r}")
+        self.first = float(self.views[0]['timestamp'][0])
+        self.last = float(self.views[-1]['timestamp'][-1])
+        self._series = {}
+
+    def series(self, slave, start):
+        found = self._series.get((slave, start))
+        if found is None:
+            times, where = [], []
+            for number, view in enumerate(self.views):
+                positions = np.flatnonzero((view['slave'] == slave) & (view['start'] == start))
+                times.append(view['timestamp'][positions])
+                where.append(np.column_stack((np.full(len(positions), number), positions)))
+            found = self._series[(slave, start)] = (np.concatenate(times), np.concatenate(where))
+        return found
+
+    def registers(self, location, count):
+        # The first count registers of the block read at location, or None if fewer were
+        # read; a block wider than the log's records continues in the records after it
+        number, position = location
+        found, registers = block_records(self.views[number], [position], count)
+        return registers[0].tolist() if len(found) else None
+
+    def slaves(self):
+        return sorted(set().union(*(np.unique(view['slave']).tolist() for view in self.views)))
+
+    def close(self):
+        self.views = []
+        self.log.close()
+
+class ReplaySlave:
+    # Looks like a SimulatedSlave to SimulatedSerial; an empty reply leaves the line silent
+    def __init__(self, address, player):
+        self.address = address
+        self.player = player
+        self.latency = 0.005
+        self.jitter = 0.0
+        self.drop_rate = 0.0
+        self.corrupt_rate = 0.0
+        self.dead = False
+        self.requests = 0
+        self.cursors = {}  # start register -> next record index, for speed=0
+
+    def handle(self, request):
+        _, function_code, start, count = struct.unpack('>BBHH', request[:6])
+        if function_code != 3:
+            return b''
+        times, where = self.player.recording.series(self.address, start)
+        index = self.player.index(self, start, times)
+        if index is None:
+            return b''  # Before the first or after the last recorded reading
+        registers = self.player.recording.registers(where[index], count)
+        if registers is None:
+            return b''
+        body = struct.pack('>BBB', self.address, function_code, count * 2)
+        body += struct.pack(f'>{count}H', *registers)
+        return body + struct.pack('<H', calculate_crc(body))
+
+class Player:
+    # The replay clock shared by every slave of one recording
+    def __init__(self, recording, speed=1.0, loop=False):
+        self.recording = recording
+        self.speed = speed
+        self.loop = loop
+        self.started = time.monotonic()
+        self.finished = False
+
+    def position(self):
+        # Where in the recording (Unix time) playback is now
+        duration = self.recording.last - self.recording.first
+        elapsed = (time.monotonic() - self.started) * self.speed
+        if self.loop and duration > 0:
+            elapsed %= duration
+        elif elapsed > duration:
+            self.finished = True
+        return self.recording.first + elapsed
+
+    def index(self, slave, start, times):
+        if len(times) == 0:
+            return None
+        if self.speed == 0:
+            index = slave.cursors.get(start, 0)
+            if index == len(times):
+                if not self.loop:
+                    self.finished = True
+                    return None
+                index = 0
+            slave.cursors[start] = index + 1
+            return index
+        now = self.position()
+        if self.finished:
+            return None
+        index = int(np.searchsorted(times, now, side='right')) - 1
+        return index if index >= 0 else None
+
+class ReplaySerial(SimulatedSerial):
+    # SimulatedSerial with the recorded slaves in place of simulated ones; replies still
+    # arrive at the time they would take on the wire at the configured baudrate
+    def __init__(self, directory, speed=1.0, loop=False, start=0.0, baudrate=9600, timeout=1, port=None):
+        super().__init__(baudrate=baudrate, timeout=timeout, port=port or f"replay://{directory}")
+        self.recording = Recording(directory, start)
+        self.player = Player(self.recording, speed, loop)
+        for address in self.recording.slaves():
+            self.add_slave(ReplaySlave(address, self.player))
+
+    @classmethod
+    def from_url(cls, url, baudrate=9600, timeout=1):
+        # replay://readings/COM8?speed=100&loop=1&start=1700000000
+        path, _, query = url[len('replay://'):].partition('?')
+        options = urllib.parse.parse_qs(query)
+
+        def option(name, default, convert=float):
+            return convert(options[name][0]) if name in options else default
+
+        return cls(urllib.parse.unquote(path), option('speed', 1.0), bool(option('loop', 0, int)),
+                   option('start', 0.0), baudrate, timeout, port=url)
+
+    def close(self):
+        super().close()
+        self.recording.close()
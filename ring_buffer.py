@@ -0,0 +1,48 @@
+import numpy as np
+
+class RingBuffer:
+    # Fixed-capacity (time, value) history. Every sample is written twice, at i and
+    # i + capacity, so the newest `capacity` samples are always one contiguous slice
+    # and view() hands out NumPy views without copying or reallocating.
+    def __init__(self, capacity, dtype=np.float64):
+        self.capacity = capacity
+        self._times = np.zeros(2 * capacity, dtype=np.float64)
+        self._values = np.zeros(2 * capacity, dtype=dtype)
+        self._index = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp, value):
+        i = self._index
+        self._times[i] = self._times[i + self.capacity] = timestamp
+        self._values[i] = self._values[i + self.capacity] = value
+        self._index = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def extend(self, times, values):
+        # Bulk append; only the newest `capacity` of them are kept
+        times = np.asarray(times)[-self.capacity:]
+        values = np.asarray(values)[-self.capacity:]
+        positions = (self._index + np.arange(len(times))) % self.capacity
+        self._times[positions] = self._times[positions + self.capacity] = times
+        self._values[positions] = self._values[positions + self.capacity] = values
+        self._index = (self._index + len(times)) % self.capacity
+        self.count = min(self.count + len(times), self.capacity)
+
+    def view(self):
+        # Oldest to newest; only valid until the next append
+        end = self._index + self.capacity
+        start = end - self.count
+        return self._times[start:end], self._values[start:end]
+
+    def last(self):
+        if self.count == 0:
+            return None
+        i = (self._index - 1) % self.capacity
+        return self._times[i], self._values[i]
+
+    def clear(self):
+        self._index = 0
+        self.count = 0
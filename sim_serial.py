@@ -0,0 +1,305 @@
+import collections
+import math
+import random
+import struct
+import threading
+import time
+import urllib.parse
+
+from modbus_crc import calculate_crc, check_crc
+from modbus_rtu import char_time
+
+def sensor_registers(address, now, size=16):
+    # Slowly varying temperature/humidity registers, phase-shifted per address
+    phase = address * 0.7
+    raw_temperature = int(650 + 50 * math.sin(now / 60.0 + phase))   # About 25 °C +- 5
+    raw_humidity = int(450 + 100 * math.sin(now / 90.0 + phase))     # About 45 % +- 10
+    return [raw_temperature, raw_humidity] + [0] * (size - 2)
+
+class SimulatedSlave:
+    # A Modbus RTU device answering function 3 from a list of holding registers.
+    # With registers=None it behaves like a live temperature/humidity sensor.
+    # Faults: latency +- jitter before replying, drop_rate of requests never answered,
+    # corrupt_rate of replies with one flipped bit, dead slaves never answer.
+    def __init__(self, address, registers=None, latency=0.005, jitter=0.0,
+                 drop_rate=0.0, corrupt_rate=0.0, dead=False):
+        self.address = address
+        self.registers = list(registers) if registers is not None else None
+        self.latency = latency  # Device turnaround before it starts talking
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.corrupt_rate = corrupt_rate
+        self.dead = dead
+        self.requests = 0
+
+    def current_registers(self):
+        if self.registers is None:
+            return sensor_registers(self.address, time.time())
+        return self.registers
+
+    def handle(self, request):
+        address, function_code, start, count = struct.unpack('>BBHH', request[:6])
+        registers = self.current_registers()
+        if function_code != 3:
+            return self._exception(function_code, 1)  # Illegal function
+        if count < 1 or count > 125 or start + count > len(registers):
+            return self._exception(function_code, 2)  # Illegal data address
+        values = registers[start:start + count]
+        body = struct.pack('>BBB', self.address, function_code, count * 2) + struct.pack(f'>{count}H', *values)
+        return body + struct.pack('<H', calculate_crc(body))
+
+    def _exception(self, function_code, code):
+        body = struct.pack('>BBB', self.address, function_code | 0x80, code)
+        return body + struct.pack('<H', calculate_crc(body))
+
+class SimulatedSerial:
+    # Stand-in for serial.Serial: replies become readable at the time they would
+    # have finished arriving on a real line at the configured baudrate
+    def __init__(self, slaves=(), baudrate=9600, timeout=1, port='SIM', seed=None):
+        self.port = port
+        self.slaves = {slave.address: slave for slave in slaves}
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.is_open = True
+        self._rx = collections.deque()  # (arrival time, byte)
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self.requests = 0
+        self.dropped = 0
+        self.corrupted = 0
+
+    @classmethod
+    def from_url(cls, url, baudrate=9600, timeout=1):
+        # sim://?slaves=1-200&latency=0.005&jitter=0.002&drop=0.01&corrupt=0.01&dead=7,9&seed=1
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)
+
+        def option(name, default, convert=float):
+            return convert(query[name][0]) if name in query else default
+
+        addresses = parse_addresses(option('slaves', '1', str))
+        dead = set(parse_addresses(option('dead', '', str)))
+        slaves = [SimulatedSlave(address,
+                                 latency=option('latency', 0.005),
+                                 jitter=option('jitter', 0.0),
+                                 drop_rate=option('drop', 0.0),
+                                 corrupt_rate=option('corrupt', 0.0),
+                                 dead=address in dead)
+                  for address in addresses]
+        return cls(slaves, baudrate=option('baudrate', baudrate, int), timeout=timeout,
+                   port=url, seed=option('seed', None, int))
+
+    def add_slave(self, slave):
+        self.slaves[slave.address] = slave
+
+    def write(self, data):
+        data = bytes(data)
+        now = time.monotonic()
+        per_char = char_time(self.baudrate)
+        request_done = now + len(data) * per_char
+        self.requests += 1
+
+        if len(data) < 8 or not check_crc(data):
+            return len(data)
+        slave = self.slaves.get(data[0])
+        if slave is None or slave.dead:
+            return len(data)  # Nobody home at that address: the line stays silent
+        slave.requests += 1
+        if slave.drop_rate and self._random.random() < slave.drop_rate:
+            self.dropped += 1
+            return len(data)
+
+        reply = bytearray(slave.handle(data))
+        if slave.corrupt_rate and self._random.random() < slave.corrupt_rate:
+            position = self._random.randrange(len(reply))
+            reply[position] ^= 1 << self._random.randrange(8)  # Line noise: one flipped bit
+            self.corrupted += 1
+
+        delay = slave.latency
+        if slave.jitter:
+            delay = max(0.0, delay + self._random.uniform(-slave.jitter, slave.jitter))
+        start = request_done + delay
+        with self._lock:
+            for i, byte in enumerate(reply):
+                self._rx.append((start + (i + 1) * per_char, byte))
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        now = time.monotonic()
+        with self._lock:
+            return sum(1 for arrival, _ in self._rx if arrival <= now)
+
+    def read(self, size=1):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        out = bytearray()
+        while len(out) < size:
+            now = time.monotonic()
+            with self._lock:
+                while self._rx and self._rx[0][0] <= now and len(out) < size:
+                    out.append(self._rx.popleft()[1])
+                next_arrival = self._rx[0][0] if self._rx else None
+            if len(out) >= size:
+                break
+            if deadline is not None and now >= deadline:
+                break
+            wake = next_arrival if next_arrival is not None else deadline
+            if wake is None:
+                wake = now + 0.01
+            if deadline is not None:
+                wake = min(wake, deadline)
+            time.sleep(max(0.0, wake - now))
+        return bytes(out)
+
+    def reset_input_buffer(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._rx and self._rx[0][0] <= now:
+                self._rx.popleft()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def parse_addresses(text):
+    # "1-5,9" -> [1, 2, 3, 4, 5, 9]
+    addresses = []
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        addresses.extend(range(int(first), int(last or first) + 1))
+    return addresses
+
+class ReconnectingSerial:
+    # Opens the port on a background thread and reopens it after I/O errors, so a busy or
+    # unplugged adapter never blocks or crashes the caller. While the port is down, reads
+    # return nothing after the timeout (the poll fails like a silent line) and writes are dropped.
+    def __init__(self, port, baudrate=9600, timeout=1, retry_interval=2.0, **options):
+        self.port = port
+        self.baudrate = baudrate
+        self._timeout = timeout
+        self.retry_interval = retry_interval
+        self.options = options
+        self.connects = 0
+        self.last_error = None
+        self._ser = None
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._reconnect()
+
+    def _reconnect(self):
+        threading.Thread(target=self._connect, name=f"open-{self.port}", daemon=True).start()
+
+    def _connect(self):
+        while not self._closed.is_set():
+            try:
+                ser = open_serial(self.port, self.baudrate, self._timeout, **self.options)
+            except (OSError, ValueError) as error:  # serial.SerialException is an OSError
+                self.last_error = error
+                self._closed.wait(self.retry_interval)
+                continue
+            with self._lock:
+                if self._closed.is_set():
+                    ser.close()
+                else:
+                    self._ser = ser
+                    self.connects += 1
+            return
+
+    def _lost(self, ser, error):
+        self.last_error = error
+        with self._lock:
+            if self._ser is not ser:
+                return  # Someone else already noticed
+            self._ser = None
+        try:
+            ser.close()
+        except OSError:
+            pass
+        self._reconnect()
+
+    @property
+    def is_open(self):
+        return self._ser is not None
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        self._timeout = value
+        ser = self._ser
+        if ser is not None:
+            ser.timeout = value
+
+    def _call(self, method, *args, default=None):
+        ser = self._ser
+        if ser is None:
+            return default
+        try:
+            return getattr(ser, method)(*args)
+        except OSError as error:
+            self._lost(ser, error)
+            return default
+
+    def write(self, data):
+        return self._call('write', data, default=0)
+
+    def read(self, size=1):
+        if self._ser is None:
+            self._closed.wait(self._timeout or 0)
+            return b''
+        return self._call('read', size, default=b'')
+
+    @property
+    def in_waiting(self):
+        ser = self._ser
+        try:
+            return ser.in_waiting if ser is not None else 0
+        except OSError as error:
+            self._lost(ser, error)
+            return 0
+
+    def reset_input_buffer(self):
+        self._call('reset_input_buffer')
+
+    def flush(self):
+        self._call('flush')
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            ser, self._ser = self._ser, None
+        if ser is not None:
+            ser.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_serial(port, baudrate=9600, timeout=1, reconnect=False, **options):
+    # A real serial.Serial, or a SimulatedSerial when port is a sim:// URL, so every
+    # script can run on a machine without sensors attached, or a ReplaySerial playing back a
+    # recorded session for replay:// URLs (see replay.py). With reconnect=True the port
+    # is opened in the background and reopened whenever it fails (ReconnectingSerial).
+    if reconnect:
+        return ReconnectingSerial(port, baudrate, timeout, **options)
+    if port.startswith('sim://'):
+        return SimulatedSerial.from_url(port, baudrate=baudrate, timeout=timeout)
+    if port.startswith('replay://'):
+        from replay import ReplaySerial
+        return ReplaySerial.from_url(port, baudrate=baudrate, timeout=timeout)
+    import serial
+    return serial.Serial(port=port, baudrate=baudrate, timeout=timeout, **options)
@@ -0,0 +1,61 @@
+import numpy as np
+
+from aggregation import Aggregator, Summary
+
+def exact_percentile(values, p):
+    return np.percentile(values, p, method='inverted_cdf')
+
+def test_quantised_values_are_exact():
+    values = np.round(np.random.default_rng(0).normal(25.0, 2.0, 5000), 1)
+    summary = Summary()
+    for value in values.tolist():
+        summary.add(value)
+    assert summary.count == len(values)
+    assert np.isclose(summary.mean, values.mean()) and np.isclose(summary.variance(), values.var())
+    for p in (50, 95, 99):
+        assert np.isclose(summary.percentile(p), exact_percentile(values, p))
+
+def test_ramp_keeps_bins_bounded():
+    # A counter stepping by 1 at 0.1 resolution would otherwise add a bin per sample
+    summary = Summary(0.1, max_bins=100)
+    values = np.arange(100000, dtype=np.float64)
+    for value in values.tolist():
+        summary.add(value)
+    assert len(list(summary.histogram())) <= 100
+    assert summary.min == 0 and summary.max == 99999 and np.isclose(summary.mean, values.mean())
+    for p in (1, 50, 99):
+        assert abs(summary.percentile(p) - exact_percentile(values, p)) <= summary.resolution / 2
+
+def test_merge_across_resolutions():
+    fine, wide = Summary(0.1, max_bins=50), Summary(0.1, max_bins=50)
+    for value in np.arange(0.0, 10.0, 0.1).tolist():
+        wide.add(value)  # 100 distinct values: widened
+    for value in (3.0, 3.1, 3.2):
+        fine.add(value)
+    assert wide.resolution > fine.resolution
+    for merged in (fine.copy().merge(wide), wide.copy().merge(fine)):
+        assert merged.count == 103
+        assert np.isclose(merged.resolution, wide.resolution)
+        values = np.r_[np.arange(0.0, 10.0, 0.1), [3.0, 3.1, 3.2]]
+        assert abs(merged.percentile(50) - exact_percentile(values, 50)) <= merged.resolution / 2
+
+def test_packed_summary_still_merges():
+    summary = Summary()
+    for value in (1.0, 2.0, 3.0):
+        summary.add(value)
+    summary.pack()
+    summary.add(4.0)
+    assert summary.count == 4 and summary.percentile(100) == 4.0
+
+def test_rollup_matches_raw():
+    windows = []
+    aggregator = Aggregator((60, 3600), on_window=windows.append, resolutions={'counter': 1.0})
+    start = 1699999200.0
+    for second in range(3600):
+        aggregator.add('sensor', {'temperature': 20.0 + (second % 50) / 10, 'counter': float(second)}, start + second)
+    aggregator.flush()
+    hourly = {w.channel: w.summary for w in windows if w.length == 3600}
+    assert hourly['temperature'].count == 3600 and hourly['counter'].count == 3600
+    assert hourly['counter'].max == 3599.0
+    assert np.isclose(hourly['temperature'].mean, np.mean([20.0 + (s % 50) / 10 for s in range(3600)]))
+    assert abs(hourly['counter'].percentile(50) - 1799.0) <= hourly['counter'].resolution / 2
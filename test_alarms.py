@@ -0,0 +1,73 @@
+import pytest
+
+from alarms import HIGH, LOW, RATE, STALE, AlarmEngine, AlarmRule
+
+T = 1700000000.0
+
+def run(engine, values, channel='temperature', step=1.0, start=T, port='COM8', address=1):
+    # Feeds one value per step seconds; returns (seconds since start, active) of every event
+    events = []
+    for i, value in enumerate(values):
+        for event in engine.process(port, address, {channel: value}, start + i * step):
+            events.append((event.timestamp - start, event.active))
+    return events
+
+def test_high_hysteresis():
+    engine = AlarmEngine([AlarmRule('hot', 'temperature', HIGH, 30.0, hysteresis=0.5)])
+    # Raised above the limit; stays raised until back below limit - hysteresis
+    assert run(engine, [29.0, 30.5, 29.8, 30.2, 29.6, 29.4, 29.9, 30.0, 30.1]) == [(1, True), (5, False), (8, True)]
+    assert [event.rule for event in engine.active()] == ['hot']
+
+def test_low_hysteresis():
+    engine = AlarmEngine([AlarmRule('cold', 'temperature', LOW, 5.0, hysteresis=1.0)])
+    assert run(engine, [6.0, 4.9, 5.5, 5.9, 6.1]) == [(1, True), (4, False)]
+    assert engine.active() == []
+
+def test_debounce():
+    engine = AlarmEngine([AlarmRule('hot', 'temperature', HIGH, 30.0, delay=5.0)])
+    # A spike shorter than the delay never raises; a condition held for it does, and clearing
+    # waits for the delay too
+    values = [31.0, 31.0, 29.0] + [31.0] * 7 + [29.0, 31.0] + [29.0] * 6
+    assert run(engine, values) == [(8, True), (17, False)]
+
+def test_rate_over_window():
+    engine = AlarmEngine([AlarmRule('swing', 'temperature', RATE, 2.0, hysteresis=0.5, window=60.0)])
+    # 0.1 per 10 s is 0.6/min: no alarm until 60 s of readings are there, then none either
+    assert run(engine, [20.0 + i / 100 for i in range(120)], step=1.0) == []
+    # 5 °C in a minute raises; the rate is measured against the reading a window back
+    engine = AlarmEngine([AlarmRule('swing', 'temperature', RATE, 2.0, hysteresis=0.5, window=60.0)])
+    values = [20.0] * 61 + [20.0 + i * 5 / 60 for i in range(1, 61)] + [25.0] * 120
+    events = run(engine, values)
+    assert [active for _, active in events] == [True, False]
+    raised, cleared = events
+    assert 61 < raised[0] < 121 and cleared[0] > 121
+
+def test_rate_ignores_flicker():
+    # One code back and forth between readings 1 s apart would be 6/min between two samples
+    engine = AlarmEngine([AlarmRule('swing', 'temperature', RATE, 2.0, window=60.0)])
+    assert run(engine, [20.0, 20.1] * 150) == []
+
+def test_rate_window_must_be_positive():
+    with pytest.raises(ValueError, match='window'):
+        AlarmRule('swing', 'temperature', RATE, 2.0, window=0)
+
+def test_stale():
+    engine = AlarmEngine([AlarmRule('silent', 'temperature', STALE, 30.0)])
+    engine.expect('COM8', 1, ['temperature'], now=T)
+    assert engine.check_stale(now=T + 30) == []
+    [event] = engine.check_stale(now=T + 31)
+    assert (event.rule, event.active, event.value) == ('silent', True, None)
+    assert engine.check_stale(now=T + 60) == []  # Raised once
+    # The next reading clears it, and restarts the clock
+    assert run(engine, [21.5], start=T + 61) == [(0, False)]
+    assert engine.check_stale(now=T + 90) == []
+    [event] = engine.check_stale(now=T + 92)
+    assert event.value == 21.5
+
+def test_rules_apply_to_their_port_and_addresses():
+    rule = AlarmRule('hot', 'temperature', HIGH, 30.0, port='COM8', addresses=[1])
+    engine = AlarmEngine([rule])
+    assert run(engine, [31.0], address=2) == []
+    assert run(engine, [31.0], port='COM9') == []
+    assert run(engine, [31.0]) == [(0, True)]
+    assert engine.stats()['channels'] == 1
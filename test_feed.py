@@ -0,0 +1,132 @@
+import queue
+import socket
+import time
+
+import pytest
+
+from alarms import AlarmEvent
+from feed import (MESSAGE_READING, READING_HEADER, FeedDecoder, FeedDesync, FeedEncoder, FeedServer, FeedWorker,
+                  _message, feed_running)
+from multi_port import Reading
+
+def reading(value, timestamp=1700000000.0, port='COM8', address=1):
+    return Reading(port, address, {'temperature': value, 'humidity': 45.5}, timestamp)
+
+def alarm(rule, active=True, port='COM8', address=1):
+    return AlarmEvent(1700000000.0, port, address, 'temperature', rule, 'warning', active, 31.5, 'temperature: hot')
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+def test_round_trip_in_any_chunking():
+    encoder = FeedEncoder()
+    data = encoder.encode(reading(21.5)) + encoder.encode(reading(22.0, port='COM9', address=7))
+    data += encoder.encode_alarm(alarm('temperature_warm'))
+    decoder = FeedDecoder()
+    readings = []
+    for i in range(len(data)):
+        readings += decoder.feed(data[i:i + 1])
+    assert readings == [reading(21.5), reading(22.0, port='COM9', address=7)]
+    assert decoder.alarms == [alarm('temperature_warm')]
+
+def test_names_are_sent_once():
+    encoder = FeedEncoder()
+    first = encoder.encode(reading(21.5))
+    second = encoder.encode(reading(21.6))
+    assert len(second) == 32  # Just the READING message
+    assert len(first) > len(second)
+
+def test_alarm_without_value():
+    encoder = FeedEncoder()
+    event = alarm('temperature_stale')._replace(value=None)
+    decoder = FeedDecoder()
+    decoder.feed(encoder.encode_alarm(event))
+    assert decoder.alarms == [event]
+
+def test_unknown_ids_raise_desync():
+    decoder = FeedDecoder()
+    with pytest.raises(FeedDesync):
+        decoder.feed(_message(MESSAGE_READING, READING_HEADER.pack(1.0, 7, 1, 0)))
+    # The buffer is dropped, so a fresh stream decodes again
+    assert decoder.feed(FeedEncoder().encode(reading(21.5))) == [reading(21.5)]
+
+def test_unknown_message_types_are_skipped():
+    decoder = FeedDecoder()
+    data = _message(200, b'future') + FeedEncoder().encode(reading(21.5))
+    assert decoder.feed(data) == [reading(21.5)]
+
+def test_lagging_subscriber_is_resynchronised():
+    server = FeedServer(('127.0.0.1', 0), max_queue=5)
+    server.publish_alarm(alarm('temperature_warm'))
+    stalled = queue.Queue()  # A subscriber whose sender thread never gets to run
+    server._clients.append(stalled)
+    server.publish_alarm(alarm('temperature_hot'))
+    server.publish_alarm(alarm('temperature_hot', active=False))
+    for i in range(20):
+        server.publish(reading(20.0 + i))
+    assert server.dropped > 0
+    # What is left must decode on its own: names and raised alarms first, then the newest readings
+    decoder = FeedDecoder()
+    readings = []
+    while not stalled.empty():
+        readings += decoder.feed(stalled.get_nowait())
+    assert readings[-1] == reading(39.0)
+    assert [event.rule for event in decoder.alarms] == ['temperature_warm']
+
+def test_snapshot_larger_than_max_queue():
+    server = FeedServer(('127.0.0.1', 0), max_queue=5).start()
+    try:
+        for i in range(8):
+            server.publish_alarm(alarm(f'rule_{i}'))
+        worker = FeedWorker('COM8', 1, feed=server.address, retry_interval=0.05).start()
+        try:
+            assert wait_for(lambda: len(worker.alarms()) == 8)
+            assert wait_for(lambda: server.subscribers() == 1)
+            server.publish(reading(21.5))
+            assert wait_for(lambda: worker.latest.get()[1] == (21.5, 45.5))
+        finally:
+            worker.stop()
+    finally:
+        server.close()
+
+def test_worker_reconnects_after_desync():
+    server = FeedServer(('127.0.0.1', 0)).start()
+    try:
+        worker = FeedWorker('COM8', 1, feed=server.address, retry_interval=0.05).start()
+        try:
+            assert wait_for(lambda: server.subscribers() == 1)
+            for messages in list(server._clients):
+                messages.put_nowait(_message(MESSAGE_READING, READING_HEADER.pack(1.0, 7, 1, 0)))
+
+            def received():
+                # Readings sent before the reconnect go down with the old connection, so keep publishing
+                server.publish(reading(23.5))
+                return worker.latest.get()[1] == (23.5, 45.5)
+
+            assert wait_for(received)
+        finally:
+            worker.stop()
+    finally:
+        server.close()
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason="no Unix domain sockets")
+def test_unix_socket_restart(tmp_path):
+    path = str(tmp_path / 'feed.sock')
+    FeedServer(path).start().close()
+    server = FeedServer(path).start()  # The path was removed by close()
+    try:
+        assert feed_running(path)
+        with pytest.raises(OSError):
+            FeedServer(path).start()  # Never steals the path from a running server
+    finally:
+        server.close()
+    # A path left behind by a crashed server is replaced
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+    FeedServer(path).start().close()
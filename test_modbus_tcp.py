@@ -0,0 +1,104 @@
+import socket
+import struct
+
+import pytest
+
+from device_profile import parse_profile
+from modbus_tcp import (GATEWAY_TARGET_FAILED, ILLEGAL_DATA_VALUE, ILLEGAL_FUNCTION, MBAP, STATUS_AGE,
+                        STATUS_UPDATES, ModbusTCPGateway, RegisterImage, StaleData, handle_pdu,
+                        read_holding_registers_tcp)
+
+NOW = 1700000000.0
+
+def request(start, count, function_code=3):
+    return struct.pack('>BHH', function_code, start, count)
+
+@pytest.fixture
+def image():
+    image = RegisterImage()
+    image.update(1, 0, [650, 455], timestamp=NOW)
+    return image
+
+@pytest.fixture
+def gateway(image):
+    gateway = ModbusTCPGateway(image, ('127.0.0.1', 0)).start()
+    yield gateway
+    gateway.close()
+
+def test_read(image):
+    assert handle_pdu(image, 1, request(0, 2)) == struct.pack('>BBHH', 3, 4, 650, 455)
+
+def test_exceptions(image):
+    assert handle_pdu(image, 1, request(0, 1, function_code=4)) == bytes([0x84, ILLEGAL_FUNCTION])
+    assert handle_pdu(image, 1, request(0, 0)) == bytes([0x83, ILLEGAL_DATA_VALUE])
+    assert handle_pdu(image, 1, request(0, 126)) == bytes([0x83, ILLEGAL_DATA_VALUE])
+    assert handle_pdu(image, 1, request(0, 2)[:3]) == bytes([0x83, ILLEGAL_DATA_VALUE])
+    assert handle_pdu(image, 2, request(0, 2)) == bytes([0x83, GATEWAY_TARGET_FAILED])  # Never polled
+    assert handle_pdu(image, 1, request(0, 3)) == bytes([0x83, GATEWAY_TARGET_FAILED])  # Register never polled
+
+def test_empty_pdu(image):
+    assert handle_pdu(image, 1, b'') is None
+
+def test_stale(image):
+    assert image.read(1, 0, 2, max_age=30.0, now=NOW + 10) == [650, 455]
+    with pytest.raises(StaleData):
+        image.read(1, 0, 2, max_age=30.0, now=NOW + 31)
+
+def test_status_registers(image):
+    image.update(1, 0, [651, 456], timestamp=NOW + 5)
+    assert image.read(1, STATUS_AGE, 2, now=NOW + 12) == [7, 2]
+    assert image.read(2, STATUS_UPDATES, 1, now=NOW) == [0]
+
+def test_over_tcp(gateway):
+    with socket.create_connection(gateway.address) as connection:
+        assert read_holding_registers_tcp(connection, 1, 0, 2, transaction=7) == [650, 455]
+        with pytest.raises(ValueError, match='0x0b'):
+            read_holding_registers_tcp(connection, 9, 0, 2)
+    assert gateway.requests == 2
+
+def test_transaction_id_echoed(gateway):
+    with socket.create_connection(gateway.address) as connection:
+        connection.sendall(MBAP.pack(0x1234, 0, 6, 1) + request(0, 2))
+        header = connection.recv(MBAP.size)
+        assert MBAP.unpack(header)[0] == 0x1234
+
+@pytest.mark.parametrize('length', [0, 1])
+def test_empty_pdu_over_tcp_closes_connection(gateway, length):
+    with socket.create_connection(gateway.address) as connection:
+        connection.settimeout(2.0)
+        connection.sendall(MBAP.pack(1, 0, length, 1))
+        assert connection.recv(16) == b''
+    # The server is still serving other clients
+    with socket.create_connection(gateway.address) as connection:
+        assert read_holding_registers_tcp(connection, 1, 0, 2) == [650, 455]
+
+def test_other_protocol_closes_connection(gateway):
+    with socket.create_connection(gateway.address) as connection:
+        connection.settimeout(2.0)
+        connection.sendall(MBAP.pack(1, 5, 6, 1) + request(0, 2))
+        assert connection.recv(16) == b''
+
+def profile_config(offset=None):
+    second = {"port": "COM9", "slaves": [{"addresses": "1-2", "register_map": "th"}]}
+    if offset is not None:
+        second["unit_offset"] = offset
+    return {
+        "register_maps": {"th": {"fields": [{"name": "temperature", "address": 0}]}},
+        "ports": [{"port": "COM8", "slaves": [{"addresses": "1-2", "register_map": "th"}]}, second],
+        "modbus_tcp": {"port": 5020},
+    }
+
+def test_duplicate_unit_ids_rejected():
+    with pytest.raises(ValueError, match='unit id 1'):
+        parse_profile(profile_config())
+    profile = parse_profile(profile_config(offset=100))
+    assert [s.address + p.unit_offset for p in profile.ports for s in p.slaves] == [1, 2, 101, 102]
+
+def test_duplicate_unit_ids_allowed_without_gateway():
+    config = profile_config()
+    del config['modbus_tcp']
+    assert len(parse_profile(config).ports) == 2
+
+def test_unit_id_range():
+    with pytest.raises(ValueError, match='0-255'):
+        parse_profile(profile_config(offset=254))
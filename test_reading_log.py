@@ -0,0 +1,103 @@
+import csv
+import sys
+
+import numpy as np
+import pytest
+
+import export
+from device_profile import parse_profile
+from export import export_log
+from history import HistoryStore, backfill
+from modbus_rtu import read_holding_registers
+from reading_log import ReadingLog, find_blocks
+from register_map import Field, RegisterMap
+from replay import ReplaySerial
+
+START = 1700000000.0
+
+# Fields at 0, 1 and 9 read as one 10-register block, wider than the log's 8-register records,
+# and a counter at 20 read on its own
+REGISTER_MAP = RegisterMap([Field('temperature', 0, scale=0.1, offset=-40.0), Field('humidity', 1, scale=0.1),
+                            Field('pressure', 9, scale=0.1), Field('counter', 20)], max_gap=8)
+
+def block(i, slave):
+    registers = [0] * 10
+    registers[0], registers[1], registers[9] = 600 + i, 450 + slave, 10130 + i
+    return registers
+
+@pytest.fixture
+def directory(tmp_path):
+    directory = str(tmp_path / 'COM8')
+    log = ReadingLog(directory, registers=8)
+    for i in range(20):
+        for slave in (1, 2):
+            log.append(START + i, slave, 0, block(i, slave))
+            log.append(START + i, slave, 20, [i])
+    log.close()
+    return directory
+
+def test_wide_blocks_round_trip(directory):
+    assert [(b.start, b.count) for b in REGISTER_MAP.blocks()] == [(0, 10), (20, 1)]
+    log = ReadingLog(directory)
+    records = log.query_array(0, float('inf'))
+    assert len(records) == 20 * 2 * 3  # The 10-register block takes two records
+    positions, registers = find_blocks(records, 0, 10, slave=2)
+    assert registers.tolist() == [block(i, 2) for i in range(20)]
+    assert records['timestamp'][positions].tolist() == [START + i for i in range(20)]
+    # A block that was not read whole is not made up from what follows it
+    assert len(find_blocks(records, 0, 17)[0]) == 0
+    log.close()
+
+def test_export_wide_blocks(directory, tmp_path):
+    path = str(tmp_path / 'out.csv')
+    assert export_log(directory, path, REGISTER_MAP, 'COM8', chunk_rows=5) == 80
+    with open(path) as f:
+        rows = list(csv.DictReader(f))
+    # One row per block read, however the records were chunked; the other block's columns are empty
+    assert len(rows) == 80
+    wide, counter = rows[0], rows[1]
+    assert (wide['port'], wide['address'], counter['address']) == ('COM8', '1', '1')
+    assert float(wide['temperature']) == 20.0 and float(wide['humidity']) == 45.1
+    assert float(wide['pressure']) == 1013.0 and wide['counter'] == 'nan'
+    assert float(counter['counter']) == 0 and counter['pressure'] == 'nan'
+    assert [float(row['pressure']) for row in rows[::2]] == [1013.0 + i / 10 for i in range(20) for _ in (1, 2)]
+
+def test_backfill_wide_blocks(directory):
+    store = HistoryStore()
+    log = ReadingLog(directory)
+    backfill(store, log, ('COM8', None), REGISTER_MAP, start=0.0)
+    log.close()
+    pressure = store.query(('COM8', 2), 'pressure', START, START + 20)
+    assert pressure.resolution == 0
+    assert np.allclose(pressure.mean, [1013.0 + i / 10 for i in range(20)])
+    assert len(store.query(('COM8', 2), 'counter', START, START + 20).time) == 20
+
+def test_replay_wide_blocks(directory):
+    serial = ReplaySerial(directory, speed=0)
+    try:
+        assert list(read_holding_registers(serial, 2, 0, 10)) == block(0, 2)
+        assert list(read_holding_registers(serial, 2, 0, 10)) == block(1, 2)
+        assert list(read_holding_registers(serial, 2, 20, 1)) == [0]
+    finally:
+        serial.recording.close()
+
+def test_export_main_takes_port_from_folder(directory, tmp_path, monkeypatch):
+    config = {
+        "register_maps": {"narrow": {"fields": [{"name": "temperature", "address": 0}]},
+                          "wide": {"max_gap": 8, "fields": [{"name": "temperature", "address": 0, "scale": 0.1,
+                                                             "offset": -40.0},
+                                                            {"name": "pressure", "address": 9, "scale": 0.1}]}},
+        "ports": [{"port": "COM9", "slaves": [{"addresses": "1-2", "register_map": "narrow"}]},
+                  {"port": "COM8", "slaves": [{"addresses": "1-2", "register_map": "wide"}]}],
+    }
+    monkeypatch.setattr(export, 'load_profile', lambda: parse_profile(config))
+    path = str(tmp_path / 'out.csv')
+    monkeypatch.setattr(sys, 'argv', ['export.py', directory, path])
+    export.main()
+    with open(path) as f:
+        rows = list(csv.DictReader(f))
+    assert {row['port'] for row in rows} == {'COM8'}
+    assert float(rows[-2]['pressure']) == 1014.9  # COM8's register map, not COM9's
+    monkeypatch.setattr(sys, 'argv', ['export.py', str(tmp_path), path])
+    with pytest.raises(SystemExit):
+        export.main()  # A folder no port writes to
@@ -1,70 +1,76 @@
-import serial
+import queue
 import time
-import struct
+from change_filter import SENSOR_DEADBANDS, ChangeFilter
+from feed import FeedWorker, feed_running
+from metrics import serve_metrics
+from modbus_rtu import read_sensor_data
+from reading_log import ReadingLog, log_directory
+from device_profile import load_profile
 
-def calculate_crc(data):
-    crc = 0xFFFF
-    for pos in data:
-        crc ^= pos
-        for _ in range(8):
-            if (crc & 1) != 0:
-                crc >>= 1
-                crc ^= 0xA001
-            else:
-                crc >>= 1
-    return crc
+def print_reading(temperature, humidity):
+    if temperature is not None and humidity is not None:
+        print(f"Temperature: {temperature:.1f}°C, Humidity: {humidity:.1f}%")
+    else:
+        print("Failed to read data from sensor.")
 
-def create_request_command(device_address, function_code, start_address, num_registers):
-    request = struct.pack('>BBHH', device_address, function_code, start_address, num_registers)
-    crc = calculate_crc(request)
-    return request + struct.pack('<H', crc)
+def follow_feed(profile, port, sensor, ready=None):
+    # acquisition_daemon.py already owns the serial port and the metrics port: print the
+    # sensor's readings from its feed instead of opening them a second time
+    changes = ChangeFilter(SENSOR_DEADBANDS)
+    worker = FeedWorker(port.port, sensor.address, feed=profile.feed, changes=changes).start()
+    print(f"Following acquisition_daemon.py on {profile.feed}")
 
-def read_sensor_data(ser):
-    device_address = 1  # Replace with your sensor's device address
-    function_code = 3   # Function code for reading holding registers
-    start_address = 0   # Starting register address
-    num_registers = 2   # Number of registers to read
+    if ready is not None:
+        ready()
 
-    request_command = create_request_command(device_address, function_code, start_address, num_registers)
-    ser.write(request_command)
-    time.sleep(1)  # Wait for a response
-    response = ser.read(9)  # Read the response (number of bytes depends on your sensor's response format)
+    try:
+        while True:
+            try:
+                _, (temperature, humidity) = worker.readings.get(timeout=0.5)  # Wakes up so Ctrl+C is seen
+            except queue.Empty:
+                continue
+            print_reading(temperature, humidity)
+    except KeyboardInterrupt:
+        print("Terminating the program.")
+        print(changes.stats())
+    finally:
+        worker.stop()
+
+def main(ready=None):
+    # Port, sensor address and poll period come from devices.json
+    profile = load_profile()
+    port, sensor = profile.first_sensor()
+    if feed_running(profile.feed):
+        return follow_feed(profile, port, sensor, ready)
 
-    if response and len(response) >= 9:
-        raw_temperature = int.from_bytes(response[3:5], byteorder='big')
-        humidity = int.from_bytes(response[5:7], byteorder='big') / 10.0
+    ser = port.open(reconnect=True)  # Opened in the background; reads fail until it is ready
 
-        # Adjust the formula based on sensor datasheet
-        # Example: Assuming a 16-bit raw value maps linearly to -40°C to 125°C
-        temperature = (raw_temperature / 1650.0) * 165.0 - 40.0
+    # Every raw reading is also kept on disk, in the same per-port folder the daemon uses
+    # (readings/COM8), so Graph_GUI and export.py find it
+    log = ReadingLog(log_directory(port.port))
 
-        return temperature, humidity
+    # Request counters and latencies in Prometheus format at http://127.0.0.1:9105/metrics
+    # (the "metrics" section of devices.json)
+    serve_metrics(profile.metrics)
 
-    return None, None
+    # Only print when a value moved past its deadband (or once a minute as a sign of life)
+    changes = ChangeFilter(SENSOR_DEADBANDS)
 
-def main():
-    # Configure the serial connection
-    ser = serial.Serial(
-        port='COM9',       # Replace with your port
-        baudrate=9600,     # Replace with your sensor's baudrate
-        parity=serial.PARITY_NONE,
-        stopbits=serial.STOPBITS_ONE,
-        bytesize=serial.EIGHTBITS,
-        timeout=1
-    )
+    if ready is not None:
+        ready()
 
     try:
         while True:
-            temperature, humidity = read_sensor_data(ser)
-            if temperature is not None and humidity is not None:
-                print(f"Temperature: {temperature:.1f}°C, Humidity: {humidity:.1f}%")
-            else:
-                print("Failed to read data from sensor.")
+            temperature, humidity = read_sensor_data(ser, sensor.address, register_map=sensor.register_map, log=log)
+            if changes.accept((temperature, humidity)):
+                print_reading(temperature, humidity)
 
-            time.sleep(3)  # Wait for 3 seconds before the next read
+            time.sleep(sensor.poll_period)
     except KeyboardInterrupt:
         print("Terminating the program.")
+        print(changes.stats())
     finally:
+        log.close()
         ser.close()
 
 if __name__ == "__main__":